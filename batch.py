@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+from card import CARD_VALUES, NUM_CARDS, RANK_LIST
+from melds import RANK_GROUP_PATTERNS, suit_sequences
+
+# Evaluates many hands at once with NumPy (see evaluate_hands). Hands are either an (N, 54) boolean array with one column per
+# card id, or an (N, k) integer array of card ids where negative ids are padding, so hands of different sizes fit in one array
+
+_CARD_VALUES = np.array(CARD_VALUES, dtype=np.int16)
+_NUM_RANKS = len(RANK_LIST)
+_RANK_VALUES = _CARD_VALUES[2::4]
+_RANK_BITS = 1 << np.arange(_NUM_RANKS, dtype=np.int32)
+# Discard options of a group of the same rank, by how many cards of the rank are held (see melds.RANK_GROUP_PATTERNS)
+_RANK_GROUP_ORDERS = np.array([0, 0] + [len(RANK_GROUP_PATTERNS[size]) for size in (2, 3, 4)], dtype=np.int16)
+
+CHUNK_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def _sequence_tables() -> Tuple[np.ndarray, np.ndarray]:
+    # best[jokers, rank_mask] = the most valuable sequence of one suit, count[jokers, rank_mask] = how many sequences it has
+    # Built once from melds.suit_sequences for every one of the 2^13 rank masks of a suit, so hands are evaluated by lookups
+    best = np.zeros((3, 1 << _NUM_RANKS), dtype=np.int16)
+    count = np.zeros((3, 1 << _NUM_RANKS), dtype=np.int16)
+    for jokers in range(3):
+        for rank_mask in range(1 << _NUM_RANKS):
+            sequences = suit_sequences.__wrapped__(rank_mask, jokers)
+            if sequences:
+                best[jokers, rank_mask] = max(sum(_RANK_VALUES[rank - 1] for rank in sequence if rank) for sequence in sequences)
+                count[jokers, rank_mask] = len(sequences)
+    return best, count
+
+
+@dataclass
+class HandEvaluation:
+    # One entry per hand
+    # best_discard_value: the most points a single discard takes out of the hand (same options as Player.get_discard_options, 0 if
+    # there are none, like a hand of only Jokers)
+    # pairs, triples, quads: ranks held exactly 2, 3 or 4 times. sequences: sequence discards, discard_options: all discards
+    hand_values: np.ndarray
+    can_call_yaniv: np.ndarray
+    best_discard_values: np.ndarray
+    pairs: np.ndarray
+    triples: np.ndarray
+    quads: np.ndarray
+    sequences: np.ndarray
+    discard_options: np.ndarray
+
+
+def hand_masks(hands: np.ndarray) -> np.ndarray:
+    # (N, 54) boolean array of either input form
+    hands = np.asarray(hands)
+    if hands.ndim != 2:
+        raise ValueError(f'Expected a 2 dimensional array of hands, got shape {hands.shape}')
+    if hands.dtype == np.bool_:
+        if hands.shape[1] != NUM_CARDS:
+            raise ValueError(f'Boolean hands need {NUM_CARDS} columns, got {hands.shape[1]}')
+        return hands
+    if not np.issubdtype(hands.dtype, np.integer):
+        raise ValueError(f'Expected boolean or integer hands, got {hands.dtype}')
+    if hands.size and hands.max() >= NUM_CARDS:
+        raise ValueError(f'Card ids go up to {NUM_CARDS - 1}, got {hands.max()}')
+    # Padding goes to an extra column that is dropped afterwards
+    masks = np.zeros((hands.shape[0], NUM_CARDS + 1), dtype=np.bool_)
+    masks[np.arange(hands.shape[0])[:, None], np.where(hands < 0, NUM_CARDS, hands)] = True
+    return masks[:, :NUM_CARDS]
+
+
+def evaluate_hands(hands: np.ndarray, yaniv_total: int = 7) -> HandEvaluation:
+    masks = hand_masks(hands)
+    parts = [_evaluate_chunk(masks[start:start + CHUNK_SIZE], yaniv_total) for start in range(0, len(masks), CHUNK_SIZE)]
+    if not parts:
+        parts = [_evaluate_chunk(masks, yaniv_total)]
+    return HandEvaluation(*(np.concatenate(arrays) for arrays in zip(*parts)))
+
+
+def _evaluate_chunk(masks: np.ndarray, yaniv_total: int) -> tuple:
+    best_table, count_table = _sequence_tables()
+    hand_values = masks @ _CARD_VALUES
+    jokers = masks[:, 0].astype(np.int8) + masks[:, 1]
+    # held[n, suit, rank]
+    held = masks[:, 2:].reshape(len(masks), _NUM_RANKS, 4).transpose(0, 2, 1)
+
+    # Single cards and groups of the same rank. Jokers are only ever discarded as part of a sequence
+    rank_counts = held.sum(axis=1, dtype=np.int16)
+    best_single = np.where(rank_counts > 0, _RANK_VALUES, 0).max(axis=1, initial=0)
+    best_group = np.where(rank_counts >= 2, rank_counts * _RANK_VALUES, 0).max(axis=1, initial=0)
+    pairs, triples, quads = ((rank_counts == k).sum(axis=1) for k in (2, 3, 4))
+
+    # Sequences, looked up by the rank mask of every suit
+    suit_masks = held.astype(np.int32) @ _RANK_BITS
+    best_sequence = best_table[jokers[:, None], suit_masks].max(axis=1)
+    sequences = count_table[jokers[:, None], suit_masks].sum(axis=1)
+
+    discard_options = rank_counts.sum(axis=1) + _RANK_GROUP_ORDERS[rank_counts].sum(axis=1) + sequences
+    best_discard = np.maximum(np.maximum(best_single, best_group), best_sequence)
+    return hand_values, hand_values <= yaniv_total, best_discard, pairs, triples, quads, sequences, discard_options
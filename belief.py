@@ -0,0 +1,144 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from card import CARD_VALUES, JOKER_2, NUM_CARDS, RANK_LIST, Card
+
+# How likely every card is to be in each player's hand, given what the players did with the pile (see BeliefTracker)
+# Evidence multiplies the weight of the cards it makes more or less likely in that player's hand:
+#   PICKUP_*   they took a face up card, so they probably hold cards that make a group or a sequence with it
+#   DECLINE_*  they drew from the deck instead, so they probably don't
+#   DISCARD_SAME_RANK  they discarded a single card, so they probably had no other card of its rank to discard with it
+PICKUP_SAME_RANK = 2.0
+PICKUP_NEIGHBOR = 1.5
+DECLINE_SAME_RANK = 0.5
+DECLINE_NEIGHBOR = 0.75
+DISCARD_SAME_RANK = 0.5
+
+SINKHORN_ITERATIONS = 50
+SINKHORN_TOLERANCE = 1e-6
+MAX_HAND_CARDS = 5
+_MAX_SUM = MAX_HAND_CARDS * max(CARD_VALUES)
+_CARD_VALUES = np.array(CARD_VALUES, dtype=np.int64)
+_FIRST_CARD = JOKER_2.id + 1
+
+
+def _related_cards() -> Tuple[np.ndarray, np.ndarray]:
+    # same_rank[c] = the other cards of c's rank, neighbors[c] = cards of c's suit at most two ranks away (they make sequences)
+    same_rank = np.zeros((NUM_CARDS, NUM_CARDS), dtype=np.bool_)
+    neighbors = np.zeros((NUM_CARDS, NUM_CARDS), dtype=np.bool_)
+    for card in range(_FIRST_CARD, NUM_CARDS):
+        rank, suit = divmod(card - _FIRST_CARD, 4)
+        for other_suit in range(4):
+            if other_suit != suit:
+                same_rank[card, _FIRST_CARD + rank * 4 + other_suit] = True
+        for other_rank in range(max(rank - 2, 0), min(rank + 3, len(RANK_LIST))):
+            if other_rank != rank:
+                neighbors[card, _FIRST_CARD + other_rank * 4 + suit] = True
+    return same_rank, neighbors
+
+
+_SAME_RANK, _NEIGHBORS = _related_cards()
+
+
+def mask_to_array(mask: int) -> np.ndarray:
+    # Boolean array with one entry per card id
+    return np.unpackbits(np.array([mask], dtype='<u8').view(np.uint8), bitorder='little')[:NUM_CARDS].astype(np.bool_)
+
+
+class BeliefTracker:
+    weights: np.ndarray
+    rows: Dict[str, int]
+    version: int
+
+
+    # Keeps one row of evidence weights (players x 54) for the players of a PublicKnowledge, updated as it observes each turn
+    # Probabilities are only worked out when asked for, from one player's point of view: the cards they haven't seen are spread
+    # over the unknown cards of every opponent and the deck, with the weights as the prior. Sinkhorn iterations scale the rows to
+    # the number of unknown cards each opponent holds and the columns to one (every unseen card is somewhere)
+    # observe only multiplies weights and never normalizes them, which gives the same probabilities as normalizing a player's row
+    # after every turn: normalizing scales the whole row, evidence multiplies single weights and the two commute, and Sinkhorn's
+    # result with fixed row and column targets doesn't change when a row of its input is scaled. So the weights are only scaled
+    # once, when asked, over the columns that are still unseen at that point
+    # version changes with every update, so results can be reused until the next turn
+    def __init__(self, player_names: Iterable[str] = ()):
+        self.version = 0
+        self.__cache_key = None
+        self.__cache = None
+        self.reset(player_names)
+
+
+    def reset(self, player_names: Iterable[str]) -> None:
+        self.rows = {name: row for row, name in enumerate(player_names)}
+        self.weights = np.ones((len(self.rows), NUM_CARDS))
+        self.version += 1
+
+
+    def copy(self) -> 'BeliefTracker':
+        tracker = BeliefTracker()
+        tracker.rows = dict(self.rows)
+        tracker.weights = self.weights.copy()
+        tracker.version = self.version
+        return tracker
+
+
+    def observe(self, player_name: str, discard: List[Card], pickup: Optional[Card], declined: Optional[List[Card]]) -> None:
+        row = self.rows.get(player_name)
+        if row is None:
+            return
+        self.version += 1
+        weights = self.weights[row]
+        if len(discard) == 1:
+            weights[_SAME_RANK[discard[0].id]] *= DISCARD_SAME_RANK
+        if pickup is not None:
+            weights[_SAME_RANK[pickup.id]] *= PICKUP_SAME_RANK
+            weights[_NEIGHBORS[pickup.id]] *= PICKUP_NEIGHBOR
+        for card in declined or ():
+            weights[_SAME_RANK[card.id]] *= DECLINE_SAME_RANK
+            weights[_NEIGHBORS[card.id]] *= DECLINE_NEIGHBOR
+
+
+    def card_probabilities(self, unseen: int, opponents: List[str], unknown_cards: List[int]) -> np.ndarray:
+        # (opponents x 54) chance each card the viewer hasn't seen is one of an opponent's unknown cards. Every other card is 0
+        # unseen is the viewer's unseen card mask, unknown_cards how many unknown cards each opponent holds
+        columns = np.flatnonzero(mask_to_array(unseen))
+        targets = np.array(unknown_cards + [max(len(columns) - sum(unknown_cards), 0)], dtype=np.float64)
+        rows = [self.rows[name] for name in opponents]
+        # The last row is the deck (and any player that isn't tracked), which has no evidence
+        matrix = np.ones((len(rows) + 1, len(columns)))
+        matrix[:-1] = self.weights[np.ix_(rows, columns)]
+
+        for _ in range(SINKHORN_ITERATIONS):
+            matrix *= (targets / np.maximum(matrix.sum(axis=1), 1e-300))[:, None]
+            matrix /= np.maximum(matrix.sum(axis=0), 1e-300)
+            if np.abs(matrix.sum(axis=1) - targets).max() < SINKHORN_TOLERANCE:
+                break
+
+        probabilities = np.zeros((len(rows), NUM_CARDS))
+        probabilities[:, columns] = matrix[:-1]
+        return probabilities
+
+
+    def unknown_sum_distributions(self, unseen: int, opponents: List[str], unknown_cards: List[int]) -> np.ndarray:
+        # (opponents x 51) chance the unknown cards of each opponent add up to each value, for all opponents at once
+        # A hand is a set of unknown_cards unseen cards, chosen with odds p / (1 - p) of the card probabilities (the most even
+        # distribution with those odds). With no evidence every set is equally likely, like Computer.calc_probability_lte counts
+        # The last result is kept, so every question a computer asks during one turn costs one calculation
+        key = (self.version, unseen, tuple(opponents), tuple(unknown_cards))
+        if key == self.__cache_key:
+            return self.__cache
+        probabilities = self.card_probabilities(unseen, opponents, unknown_cards)
+        odds = np.minimum(probabilities, 1 - 1e-9)
+        odds = odds / (1 - odds)
+        # ways[o, j, s] = total odds of the sets of j cards worth s
+        ways = np.zeros((len(opponents), MAX_HAND_CARDS + 1, _MAX_SUM + 1))
+        ways[:, 0, 0] = 1
+        for card in np.flatnonzero(mask_to_array(unseen)):
+            value = _CARD_VALUES[card]
+            ways[:, 1:, value:] += ways[:, :-1, :_MAX_SUM + 1 - value] * odds[:, card, None, None]
+
+        distributions = ways[np.arange(len(opponents)), np.minimum(unknown_cards, MAX_HAND_CARDS)]
+        totals = distributions.sum(axis=1, keepdims=True)
+        self.__cache_key = key
+        self.__cache = np.divide(distributions, totals, out=np.zeros_like(distributions), where=totals > 0)
+        return self.__cache
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+from card import ALL_CARDS, Card, Suit
+from computer import Computer
+from knowledge import OpponentMemory
+from player import Player
+from simulation import simulate_game
+from yaniv import Yaniv
+
+DEFAULT_OUTPUT = 'benchmark_results.json'
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.15
+CORPUS_SEED = 1234
+
+
+def time_per_op(run: Callable[[], int], repeat: int) -> Tuple[float, int]:
+    # Best of repeat runs, so a busy machine makes results noisier but not slower on average
+    # run() does the work once and returns how many operations it did
+    best = None
+    ops = 0
+    for _ in range(repeat):
+        start = perf_counter()
+        ops = run()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / max(ops, 1), ops
+
+
+def hand_corpus(size: int, seed: int = CORPUS_SEED) -> List[List[Card]]:
+    rng = random.Random(seed)
+    return [rng.sample(ALL_CARDS, rng.randint(1, 5)) for _ in range(size)]
+
+
+def turn_corpus(size: int, seed: int = CORPUS_SEED) -> List[Tuple[List[Card], List[Card]]]:
+    # (hand, pickup options) pairs. Pickup options are one or two cards that aren't in the hand
+    # A hand of only Jokers has nothing to discard (it always calls Yaniv), so those are drawn again
+    rng = random.Random(seed)
+    corpus = []
+    while len(corpus) < size:
+        cards = rng.sample(ALL_CARDS, 7)
+        hand_size = rng.randint(1, 5)
+        if all(card.suit == Suit.Joker for card in cards[:hand_size]):
+            continue
+        corpus.append((cards[:hand_size], cards[5:5 + rng.randint(1, 2)]))
+    return corpus
+
+
+def new_computer(level: int, seed: int = CORPUS_SEED) -> Computer:
+    computer = Computer('Benchmark', level, verbose=False, rng=random.Random(seed))
+    computer.initialize_memory(['Benchmark', 'Opponent'])
+    return computer
+
+
+def bench_discard_options(quick: bool) -> Dict[str, dict]:
+    players = []
+    for hand in hand_corpus(500 if quick else 5000):
+        player = Player('Benchmark', verbose=False)
+        for card in hand:
+            player.pickup_card(card)
+        players.append(player)
+
+    def run() -> int:
+        for player in players:
+            player.get_discard_options()
+        return len(players)
+
+    seconds, ops = time_per_op(run, 3 if quick else 5)
+    return {'player.get_discard_options': {'seconds_per_op': seconds, 'ops': ops}}
+
+
+def bench_probability_lte(quick: bool) -> Dict[str, dict]:
+    results = {}
+    rng = random.Random(CORPUS_SEED)
+    computer = new_computer(5)
+    for card in rng.sample(ALL_CARDS, 10):
+        computer.observe(card)
+
+    for unknown_cards in range(1, 5):
+        memory = OpponentMemory(unknown_cards)
+        thresholds = [rng.randint(unknown_cards, 7 + unknown_cards) for _ in range(100 if quick else 500)]
+
+        def run() -> int:
+            for lte_val in thresholds:
+                computer.calc_probability_lte(memory, lte_val)
+            return len(thresholds)
+
+        seconds, ops = time_per_op(run, 3 if quick else 5)
+        results[f'computer.calc_probability_lte[unknown={unknown_cards}]'] = {'seconds_per_op': seconds, 'ops': ops}
+    return results
+
+
+def bench_do_turn(quick: bool) -> Dict[str, dict]:
+    results = {}
+    corpus = turn_corpus(200 if quick else 1000)
+    for level in range(1, 6):
+        computers = []
+        for i, (hand, pickup_options) in enumerate(corpus):
+            computer = new_computer(level, CORPUS_SEED + i)
+            for card in hand:
+                computer.pickup_card(card)
+            for card in pickup_options:
+                computer.observe(card)
+            computers.append((computer, pickup_options))
+
+        def run() -> int:
+            # Start cold so every turn pays for its own option generation
+            Computer.discard_option_cache.clear()
+            Computer.new_discard_option_cache.clear()
+            for computer, pickup_options in computers:
+                computer.do_turn(pickup_options, 7)
+            return len(computers)
+
+        seconds, ops = time_per_op(run, 3 if quick else 5)
+        results[f'computer.do_turn[level={level}]'] = {'seconds_per_op': seconds, 'ops': ops}
+    return results
+
+
+def bench_new_round(quick: bool) -> Dict[str, dict]:
+    game = Yaniv(None, 7, [2, 3, 4, 5], seed=CORPUS_SEED, verbose=False)
+    rounds = 200 if quick else 2000
+
+    def run() -> int:
+        for i in range(rounds):
+            game.new_round(i % 4)
+        return rounds
+
+    seconds, ops = time_per_op(run, 3 if quick else 5)
+    return {'yaniv.new_round': {'seconds_per_op': seconds, 'ops': ops}}
+
+
+def bench_games(quick: bool) -> Dict[str, dict]:
+    results = {}
+    num_games = 20 if quick else 200
+    for levels in ([2, 2, 2], [3, 4, 5], [1, 2, 3, 4, 5]):
+        def run() -> int:
+            for seed in range(num_games):
+                simulate_game(levels, seed)
+            return num_games
+
+        seconds, ops = time_per_op(run, 1 if quick else 3)
+        results[f'simulate_game[levels={",".join(map(str, levels))}]'] = {'seconds_per_op': seconds, 'ops': ops,
+                                                                          'games_per_second': 1 / seconds}
+    return results
+
+
+def run_benchmarks(quick: bool = False) -> dict:
+    benchmarks = {}
+    for bench in (bench_discard_options, bench_probability_lte, bench_do_turn, bench_new_round, bench_games):
+        benchmarks.update(bench(quick))
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'benchmarks': benchmarks,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[dict]:
+    # Every benchmark is measured in seconds per operation, so a ratio above 1 + threshold is a regression
+    comparison = []
+    for name, current in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        ratio = current['seconds_per_op'] / baseline['benchmarks'][name]['seconds_per_op']
+        comparison.append({'name': name, 'ratio': ratio, 'regression': ratio > 1 + threshold, 'improvement': ratio < 1 - threshold})
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Yaniv engine and compare against a stored baseline')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Where to write the JSON results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown before a benchmark is flagged (0.15 = 15%%)')
+    parser.add_argument('--quick', action='store_true', help='Smaller corpora and fewer repeats')
+    args = parser.parse_args()
+
+    # No baseline is committed: timings only compare on the machine that measured them, so every checkout stores its own
+    has_baseline = os.path.exists(args.baseline)
+    results = run_benchmarks(args.quick)
+    # baseline stays None in the JSON results when there was nothing to compare against
+    results['baseline'] = None
+    regressions = []
+    if has_baseline:
+        with open(args.baseline) as f:
+            results['comparison'] = compare(results, json.load(f), args.threshold)
+        results['baseline'] = args.baseline
+        regressions = [c for c in results['comparison'] if c['regression']]
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    for name, bench in results['benchmarks'].items():
+        print(f'{name:<45} {bench["seconds_per_op"] * 1e6:>12.2f} us/op')
+    for c in results.get('comparison', []):
+        if c['regression'] or c['improvement']:
+            print(f'{"REGRESSION" if c["regression"] else "improvement"}: {c["name"]} is {c["ratio"]:.2f}x the baseline time')
+    if not has_baseline and not args.save_baseline:
+        print(f'No baseline at {args.baseline}: the results were not compared. Run with --save-baseline to store one')
+    sys.exit(1 if regressions else 0)
@@ -1,5 +1,5 @@
 from enum import Enum, auto
-from typing import Union
+from typing import Iterable, List, Tuple, Union
 
 
 class Suit(Enum):
@@ -10,9 +10,21 @@ class Suit(Enum):
     Joker = auto()
 
 
+SUIT_ORDER = {Suit.Hearts: 1, Suit.Diamonds: 2, Suit.Clubs: 3, Suit.Spades: 4, Suit.Joker: 5}
+RANK_ORDER = {'X1': 0, 'X2': 0, 'A': 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 7, 8: 8, 9: 9, 10: 10, 'J': 11, 'Q': 12, 'K': 13}
+RANK_LIST = ['A', 2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K']
+STANDARD_SUITS = [Suit.Hearts, Suit.Diamonds, Suit.Clubs, Suit.Spades]
+
+
 class Card:
     suit: Suit
     rank: Union[str, int]
+    id: int
+
+    # Only the 54 cards of the deck exist. Card(suit, rank) returns the shared instance, so cards can be compared by identity
+    # Card ids follow the hand order (rank, then suit) with the jokers first:
+    # X1 = 0, X2 = 1, A♥ = 2, A♦ = 3, A♣ = 4, A♠ = 5, 2♥ = 6, ..., K♠ = 53
+    __slots__ = ('suit', 'rank', 'id', '_value')
 
     # X = Joker
     __rank_val_dict = {'10': 10, 'J': 10, 'Q': 10, 'K': 10, 'A': 1, 'X1': 0, 'X2': 0}
@@ -22,18 +34,33 @@ class Card:
         Suit.Clubs: '♣',
         Suit.Spades: '♠',
     }
+    __interned = {}
 
 
-    def __init__(self, suit: Suit, rank: Union[str, int]):
-        self.suit = suit
-        self.rank = rank
+    def __new__(cls, suit: Suit, rank: Union[str, int]):
+        try:
+            return cls.__interned[(suit, rank)]
+        except KeyError:
+            raise ValueError(f'There is no {rank} of {suit.name} in the deck') from None
 
 
-    def value(self) -> int:
-        if self.rank in self.__rank_val_dict:
-            return self.__rank_val_dict[self.rank]
+    @classmethod
+    def _create_deck(cls) -> Tuple['Card', ...]:
+        deck = []
+        for rank in ['X1', 'X2'] + RANK_LIST:
+            for suit in [Suit.Joker] if rank in ['X1', 'X2'] else STANDARD_SUITS:
+                card = object.__new__(cls)
+                card.suit = suit
+                card.rank = rank
+                card.id = len(deck)
+                card._value = cls.__rank_val_dict[rank] if rank in cls.__rank_val_dict else int(rank)
+                cls.__interned[(suit, rank)] = card
+                deck.append(card)
+        return tuple(deck)
 
-        return int(self.rank)
+
+    def value(self) -> int:
+        return self._value
 
 
     def __str__(self) -> str:
@@ -44,15 +71,68 @@ class Card:
         return '🤡🃏'
 
 
-    def __eq__(self, __value):
-        if isinstance(__value, Card):
-            return __value.suit == self.suit and __value.rank == self.rank
-        return False
+    def __hash__(self):
+        return self.id
 
 
-    def __hash__(self):
-        return hash((self.rank, self.suit))
+    def __reduce__(self):
+        # Unpickling goes through Card(suit, rank) so it returns the shared instance
+        return Card, (self.suit, self.rank)
 
 
     def __repr__(self):
         return self.__str__()
+
+
+ALL_CARDS = Card._create_deck()
+JOKER_1 = Card(Suit.Joker, 'X1')
+JOKER_2 = Card(Suit.Joker, 'X2')
+NUM_CARDS = len(ALL_CARDS)
+FULL_MASK = (1 << NUM_CARDS) - 1
+JOKER_MASK = (1 << JOKER_1.id) | (1 << JOKER_2.id)
+
+# Lookup tables indexed by card id
+CARD_VALUES = [card.value() for card in ALL_CARDS]
+CARD_RANK_ORDERS = [RANK_ORDER[card.rank] for card in ALL_CARDS]
+CARD_SUITS = [card.suit for card in ALL_CARDS]
+
+
+def card_id(suit: Suit, rank: Union[str, int]) -> int:
+    return Card(suit, rank).id
+
+
+def cards_to_mask(cards: Iterable[Card]) -> int:
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.id
+    return mask
+
+
+def mask_to_ids(mask: int) -> List[int]:
+    # Ids come out in ascending order, which is also the order cards are kept in a hand
+    ids = []
+    while mask:
+        low_bit = mask & -mask
+        ids.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return ids
+
+
+def mask_to_cards(mask: int) -> List[Card]:
+    return [ALL_CARDS[i] for i in mask_to_ids(mask)]
+
+
+def mask_value(mask: int) -> int:
+    return sum(CARD_VALUES[i] for i in mask_to_ids(mask))
+
+
+# Text codes of cards, as the server protocol (see server.py) and the event hub (see publisher.py) send them
+_SUIT_CODES = {Suit.Hearts: 'H', Suit.Diamonds: 'D', Suit.Clubs: 'C', Suit.Spades: 'S'}
+
+
+def card_code(card: Card) -> str:
+    return card.rank if card.suit is Suit.Joker else f'{card.rank}{_SUIT_CODES[card.suit]}'
+
+
+def cards_code(cards: Union[Card, List[Card]]) -> str:
+    return ','.join(card_code(c) for c in cards) if isinstance(cards, list) else card_code(cards)
@@ -1,125 +1,346 @@
+import copy
 import random
-from itertools import combinations
-from typing import List, Tuple, Union, Set, Optional
-
-from card import Card, Suit
+from dataclasses import dataclass
+from math import comb
+from time import perf_counter
+from typing import Dict, List, Tuple, Union, Optional
+
+from card import ALL_CARDS, CARD_VALUES, JOKER_1, JOKER_MASK, Card, Suit
+from instrumentation import Instrumentation
+from knowledge import KnowledgeView, OpponentMemory, PublicKnowledge
+from melds import discard_options_for_mask, option_key
 from player import Player
-from utils import GameState
+from search import ISMCTS, YANIV, Action, Observation
+from state import NOT_TRACKED, BotKnowledge
+from utils import GameState, LRUCache
+
+MAX_CARD_VALUE = 10
+
+
+def count_hand_sums(value_counts: List[int], num_cards: int, max_sum: Optional[int] = None) -> List[int]:
+    # Count the ways to choose num_cards cards from a deck described by value_counts (value_counts[v] = cards worth v)
+    # Returns ways where ways[s] is the number of card combinations that add up to s, for every s up to max_sum
+    # Each card value is convolved in turn: ways_by_size[j][s] counts combinations of j cards worth s
+    if num_cards < 0 or num_cards > sum(value_counts) or (max_sum is not None and max_sum < 0):
+        return [0]
+    if max_sum is None or max_sum > num_cards * MAX_CARD_VALUE:
+        max_sum = num_cards * MAX_CARD_VALUE
+    ways_by_size = [[0] * (max_sum + 1) for _ in range(num_cards + 1)]
+    ways_by_size[0][0] = 1
+    for value, count in enumerate(value_counts):
+        if count == 0:
+            continue
+        max_taken = count if value == 0 else min(count, max_sum // value)
+        for j in range(num_cards, 0, -1):
+            row = ways_by_size[j]
+            for taken in range(1, min(max_taken, j) + 1):
+                prev_row = ways_by_size[j - taken]
+                ways_to_take = comb(count, taken)
+                shift = taken * value
+                for s in range(max_sum - shift + 1):
+                    if prev_row[s]:
+                        row[s + shift] += prev_row[s] * ways_to_take
+    return ways_by_size[num_cards]
+
+
+def _copy_options(discard_options: Tuple[Union[Card, List[Card]], ...]) -> List[Union[Card, List[Card]]]:
+    # Cached options are shared by every computer, so callers get their own copies of the multi card options too
+    return [option[:] if isinstance(option, list) else option for option in discard_options]
+
+
+@dataclass(frozen=True)
+class ComputerParams:
+    # The constants computer decisions depend on (see tuning.py)
+    # assaf_risk: level 3 doesn't call Yaniv if the chance an opponent can Assaf it is higher than this
+    # draw_nudge: chance to value the deck 1 lower, to avoid loops where no computer wants to draw from the deck
+    # avg_random_card_value: the value level 2 expects to draw from the deck. In a full deck the average card is worth ~6.3
+    assaf_risk: float = 0.2
+    draw_nudge: float = 0.05
+    avg_random_card_value: float = 6.296296296
+
+
+DEFAULT_PARAMS = ComputerParams()
 
 
 class Computer(Player):
-    __deck: Set[Card]
-    __deck_total: int
+    __knowledge: Optional[KnowledgeView]
     __level: int
-    __memory: dict
-    __memory_chance: int
-    __trash_memory: List[Card]
-
-    # In a full deck, the average value of a randomly drawn card is ~6.3
-    __AVG_RAND_CARD_VAL = 6.296296296
+    __turn_order: List[str]
+    __planned_move: Optional[Tuple[int, bytes, Action]]
+    __pondered: Dict[tuple, Tuple[tuple, object, tuple]]
+    rng: random.Random
+    risk_mode: str
+    estimator: Optional['MonteCarloEstimator']
+    last_risk_estimate: Optional['Estimate']
+    searcher: Optional[ISMCTS]
+    params: ComputerParams
+    ponder_hits: int
+    ponder_misses: int
+    instrumentation: Optional[Instrumentation] = None
+
+    # exact: count every combination of unseen cards, montecarlo: sample them with a MonteCarloEstimator (needs NumPy)
+    # belief: weigh the combinations by what each opponent did with the pile (see belief.py, needs NumPy)
+    RISK_MODES = ('exact', 'montecarlo', 'belief')
+
+    # Discard options only depend on the hand, so they are shared by every computer (and every game) in the process
+    # discard_option_cache is keyed by hand mask, new_discard_option_cache by (hand mask, card id) of a pickup option
+    discard_option_cache = LRUCache(16384)
+    new_discard_option_cache = LRUCache(16384)
 
 
     # Level 1 = Random actions
     # Level 2 = Optimal actions (discard higher cards, sequences, doubles, triples, favor drawing lower cards)
-    # Level 3 = Optimal actions but remembers what was discarded/picked up 30% of the time
-    # Level 4 = Optimal actions but remembers what was discarded/picked up 60% of the time
-    # Level 5 = Optimal actions but remembers what was discarded/picked up 100% of the time
-
-    def __init__(self, name: str, level: int):
-        super().__init__(name)
+    # Level 3 = Optimal actions but remembers every card that was discarded/picked up. Pickups are weighed against the average
+    #           unseen card, and it doesn't call Yaniv when an opponent is likely to Assaf it (params.assaf_risk)
+    # Level 4 = Like level 3 but calls Yaniv as soon as it can
+    # Level 5 = Plays exactly like level 4. Levels 3 to 5 were meant to remember 30%/60%/100% of the cards, which was never applied
+    # Level 6 = Experimental. Remembers everything and searches for its moves with information set Monte Carlo tree search (see
+    #           search.py). searcher sets its time/iteration budget and worker pool. It is weaker than level 5: at 100 iterations a
+    #           move it won 15 of 100 head to head games, so it isn't offered as a difficulty
+
+    def __init__(self, name: str, level: int, verbose: bool = True, rng: Optional[random.Random] = None, risk_mode: str = 'exact',
+                 estimator: Optional['MonteCarloEstimator'] = None, searcher: Optional[ISMCTS] = None,
+                 params: ComputerParams = DEFAULT_PARAMS):
+        super().__init__(name, verbose)
         self.__level = level
+        self.params = params
+        self.rng = rng if rng is not None else random.Random()
+        self.last_risk_estimate = None
+        self.__knowledge = None
+        self.configure_risk(risk_mode, estimator)
+        self.__turn_order = []
+        self.__planned_move = None
+        self.__pondered = {}
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        if level >= 6 and searcher is None:
+            searcher = ISMCTS(seed=self.rng.getrandbits(64))
+        self.searcher = searcher
 
         if level >= 3:
-            memory_chance_dict = {3: 0.3, 4: 0.6, 5: 1}
-            self.__memory_chance = memory_chance_dict.get(level, 1)
-            self.__deck = set()
-            self.__deck_total = 340
+            self.__knowledge = KnowledgeView(PublicKnowledge(), self)
+            self.__track_beliefs()
 
 
-    def initialize_memory(self, other_players: List[str]) -> None:
-        if self.__level >= 3:
-            self.__memory = {p: {'num_cards': 5, 'hand': [], 'discard': [], 'pickup': []} for p in other_players if p != self.name}
+    def configure_risk(self, risk_mode: str, estimator: Optional['MonteCarloEstimator'] = None) -> None:
+        # In montecarlo mode every choose_action/do_turn shares one time budget (estimator.time_budget) for all its Assaf checks
+        if risk_mode not in self.RISK_MODES:
+            raise ValueError(f'Unknown risk mode {risk_mode}. Expected one of {self.RISK_MODES}')
+        if risk_mode == 'montecarlo' and estimator is None:
+            from estimator import MonteCarloEstimator
+            estimator = MonteCarloEstimator(seed=self.rng.getrandbits(64))
+        self.risk_mode = risk_mode
+        self.estimator = estimator
+        self.__track_beliefs()
 
 
-    def reset(self):
-        super().reset()
+    def __track_beliefs(self) -> None:
+        # The table's knowledge keeps the beliefs for every computer that uses them
+        if self.risk_mode == 'belief' and self.__knowledge is not None:
+            self.__knowledge.public.track_beliefs()
+
+
+    @property
+    def level(self) -> int:
+        return self.__level
+
+
+    def __decision_deadline(self) -> Optional[float]:
+        return perf_counter() + self.estimator.time_budget if self.risk_mode == 'montecarlo' else None
+
+
+    def clone(self, public: Optional[PublicKnowledge]) -> 'Computer':
+        # A quiet copy that makes the same decisions as this computer from here on, but reads public instead of the table's
+        # knowledge. Changes to one don't affect the other (except the estimator, which they share)
+        clone = Computer(self.name, self.__level, False, random.Random(), self.risk_mode, self.estimator, None, self.params)
+        clone.set_hand(self.hand_mask)
+        clone.__turn_order = list(self.__turn_order)
+        if self.searcher is not None:
+            clone.searcher = copy.copy(self.searcher)
+            clone.searcher.rng = random.Random()
+        clone.restore_decision_state(self.decision_state())
+        if self.__level >= 3 and public is not None:
+            clone.__knowledge = KnowledgeView(public, clone)
+            clone.__track_beliefs()
+        return clone
+
+
+    def decision_state(self) -> tuple:
+        # Everything besides the hand and the knowledge that a decision depends on and changes
+        return (self.rng.getstate(), self.searcher.rng.getstate() if self.searcher is not None else None, self.__planned_move)
 
-        if self.__level >= 3:
-            self.__memory.clear()
-            self.__deck.clear()
-            self.__deck_total = 340
 
-            rank_list = ['A', 2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K']
+    def restore_decision_state(self, state: tuple) -> None:
+        rng_state, search_rng_state, self.__planned_move = state
+        self.rng.setstate(rng_state)
+        if search_rng_state is not None:
+            self.searcher.rng.setstate(search_rng_state)
 
-            for suit in [Suit.Diamonds, Suit.Hearts, Suit.Clubs, Suit.Spades]:
-                for rank in rank_list:
-                    self.__deck.add(Card(suit, rank))
-            self.__deck.add(Card(Suit.Joker, 'X1'))
-            self.__deck.add(Card(Suit.Joker, 'X2'))
 
+    def decision_key(self, method: str, pickup_options: List[Card], yaniv_total: float) -> tuple:
+        # Two decisions with the same key and decision_state come out the same (up to the time budgets of montecarlo and level 6)
+        fingerprint = self.__knowledge.public.fingerprint() if self.__level >= 3 else None
+        return method, self.hand_mask, tuple(card.id for card in pickup_options), yaniv_total, fingerprint
 
-    def pickup_card(self, new_card: Card) -> None:
-        super().pickup_card(new_card)
-        self.observe(new_card)
 
+    def remember_pondered(self, key: tuple, state: tuple, result, state_after: tuple) -> None:
+        # A decision made ahead of time by a clone (see ponder.py): result is what it returned for key when it started from state,
+        # and state_after is its decision_state afterwards. choose_action and do_turn use it instead of deciding again
+        self.__pondered[key] = state, result, state_after
 
-    def observe(self, discard: Union[Card, List[Card]], pickup: Optional[Union[Card, str]] = None, player_name: str = None) -> None:
+
+    def forget_pondered(self) -> None:
+        self.__pondered = {}
+
+
+    def __take_pondered(self, method: str, pickup_options: List[Card], yaniv_total: float):
+        # A miss means this turn went differently from every move that was worked out, so the rest is of no use either
+        entry = self.__pondered.pop(self.decision_key(method, pickup_options, yaniv_total), None)
+        if entry is None or entry[0] != self.decision_state():
+            self.ponder_misses += 1
+            self.__pondered = {}
+            return None
+        self.ponder_hits += 1
+        self.restore_decision_state(entry[2])
+        return entry[1]
+
+
+    def initialize_memory(self, other_players: List[str], public: Optional[PublicKnowledge] = None) -> None:
+        # At a table every computer reads the table's public knowledge, which the table resets and updates. Without one the computer
+        # starts its own and has to be told what it sees with observe()
+        if self.__level >= 3:
+            self.__knowledge = KnowledgeView(public if public is not None else PublicKnowledge(other_players), self)
+            self.__turn_order = list(other_players)
+            self.__track_beliefs()
+
+
+    def knowledge(self, seat_names: List[str]) -> Optional[BotKnowledge]:
+        # What this computer knows, in seat order (see state.BotKnowledge). Levels 1 and 2 don't remember anything
         if self.__level <= 2:
+            return None
+        view = self.__knowledge
+        num_cards, known_hands = [], []
+        for name in seat_names:
+            memory = view.opponent(name)
+            num_cards.append(memory.num_cards if memory is not None else NOT_TRACKED)
+            known_hands.append(memory.held if memory is not None else 0)
+        return BotKnowledge(view.unseen, view.unseen_total(), tuple(view.unseen_value_counts()), tuple(num_cards), tuple(known_hands))
+
+
+    def restore_knowledge(self, knowledge: Optional[BotKnowledge], seat_names: List[str]) -> None:
+        # Adds to the public knowledge, so a table resets it first (see PublicKnowledge.restore). The hand has to be set already
+        # The discarded and declined cards aren't part of the snapshot, so they start out empty
+        if self.__level <= 2 or knowledge is None:
             return
+        self.__knowledge.public.restore(knowledge, self.hand_mask, seat_names)
+        self.__turn_order = [name for seat, name in enumerate(seat_names) if knowledge.num_cards[seat] != NOT_TRACKED or name == self.name]
 
-        if isinstance(discard, Card):
-            discard = [discard]
 
-        for card in discard:
-            if card in self.__deck:
-                self.__deck.remove(card)
-                self.__deck_total -= card.value()
+    def observe(self, discard: Union[Card, List[Card]], pickup: Optional[Card] = None, player_name: str = None,
+                declined: Optional[List[Card]] = None) -> None:
+        # Cards that became visible, and what player_name did on their turn: pickup is the card they picked up or None if they drew
+        # from the deck, declined are the pickup options they passed on when drawing
+        # Only for a computer with its own knowledge, a table updates its public knowledge once for all of its computers
+        if self.__level <= 2:
+            return
 
+        if isinstance(discard, Card):
+            discard = [discard]
         if player_name:
-            self.__memory[player_name]['discard'].append(discard)
-            self.__memory[player_name]['num_cards'] -= len(discard) - 1
+            self.__knowledge.public.observe_turn(player_name, discard, pickup, declined)
+        else:
+            self.__knowledge.public.reveal(discard)
 
-            for card in discard:
-                if card in self.__memory[player_name]['hand']:
-                    self.__memory[player_name]['hand'].remove(card)
-            if pickup is not None:
-                if isinstance(pickup, Card):
-                    self.__memory[player_name]['hand'].append(pickup)
-                self.__memory[player_name]['pickup'].append(pickup)
+
+    def opponent_memory(self, player_name: str) -> Optional[OpponentMemory]:
+        # What this computer remembers about an opponent, None for levels 1 and 2 and players it doesn't track
+        if self.__level <= 2:
+            return None
+        return self.__knowledge.opponent(player_name)
 
 
     def choose_action(self, yaniv_total: float, pickup_options: List[Card]) -> GameState:
-        if self.calc_hand_value() <= yaniv_total:
+        if self.__pondered:
+            action = self.__take_pondered('choose_action', pickup_options, yaniv_total)
+            if action is not None:
+                return action
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return self.__choose_action(yaniv_total, pickup_options)
+        instrumentation.begin(self.name, 'choose_action')
+        try:
+            return self.__choose_action(yaniv_total, pickup_options)
+        finally:
+            instrumentation.end()
+
+
+    def __choose_action(self, yaniv_total: float, pickup_options: List[Card]) -> GameState:
+        if self.__level >= 6:
+            return GameState.CallYaniv if self.__search(pickup_options, yaniv_total, True) is YANIV else GameState.DiscardPickup
+
+        deadline = self.__decision_deadline()
+        if self.hand_value <= yaniv_total:
             if self.__level == 3:
-                if self.calc_hand_value() == 0:
+                if self.hand_value == 0:
                     return GameState.CallYaniv
 
-                for p in self.__memory:
-                    # If chance of assaf is more than 20% (can be changed), don't call yaniv
-                    chance_of_assaf = self.calc_probability_lte(self.__memory[p], self.calc_hand_value())
-                    print(f'Yaniv check: Chance of Assaf for {p} {round(chance_of_assaf * 100, 2)}%')
-                    if chance_of_assaf > 0.20:
+                for p, chance_of_assaf in self.opponent_risks(self.hand_value, deadline):
+                    # If chance of assaf is more than params.assaf_risk, don't call yaniv
+                    if self.verbose:
+                        print(f'Yaniv check: Chance of Assaf for {p} {round(chance_of_assaf * 100, 2)}%')
+                    if chance_of_assaf > self.params.assaf_risk:
                         return GameState.DiscardPickup
             return GameState.CallYaniv
         else:
             return GameState.DiscardPickup
 
 
-    def calc_probability_lte(self, player_memory: dict, lte_val: float) -> float:
-        # The purpose of this method is to check if the opponent can call Yaniv or if they can call Assaf when the Computer can call Yaniv
-        # The lte_val variable is meant to describe either the maximum Yaniv value or the Computer's hand value
-        hand_total = sum([c.value() for c in player_memory['hand']])
+    def calc_probability_lte(self, player_memory: OpponentMemory, lte_val: float, deadline: Optional[float] = None) -> float:
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return self.__calc_probability_lte(player_memory, lte_val, deadline)
+        start = perf_counter()
+        try:
+            return self.__calc_probability_lte(player_memory, lte_val, deadline)
+        finally:
+            instrumentation.add_time('assaf_risk', perf_counter() - start)
+
+
+    def opponent_risks(self, lte_val: float, deadline: Optional[float] = None) -> List[Tuple[str, float]]:
+        # The chance of every opponent (in turn order) that their hand is worth at most lte_val
+        # In belief mode the opponents are worked out together from one set of beliefs, shared by every lte_val until the next turn
+        opponents = list(self.__knowledge.opponents())
+        if self.risk_mode != 'belief':
+            return [(p, self.calc_probability_lte(memory, lte_val, deadline)) for p, memory in opponents]
+
+        start = perf_counter()
+        risks = {p: self.__certain_probability(memory, lte_val) for p, memory in opponents}
+        uncertain = [(p, memory) for p, memory in opponents if risks[p] is None]
+        if uncertain:
+            cumulative = self.__knowledge.public.belief.unknown_sum_distributions(
+                self.__knowledge.unseen, [p for p, _ in uncertain], [memory.unknown_cards for _, memory in uncertain]).cumsum(axis=1)
+            # Rounded so floating point noise doesn't tip a chance that is exactly params.assaf_risk over it
+            for (p, memory), row in zip(uncertain, cumulative):
+                risks[p] = round(float(row[min(int(lte_val - memory.held_value), len(row) - 1)]), 12)
+        if self.instrumentation is not None:
+            self.instrumentation.add_time('assaf_risk', perf_counter() - start)
+        return [(p, risks[p]) for p, _ in opponents]
+
+
+    def __certain_probability(self, player_memory: OpponentMemory, lte_val: float) -> Optional[float]:
+        # The cases where the opponent's chance doesn't depend on their unknown cards, None otherwise
+        hand_total = player_memory.held_value
 
         # If an opponent's known hand total is greater than lte_val, there is a 0% chance their hand is smaller
         if hand_total > lte_val:
             return 0
 
         # If we know all the cards in an opponent's hand and the total hand value is less than or equal than the lte_val, return 1
-        if player_memory['num_cards'] == len(player_memory['hand']) and hand_total <= self.calc_hand_value():
+        unknown_card_count = player_memory.unknown_cards
+        if unknown_card_count == 0 and hand_total <= self.hand_value:
             return 1
 
-        unknown_card_count = player_memory['num_cards'] - len(player_memory['hand'])
-        jokers_in_deck = (Card(Suit.Joker, 'X1') in self.__deck) + (Card(Suit.Joker, 'X2') in self.__deck)
+        jokers_in_deck = (self.__knowledge.unseen & JOKER_MASK).bit_count()
 
         # If there are 5 unknown cards, or it's impossible to have a hand with a value smaller than lte_val (even with jokers) return 0
         # Ex: lte_val = 3, the player is holding a 2♣, has two unknown cards, and it's not possible they could be holding a joker
@@ -128,32 +349,107 @@ class Computer(Player):
         # they could have an Ace and a Joker which would give them a hand value of 3 or have two other jokers
         if unknown_card_count == 5 or lte_val < hand_total + unknown_card_count - jokers_in_deck:
             return 0
+        return None
 
-        # Iterate through the different combinations of possible cards they could have and count how many ways the opponent's hand could be
-        # less than or equal to lte_val. Return the % of possibilities where such a hand value exists
-        valid_combos, total_combos = 0, 0
-        for combo in combinations(self.__deck, unknown_card_count):
-            combo_value = sum(card.value() for card in combo)
-            if hand_total + combo_value <= lte_val:
-                valid_combos += 1
-            total_combos += 1
 
+    def __calc_probability_lte(self, player_memory: OpponentMemory, lte_val: float, deadline: Optional[float]) -> float:
+        # The purpose of this method is to check if the opponent can call Yaniv or if they can call Assaf when the Computer can call Yaniv
+        # The lte_val variable is meant to describe either the maximum Yaniv value or the Computer's hand value
+        # In montecarlo mode, sampling stops at the deadline (a perf_counter() time) or after the estimator's time budget if there is none
+        certain = self.__certain_probability(player_memory, lte_val)
+        if certain is not None:
+            return certain
+        hand_total = player_memory.held_value
+        unknown_card_count = player_memory.unknown_cards
+        unseen = self.__knowledge.unseen
+
+        # Count how many combinations of unseen cards would make the opponent's hand less than or equal to lte_val
+        # Return the % of possible hands where such a hand value exists
+        if self.risk_mode == 'montecarlo':
+            self.last_risk_estimate = self.estimator.probability_lte(self.__knowledge.unseen_value_counts(), hand_total, unknown_card_count, lte_val, deadline)
+            if self.instrumentation is not None:
+                self.instrumentation.count('risk_samples', self.last_risk_estimate.samples)
+            return self.last_risk_estimate.probability
+
+        total_combos = comb(unseen.bit_count(), unknown_card_count)
+        if self.instrumentation is not None:
+            self.instrumentation.count('combinations', total_combos)
+        if total_combos == 0:
+            return 0
+
+        valid_combos = sum(count_hand_sums(self.__knowledge.unseen_value_counts(), unknown_card_count, int(lte_val - hand_total)))
         return valid_combos / total_combos
 
 
-    def __get_new_discard_options(self, discard_options: List[Union[Card, List[Card]]], new_card: Card) -> List[List[Card]]:
-        self.pickup_card(new_card)
-        new_discard_options = self.get_discard_options()
-        self.discard_card(new_card)
+    def hand_value_distribution(self, player_memory: OpponentMemory) -> List[float]:
+        # Probability of each possible hand value (the index) of an opponent
+        # The known cards are fixed and the unknown cards are any combination of cards this computer hasn't seen
+        hand_total = player_memory.held_value
+        unknown_card_count = player_memory.unknown_cards
+        ways = count_hand_sums(self.__knowledge.unseen_value_counts(), unknown_card_count)
+        total_combos = sum(ways)
+        if total_combos == 0:
+            return [0.0] * (hand_total + 1)
+        return [0.0] * hand_total + [w / total_combos for w in ways]
+
+
+    def observation(self, pickup_options: List[Card], yaniv_total: float, can_call_yaniv: bool) -> Observation:
+        # What this computer knows right now, with the players in turn order (see search.Observation)
+        players = self.__knowledge.public.players
+        num_cards = tuple(len(self.cards) if name == self.name else players[name].num_cards for name in self.__turn_order)
+        known_hands = tuple(self.hand_mask if name == self.name else players[name].held for name in self.__turn_order)
+        return Observation(self.__turn_order.index(self.name), self.hand_mask, bytes(c.id for c in pickup_options), self.__knowledge.unseen,
+                           num_cards, known_hands, int(yaniv_total), can_call_yaniv and self.hand_value <= yaniv_total)
 
-        for d in discard_options:
-            try:
-                new_discard_options.remove(d)
-            except ValueError:
-                pass
 
-        new_discard_options.remove(new_card)
-        return new_discard_options
+    def __search(self, pickup_options: List[Card], yaniv_total: float, can_call_yaniv: bool) -> Action:
+        # choose_action searches over calling Yaniv and every discard/pickup, and keeps the best move for the do_turn that follows
+        key = (self.hand_mask, bytes(c.id for c in pickup_options))
+        if not can_call_yaniv and self.__planned_move is not None and self.__planned_move[:2] == key:
+            return self.__planned_move[2]
+
+        instrumentation = self.instrumentation
+        action = self.searcher.search(self.observation(pickup_options, yaniv_total, can_call_yaniv))
+        self.__planned_move = key + (action,) if action is not YANIV else None
+        if instrumentation is not None:
+            stats = self.searcher.last_stats
+            instrumentation.add_time('search', stats.elapsed)
+            instrumentation.count('mcts_iterations', stats.iterations)
+            instrumentation.count('mcts_nodes', stats.nodes)
+            instrumentation.count('mcts_rollout_turns', stats.rollout_turns)
+        return action
+
+
+    @classmethod
+    def configure_option_caches(cls, maxsize: int) -> None:
+        cls.discard_option_cache.resize(maxsize)
+        cls.new_discard_option_cache.resize(maxsize)
+
+
+    @classmethod
+    def option_cache_stats(cls) -> dict:
+        return {'discard_options': cls.discard_option_cache.stats(), 'new_discard_options': cls.new_discard_option_cache.stats()}
+
+
+    def get_discard_options(self) -> List[Union[Card, List[Card]]]:
+        discard_options = self.discard_option_cache.get(self.hand_mask)
+        if discard_options is None:
+            discard_options = tuple(super().get_discard_options())
+            self.discard_option_cache.put(self.hand_mask, discard_options)
+        return _copy_options(discard_options)
+
+
+    def __get_new_discard_options(self, discard_options: List[Union[Card, List[Card]]], new_card: Card) -> List[List[Card]]:
+        # The discard options that picking up new_card would add to the current hand
+        # discard_options are the options of the current hand, so the result only depends on the hand and the card
+        key = (self.hand_mask, new_card.id)
+        new_discard_options = self.new_discard_option_cache.get(key)
+        if new_discard_options is None:
+            current_options = {option_key(d) for d in discard_options}
+            new_discard_options = tuple(d for d in discard_options_for_mask(self.hand_mask | 1 << new_card.id)
+                                        if d is not new_card and option_key(d) not in current_options)
+            self.new_discard_option_cache.put(key, new_discard_options)
+        return _copy_options(new_discard_options)
 
 
     @staticmethod
@@ -164,7 +460,7 @@ class Computer(Player):
         max_discard = 0
         max_index = []
         for i in range(len(discard_options)):
-            val = discard_options[i].value() if isinstance(discard_options[i], Card) else sum([c.value() for c in discard_options[i]])
+            val = CARD_VALUES[discard_options[i].id] if isinstance(discard_options[i], Card) else sum([CARD_VALUES[c.id] for c in discard_options[i]])
             discard_value.append(val)
 
             if val == max_discard:
@@ -177,25 +473,55 @@ class Computer(Player):
 
 
     def do_turn(self, pickup_options: List[Card], yaniv_total: float) -> Tuple[Union[Card, List[Card]], int]:
+        if self.__pondered:
+            decision = self.__take_pondered('do_turn', pickup_options, yaniv_total)
+            if decision is not None:
+                if self.verbose and self.__level < 6:
+                    print(f'{self.name} discarded', decision[0])
+                return decision
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return self.__do_turn(pickup_options, yaniv_total, None)
+        instrumentation.begin(self.name, 'do_turn')
+        try:
+            return self.__do_turn(pickup_options, yaniv_total, instrumentation)
+        finally:
+            instrumentation.end()
+
+
+    def __do_turn(self, pickup_options: List[Card], yaniv_total: float,
+                  instrumentation: Optional[Instrumentation]) -> Tuple[Union[Card, List[Card]], int]:
+        if self.__level >= 6:
+            discard, pickup_choice = self.__search(pickup_options, yaniv_total, False)
+            return ALL_CARDS[discard[0]] if len(discard) == 1 else [ALL_CARDS[i] for i in discard], pickup_choice
+
+        deadline = self.__decision_deadline()
+
         # Get the discard options
+        if instrumentation is not None:
+            stage_start = perf_counter()
         discard_options = self.get_discard_options()
-        if self.__level == 3:
-            for p in self.__memory:
-                # If chance of assaf is more than 5% (can be changed), don't call yaniv
-                chance_of_assaf = self.calc_probability_lte(self.__memory[p], yaniv_total)
-                if chance_of_assaf > 0.2:
+        if instrumentation is not None:
+            instrumentation.add_time('option_generation', perf_counter() - stage_start)
+            instrumentation.count('options_generated', len(discard_options))
+        if self.__level == 3 and self.verbose:
+            for p, chance_of_assaf in self.opponent_risks(yaniv_total, deadline):
+                # If chance of assaf is more than params.assaf_risk, don't call yaniv
+                if chance_of_assaf > self.params.assaf_risk:
                     print(f'Chance of Assaf for {p} {round(chance_of_assaf * 100, 2)}%')
 
         if self.__level == 1:
             # Level 1 Computer makes random discard and pickup choices
-            discard_choice = discard_options[random.randint(0, len(discard_options) - 1)]
-            pickup_choice = random.randint(1, len(pickup_options) + 1)
+            discard_choice = discard_options[self.rng.randint(0, len(discard_options) - 1)]
+            pickup_choice = self.rng.randint(1, len(pickup_options) + 1)
         else:
             max_index, max_discard = self.__evaluate_discards(discard_options)
             pickup_choice = None
             discard_choice = None
 
             # Check each possible pickup option
+            if instrumentation is not None:
+                stage_start = perf_counter()
             new_discard_max = None
             for pickup_index in range(len(pickup_options)):
                 # If the card is a joker, automatically pick it up. There is never a reason to not pick up a joker
@@ -206,8 +532,10 @@ class Computer(Player):
 
                 # Check if you get any new discard options by picking up this card
                 new_discard_options = self.__get_new_discard_options(discard_options, pickup_options[pickup_index])
+                if instrumentation is not None:
+                    instrumentation.count('options_generated', len(new_discard_options))
                 for new_discard_set in new_discard_options:
-                    val = sum([card.value() for card in new_discard_set])
+                    val = sum([CARD_VALUES[card.id] for card in new_discard_set])
 
                     if val <= max_discard:
                         # If the new option is less or equal to the current best discard, see if you can discard the current best option,
@@ -230,16 +558,20 @@ class Computer(Player):
                         for j in range(len(discard_options)):
                             if isinstance(discard_options[j], Card):
                                 if discard_options[j] in new_discard_set:
-                                    tmp_discard_options[j] = Card(Suit.Joker, 'X1')
+                                    tmp_discard_options[j] = JOKER_1
                             else:
                                 if any(card in new_discard_set for card in discard_options[j]):
-                                    tmp_discard_options[j] = Card(Suit.Joker, 'X1')
+                                    tmp_discard_options[j] = JOKER_1
 
                         if any([x.suit != Suit.Joker for x in tmp_discard_options if isinstance(x, Card)]):
                             max_index, max_discard = self.__evaluate_discards(tmp_discard_options)
                             pickup_choice = pickup_index
                             new_discard_max = val
 
+            if instrumentation is not None:
+                instrumentation.add_time('pickup_evaluation', perf_counter() - stage_start)
+                stage_start = perf_counter()
+
             if discard_choice is None:
                 if len(max_index) == 1:
                     discard_choice = discard_options[max_index[0]]
@@ -282,14 +614,20 @@ class Computer(Player):
                                 break
 
             if pickup_choice is None:
-                deck_avg_val = self.__AVG_RAND_CARD_VAL if self.__level == 2 else self.__deck_total / len(self.__deck)
-                # 5% chance to decrease chance deck_avg value to help encourage drawing from the deck to avoid infinite loops where no computers want to draw
-                if random.random() <= 0.05:
+                # Level 3 and up expect the average unseen card. Once every card has been seen there is none, so they guess like level 2
+                unseen_count = self.__knowledge.unseen.bit_count() if self.__level > 2 else 0
+                deck_avg_val = self.__knowledge.unseen_total() / unseen_count if unseen_count else self.params.avg_random_card_value
+                # params.draw_nudge chance to decrease deck_avg value to help encourage drawing from the deck to avoid infinite loops where no computers want to draw
+                if self.rng.random() <= self.params.draw_nudge:
                     deck_avg_val -= 1
                 if pickup_options[0].value() < deck_avg_val:
                     pickup_choice = 0
                 else:
                     pickup_choice = len(pickup_options)
 
-        print(f'{self.name} discarded', discard_choice)
+            if instrumentation is not None:
+                instrumentation.add_time('tie_breaking', perf_counter() - stage_start)
+
+        if self.verbose:
+            print(f'{self.name} discarded', discard_choice)
         return discard_choice, pickup_choice + 1
@@ -0,0 +1,170 @@
+import argparse
+import glob
+import os
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from card import Card, mask_to_ids
+from computer import Computer
+from simulation import simulate_game
+
+# Training data from self-play: one row per Computer.do_turn decision, written in chunks of chunk_size rows to chunk-NNNNNN.npz
+# Cards are stored as card ids padded with -1. Every chunk holds these columns (one entry per row unless noted otherwise)
+#   seed, round, turn       the game's seed, the round of the game and the turn of the round the decision was made on
+#   seat, level             who decided, num_players: players still in the game
+#   hand (5)                the hand before the turn in id order, pickup_options (2) the face up cards it could pick up
+#   seen                    bitmask of the cards that were face up this round, opponent_cards (MAX_OPPONENTS) hand sizes of the
+#                           other players in turn order starting after the player
+#   options (rows of 5)     every legal discard of every row, row i has options[option_offsets[i]:option_offsets[i + 1]]
+#   discard (5)             the chosen discard in discard order and discard_option its index among the row's options (the option
+#                           with the same cards in the same order, -1 if there is none)
+#   pickup_choice           1-based like Computer.do_turn, anything bigger than the number of pickup options draws from the deck
+#   won_round, called_yaniv, assaf, round_points, final_hand_value
+#                           the outcome of the round for the player, filled in once the round is scored
+MAX_HAND_CARDS = 5
+MAX_PICKUP_OPTIONS = 2
+MAX_OPPONENTS = 5
+CHUNK_SIZE = 1 << 16
+
+_COLUMNS = {
+    'seed': np.int64, 'round': np.int16, 'turn': np.int16, 'seat': np.int8, 'level': np.int8, 'num_players': np.int8,
+    'hand': np.int8, 'pickup_options': np.int8, 'seen': np.uint64, 'opponent_cards': np.int8,
+    'discard': np.int8, 'discard_option': np.int16, 'pickup_choice': np.int8,
+    'won_round': np.bool_, 'called_yaniv': np.bool_, 'assaf': np.bool_, 'round_points': np.int16, 'final_hand_value': np.int16,
+}
+
+
+def _padded_ids(cards: List[Card], width: int) -> List[int]:
+    return [card.id for card in cards] + [-1] * (width - len(cards))
+
+
+class DecisionRecorder:
+    directory: str
+    chunk_size: int
+    compress: bool
+    chunks: int
+    rows: int
+
+
+    # Collects the decisions of every computer of the games it is attached to (see simulate_game). Rows wait in pending until their
+    # round is scored and then move to the current chunk, so memory holds at most one round plus one chunk no matter how many
+    # games are recorded. Rounds that never get scored are dropped
+    def __init__(self, directory: str, chunk_size: int = CHUNK_SIZE, compress: bool = True):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.compress = compress
+        # Numbering continues after the chunks already in the directory
+        self.chunks = len(glob.glob(os.path.join(directory, 'chunk-*.npz')))
+        self.rows = 0
+        self.__seed = 0
+        self.__pending = []
+        self.__chunk = []
+
+
+    def start_game(self, seed: int) -> None:
+        self.__seed = seed
+        self.__pending.clear()
+
+
+    def record(self, game, player: Computer, discard_choice: Union[Card, List[Card]], pickup_choice: int) -> None:
+        # Called with the decision before it is played, while the hand and the pickup options are still the ones it was made on
+        # pickup_choice is the one that gets played, after Yaniv overrides it for a round that went on too long
+        discard = discard_choice if isinstance(discard_choice, list) else [discard_choice]
+        options = player.get_discard_options()
+        option_ids = [_padded_ids(option if isinstance(option, list) else [option], MAX_HAND_CARDS) for option in options]
+        discard_ids = _padded_ids(discard, MAX_HAND_CARDS)
+        # Options with the same cards in another order are different discards (they leave different pickup options)
+        discard_option = option_ids.index(discard_ids) if discard_ids in option_ids else -1
+        seat = game.players_list.index(player)
+        opponents = game.players_list[seat + 1:] + game.players_list[:seat]
+        self.__pending.append((
+            self.__seed, len(game.round_history), game.round_turns, game.seats.index(player), player.level, len(game.players_list),
+            mask_to_ids(player.hand_mask) + [-1] * (MAX_HAND_CARDS - len(player.cards)),
+            _padded_ids(game.pickup_options, MAX_PICKUP_OPTIONS),
+            game.public_knowledge.seen,
+            [len(p.cards) for p in opponents] + [-1] * (MAX_OPPONENTS - len(opponents)),
+            option_ids, discard_ids, discard_option, pickup_choice,
+        ))
+
+
+    def end_round(self, game, result) -> None:
+        # result is the RoundResult score_round just added to the game's round_history
+        previous = game.round_history[-2].points if len(game.round_history) > 1 else (0,) * len(game.seats)
+        for row in self.__pending:
+            seat = row[3]
+            self.__chunk.append(row + (seat == result.winner, seat == result.caller, result.assaf,
+                                       result.points[seat] - previous[seat], game.seats[seat].calc_hand_value()))
+            if len(self.__chunk) == self.chunk_size:
+                self.flush()
+        self.__pending.clear()
+
+
+    def flush(self) -> None:
+        # Write the rows collected so far as one chunk. Only close() writes a chunk with fewer than chunk_size rows
+        if not self.__chunk:
+            return
+        columns = list(zip(*self.__chunk))
+        options = columns.pop(10)
+        arrays = {name: np.array(values, dtype=dtype) for (name, dtype), values in zip(_COLUMNS.items(), columns)}
+        arrays['options'] = np.array([ids for row in options for ids in row], dtype=np.int8).reshape(-1, MAX_HAND_CARDS)
+        arrays['option_offsets'] = np.concatenate(([0], np.cumsum([len(row) for row in options]))).astype(np.int32)
+
+        # Write to a temporary file first so readers never see a half written chunk
+        path = os.path.join(self.directory, f'chunk-{self.chunks:06d}.npz')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            (np.savez_compressed if self.compress else np.savez)(f, **arrays)
+        os.replace(tmp_path, path)
+        self.chunks += 1
+        self.rows += len(self.__chunk)
+        self.__chunk = []
+
+
+    def close(self) -> None:
+        self.flush()
+        self.__pending.clear()
+
+
+    def __enter__(self) -> 'DecisionRecorder':
+        return self
+
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def read_chunks(directory: str) -> Iterator[Dict[str, np.ndarray]]:
+    # Chunks in the order they were written, one at a time
+    for path in sorted(glob.glob(os.path.join(directory, 'chunk-*.npz'))):
+        with np.load(path) as chunk:
+            yield dict(chunk)
+
+
+def row_options(chunk: Dict[str, np.ndarray], row: int) -> np.ndarray:
+    return chunk['options'][chunk['option_offsets'][row]:chunk['option_offsets'][row + 1]]
+
+
+def export_games(directory: str, levels: List[int], seeds: range, yaniv_total: int = 7, chunk_size: int = CHUNK_SIZE,
+                 compress: bool = True) -> Tuple[int, int]:
+    # Returns the number of rows written and the number of chunks in the directory
+    with DecisionRecorder(directory, chunk_size, compress) as recorder:
+        for seed in seeds:
+            simulate_game(levels, seed, yaniv_total, recorder=recorder)
+    return recorder.rows, recorder.chunks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record the decisions of self-play games as training data')
+    parser.add_argument('directory')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--levels', type=int, nargs='+', default=[2, 3, 5])
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first game, the others use the following seeds')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per chunk file')
+    parser.add_argument('--no-compress', action='store_true')
+    args = parser.parse_args()
+
+    rows, chunks = export_games(args.directory, args.levels, range(args.seed, args.seed + args.games), chunk_size=args.chunk_size,
+                                compress=not args.no_compress)
+    print(f'Wrote {rows} decisions to {args.directory} ({chunks} chunks)')
@@ -0,0 +1,71 @@
+import math
+from dataclasses import dataclass
+from time import perf_counter
+from typing import List, Optional
+
+import numpy as np
+
+
+@dataclass
+class Estimate:
+    probability: float
+    # Half width of the 95% confidence interval around probability
+    error: float
+    samples: int
+    elapsed: float
+
+
+class MonteCarloEstimator:
+    time_budget: float
+    ci_width: float
+    batch_size: int
+    max_samples: int
+    rng: np.random.Generator
+
+    Z_95 = 1.959963984540054
+
+
+    # Estimates the chance an opponent's hand is worth at most some value by dealing them random unseen cards
+    # Sampling stops once the 95% confidence interval is narrower than ci_width, the time budget (seconds) is used up
+    # or max_samples hands have been dealt. At least one batch is always dealt
+    def __init__(self, time_budget: float = 0.002, ci_width: float = 0.02, batch_size: int = 1024, max_samples: int = 100000,
+                 seed: Optional[int] = None):
+        self.time_budget = time_budget
+        self.ci_width = ci_width
+        self.batch_size = batch_size
+        self.max_samples = max_samples
+        self.rng = np.random.default_rng(seed)
+
+
+    def probability_lte(self, value_counts: List[int], known_total: int, unknown_card_count: int, lte_val: float,
+                        deadline: Optional[float] = None) -> Estimate:
+        # value_counts[v] is the number of unseen cards worth v. The opponent's unknown cards are drawn from them without replacement
+        start = perf_counter()
+        if deadline is None:
+            deadline = start + self.time_budget
+
+        deck_values = np.repeat(np.arange(len(value_counts)), value_counts)
+        limit = lte_val - known_total
+        if unknown_card_count <= 0 or unknown_card_count > len(deck_values):
+            hit = float(limit >= 0) if unknown_card_count == 0 else 0.0
+            return Estimate(hit, 0.0, 0, perf_counter() - start)
+
+        hits, samples = 0, 0
+        while True:
+            # Taking the k smallest of n random keys per row deals k distinct cards per row
+            keys = self.rng.random((self.batch_size, len(deck_values)))
+            dealt = np.argpartition(keys, unknown_card_count - 1, axis=1)[:, :unknown_card_count]
+            hits += int(np.count_nonzero(deck_values[dealt].sum(axis=1) <= limit))
+            samples += self.batch_size
+
+            error = self.confidence_half_width(hits, samples)
+            if 2 * error <= self.ci_width or samples >= self.max_samples or perf_counter() >= deadline:
+                return Estimate(hits / samples, error, samples, perf_counter() - start)
+
+
+    @classmethod
+    def confidence_half_width(cls, hits: int, samples: int) -> float:
+        # Agresti-Coull interval, which stays meaningful when no (or every) sample is a hit
+        adjusted_samples = samples + cls.Z_95 ** 2
+        adjusted_p = (hits + cls.Z_95 ** 2 / 2) / adjusted_samples
+        return cls.Z_95 * math.sqrt(adjusted_p * (1 - adjusted_p) / adjusted_samples)
@@ -0,0 +1,198 @@
+import struct
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from card import ALL_CARDS, Card
+from utils import GameState
+
+# Every record is one type byte followed by its payload. Cards are written as their one byte id
+#   GAME_START  seed (u64, 0 = none), has seed (u8), yaniv total (u8), max round turns (u16, 0 = none),
+#               human name length (u8, 255 = no human) + utf-8 name, number of computers (u8) + one level byte each
+#   ROUND_START starting turn (u8), deck order (54 ids, the top of the deck is the last id)
+#   RESHUFFLE   number of cards (u8) + deck order. Written right after the TURN whose draw from the deck needed it
+#   TURN        seat (u8), number of discarded cards (u8) + ids in discard order, pickup choice (u8, 0 = deck, i = ith pile card)
+#   YANIV       caller seat (u8), winner seat (u8), assaf (u8)
+#   SCORES      number of seats (u8) + points of every seat (i16)
+#   GAME_END    winner seat (u8)
+GAME_START = 1
+ROUND_START = 2
+RESHUFFLE = 3
+TURN = 4
+YANIV = 5
+SCORES = 6
+GAME_END = 7
+
+NO_HUMAN = 255
+MAX_SEED = (1 << 64) - 1
+_GAME_HEADER = struct.Struct('<QBBH')
+_YANIV = struct.Struct('<BBB')
+
+
+class EventLogWriter:
+    file: BinaryIO
+    buffer_size: int
+
+    # Appends games to a binary file. Records are collected in memory and written buffer_size bytes at a time
+    def __init__(self, path_or_file: Union[str, BinaryIO], buffer_size: int = 1 << 16):
+        self.file = open(path_or_file, 'ab') if isinstance(path_or_file, str) else path_or_file
+        self.buffer_size = buffer_size
+        self.__buffer = bytearray()
+
+
+    def __write(self, record: bytes) -> None:
+        self.__buffer += record
+        if len(self.__buffer) >= self.buffer_size:
+            self.flush()
+
+
+    def game_start(self, seed: Optional[int], yaniv_total: int, max_round_turns: Optional[int], player_name: Optional[str],
+                   computer_levels: List[int]) -> None:
+        # Called before the first round is dealt, so a seed the log can't hold stops the game before it starts
+        if seed is not None and not 0 <= seed <= MAX_SEED:
+            raise ValueError(f'Event logs store seeds from 0 to {MAX_SEED}, got {seed}')
+        record = bytearray([GAME_START])
+        record += _GAME_HEADER.pack(seed or 0, seed is not None, yaniv_total, max_round_turns or 0)
+        if player_name is None:
+            record.append(NO_HUMAN)
+        else:
+            name = player_name.encode()[:NO_HUMAN - 1]
+            record.append(len(name))
+            record += name
+        record.append(len(computer_levels))
+        record += bytes(computer_levels)
+        self.__write(record)
+
+
+    def round_start(self, starting_turn: int, deck: List[Card]) -> None:
+        self.__write(bytes([ROUND_START, starting_turn]) + bytes(card.id for card in deck))
+
+
+    def reshuffle(self, deck: List[Card]) -> None:
+        self.__write(bytes([RESHUFFLE, len(deck)]) + bytes(card.id for card in deck))
+
+
+    def turn(self, seat: int, discard: List[Card], pickup_choice: int) -> None:
+        self.__write(bytes([TURN, seat, len(discard)]) + bytes(card.id for card in discard) + bytes([pickup_choice]))
+
+
+    def yaniv(self, caller: int, winner: int, assaf: bool) -> None:
+        self.__write(bytes([YANIV]) + _YANIV.pack(caller, winner, assaf))
+
+
+    def scores(self, points: List[int]) -> None:
+        self.__write(bytes([SCORES, len(points)]) + struct.pack(f'<{len(points)}h', *points))
+
+
+    def game_end(self, winner: int) -> None:
+        self.__write(bytes([GAME_END, winner]))
+
+
+    def flush(self) -> None:
+        if self.__buffer:
+            self.file.write(self.__buffer)
+            self.__buffer.clear()
+        self.file.flush()
+
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+def read_events(data: bytes) -> Iterator[Tuple[int, tuple]]:
+    # Yields (record type, fields) for every record in a log
+    # GAME_START fields are (seed, yaniv total, max round turns, player name, computer levels) with None for anything missing
+    pos = 0
+    while pos < len(data):
+        kind = data[pos]
+        pos += 1
+        if kind == GAME_START:
+            seed, has_seed, yaniv_total, max_round_turns = _GAME_HEADER.unpack_from(data, pos)
+            pos += _GAME_HEADER.size
+            name_length = data[pos]
+            pos += 1
+            player_name = None
+            if name_length != NO_HUMAN:
+                player_name = data[pos:pos + name_length].decode()
+                pos += name_length
+            num_computers = data[pos]
+            levels = list(data[pos + 1:pos + 1 + num_computers])
+            pos += 1 + num_computers
+            yield kind, (seed if has_seed else None, yaniv_total, max_round_turns or None, player_name, levels)
+        elif kind == ROUND_START:
+            yield kind, (data[pos], [ALL_CARDS[i] for i in data[pos + 1:pos + 1 + len(ALL_CARDS)]])
+            pos += 1 + len(ALL_CARDS)
+        elif kind == RESHUFFLE:
+            count = data[pos]
+            yield kind, ([ALL_CARDS[i] for i in data[pos + 1:pos + 1 + count]],)
+            pos += 1 + count
+        elif kind == TURN:
+            seat, count = data[pos], data[pos + 1]
+            discard = [ALL_CARDS[i] for i in data[pos + 2:pos + 2 + count]]
+            yield kind, (seat, discard, data[pos + 2 + count])
+            pos += 3 + count
+        elif kind == YANIV:
+            caller, winner, assaf = _YANIV.unpack_from(data, pos)
+            yield kind, (caller, winner, bool(assaf))
+            pos += _YANIV.size
+        elif kind == SCORES:
+            count = data[pos]
+            yield kind, (list(struct.unpack_from(f'<{count}h', data, pos + 1)),)
+            pos += 1 + 2 * count
+        elif kind == GAME_END:
+            yield kind, (data[pos],)
+            pos += 1
+        else:
+            raise ValueError(f'Unknown event type {kind} at byte {pos - 1}')
+
+
+def split_games(data: bytes) -> List[List[Tuple[int, tuple]]]:
+    games = []
+    for kind, fields in read_events(data):
+        if kind == GAME_START:
+            games.append([])
+        games[-1].append((kind, fields))
+    return games
+
+
+def replay_game(events: List[Tuple[int, tuple]], max_turns: Optional[int] = None) -> 'Yaniv':
+    # Rebuild a game from its events, including what every computer has observed, without asking any player for a decision
+    # If max_turns is given, stop right before that many turns have been played, so the next decision can be re-run and inspected
+    from yaniv import Yaniv
+
+    (kind, (seed, yaniv_total, max_round_turns, player_name, levels)), (_, (_, first_deck)) = events[0], events[1]
+    if kind != GAME_START:
+        raise ValueError('A game must start with a GAME_START event')
+    game = Yaniv(player_name, yaniv_total, levels, seed=seed, verbose=False, max_round_turns=max_round_turns, deck_orders=[first_deck])
+
+    turns = 0
+    events = events[2:]
+    for index, (kind, fields) in enumerate(events):
+        if kind == ROUND_START:
+            game.deck_orders.append(fields[1])
+            game.new_round(fields[0])
+            game.state = GameState.ChooseAction
+        elif kind == RESHUFFLE:
+            # Already queued by the turn before it
+            continue
+        elif kind == TURN:
+            if max_turns is not None and turns >= max_turns:
+                break
+            seat, discard, pickup_choice = fields
+            # The reshuffle this turn's draw needs is logged after the turn, so it has to be queued first
+            if index + 1 < len(events) and events[index + 1][0] == RESHUFFLE:
+                game.deck_orders.append(events[index + 1][1][0])
+            if game.seats[seat] is not game.players_list[game.cur_turn]:
+                raise ValueError(f'Turn {turns} was played by seat {seat} but it is {game.players_list[game.cur_turn].name}\'s turn')
+            game.apply_turn(discard if len(discard) > 1 else discard[0], pickup_choice or len(game.pickup_options) + 1)
+            turns += 1
+        elif kind == YANIV:
+            game.score_round()
+        elif kind == SCORES:
+            if list(fields[0]) != [p.points for p in game.seats]:
+                raise ValueError(f'Replayed scores {[p.points for p in game.seats]} do not match the log {fields[0]}')
+    return game
+
+
+def replay(path: str, game_index: int = 0, max_turns: Optional[int] = None) -> 'Yaniv':
+    with open(path, 'rb') as f:
+        return replay_game(split_games(f.read())[game_index], max_turns)
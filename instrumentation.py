@@ -0,0 +1,136 @@
+import json
+import math
+from abc import ABC, abstractmethod
+from time import perf_counter
+from typing import Dict, List, Optional, TextIO
+
+
+class Sink(ABC):
+    # Receives one record per instrumented decision:
+    # {'source': player name, 'decision': 'choose_action' | 'do_turn' | 'player_discard_pickup',
+    #  'total': seconds, 'stages': {stage: seconds}, 'counters': {counter: count}}
+    # A sink without emit can't be constructed, so a missing override fails when the sink is created instead of mid game
+    @abstractmethod
+    def emit(self, record: dict) -> None:
+        pass
+
+
+    def close(self) -> None:
+        pass
+
+
+class HistogramSink(Sink):
+    # Keeps per stage timing histograms in memory with log2 buckets of microseconds (bucket b holds times in (2^(b-1), 2^b] us)
+    stage_histograms: Dict[str, List[int]]
+    stage_totals: Dict[str, float]
+    counters: Dict[str, int]
+    records: int
+
+    NUM_BUCKETS = 32
+
+
+    def __init__(self):
+        self.stage_histograms = {}
+        self.stage_totals = {}
+        self.counters = {}
+        self.records = 0
+
+
+    def emit(self, record: dict) -> None:
+        self.records += 1
+        self.add_time(f'{record["decision"]}.total', record['total'])
+        for stage, seconds in record['stages'].items():
+            self.add_time(stage, seconds)
+        for counter, count in record['counters'].items():
+            self.counters[counter] = self.counters.get(counter, 0) + count
+
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        micros = seconds * 1e6
+        bucket = min(max(math.ceil(math.log2(micros)) if micros > 1 else 0, 0), self.NUM_BUCKETS - 1)
+        if stage not in self.stage_histograms:
+            self.stage_histograms[stage] = [0] * self.NUM_BUCKETS
+            self.stage_totals[stage] = 0.0
+        self.stage_histograms[stage][bucket] += 1
+        self.stage_totals[stage] += seconds
+
+
+    def percentile(self, stage: str, fraction: float) -> float:
+        # Upper bound (in seconds) of the bucket the percentile falls in
+        histogram = self.stage_histograms[stage]
+        target = fraction * sum(histogram)
+        seen = 0
+        for bucket, count in enumerate(histogram):
+            seen += count
+            if seen >= target and count:
+                return 2 ** bucket / 1e6
+        return 2 ** (self.NUM_BUCKETS - 1) / 1e6
+
+
+    def summary(self) -> dict:
+        stages = {}
+        for stage, histogram in self.stage_histograms.items():
+            count = sum(histogram)
+            stages[stage] = {'count': count, 'total': self.stage_totals[stage], 'mean': self.stage_totals[stage] / count,
+                             'p50': self.percentile(stage, 0.5), 'p99': self.percentile(stage, 0.99)}
+        return {'records': self.records, 'stages': stages, 'counters': dict(self.counters)}
+
+
+class JsonLinesSink(Sink):
+    # Writes every record as one JSON line. Records are buffered by the file object
+    file: TextIO
+
+
+    def __init__(self, path: str, buffering: int = 1 << 16):
+        self.file = open(path, 'a', buffering=buffering)
+
+
+    def emit(self, record: dict) -> None:
+        self.file.write(json.dumps(record, separators=(',', ':')))
+        self.file.write('\n')
+
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class Instrumentation:
+    sinks: List[Sink]
+
+
+    # Opt in by setting the instrumentation attribute of a Computer or a Yaniv game. When it is None, the instrumented code
+    # only pays for an attribute lookup and an is-None check per stage
+    # Decisions can be nested (a computer's do_turn inside Yaniv.player_discard_pickup). Each one is emitted as its own record
+    def __init__(self, sinks: Optional[List[Sink]] = None):
+        self.sinks = sinks if sinks is not None else [HistogramSink()]
+        self.__records = []
+        self.__starts = []
+
+
+    def begin(self, source: str, decision: str) -> None:
+        self.__records.append({'source': source, 'decision': decision, 'total': 0.0, 'stages': {}, 'counters': {}})
+        self.__starts.append(perf_counter())
+
+
+    def end(self) -> None:
+        record = self.__records.pop()
+        record['total'] = perf_counter() - self.__starts.pop()
+        for sink in self.sinks:
+            sink.emit(record)
+
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        if self.__records:
+            stages = self.__records[-1]['stages']
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        if self.__records:
+            counters = self.__records[-1]['counters']
+            counters[counter] = counters.get(counter, 0) + amount
+
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,174 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from card import CARD_VALUES, FULL_MASK, Card, mask_to_cards, mask_to_ids, mask_value
+from player import Player
+from state import NOT_TRACKED, BotKnowledge
+
+FULL_DECK_TOTAL = sum(CARD_VALUES)
+FULL_DECK_VALUE_COUNTS = [CARD_VALUES.count(value) for value in range(max(CARD_VALUES) + 1)]
+
+
+class OpponentMemory:
+    # What is known about one player during a round, with cards as bitmasks of card ids
+    # held: cards seen being picked up and not discarded since (held_value is their total), discarded: every card they discarded
+    # declined: pickup options they passed on to draw from the deck instead
+    __slots__ = ('num_cards', 'held', 'held_value', 'discarded', 'declined')
+
+
+    def __init__(self, num_cards: int = 5, held: int = 0):
+        self.num_cards = num_cards
+        self.held = held
+        self.held_value = mask_value(held)
+        self.discarded = 0
+        self.declined = 0
+
+
+    @property
+    def unknown_cards(self) -> int:
+        # How many of their cards haven't been seen
+        return self.num_cards - self.held.bit_count()
+
+
+    def held_cards(self) -> List[Card]:
+        return mask_to_cards(self.held)
+
+
+    def copy(self) -> 'OpponentMemory':
+        memory = OpponentMemory(self.num_cards)
+        memory.held, memory.held_value, memory.discarded, memory.declined = self.held, self.held_value, self.discarded, self.declined
+        return memory
+
+
+    def observe(self, discard: List[Card], pickup: Optional[Card], declined: Optional[List[Card]]) -> None:
+        self.num_cards -= len(discard) - 1
+        for card in discard:
+            bit = 1 << card.id
+            self.discarded |= bit
+            if self.held & bit:
+                self.held ^= bit
+                self.held_value -= CARD_VALUES[card.id]
+        if pickup is not None:
+            self.held |= 1 << pickup.id
+            self.held_value += CARD_VALUES[pickup.id]
+        if declined:
+            for card in declined:
+                self.declined |= 1 << card.id
+
+
+class PublicKnowledge:
+    seen: int
+    seen_total: int
+    seen_value_counts: List[int]
+    players: Dict[str, OpponentMemory]
+    belief: Optional['BeliefTracker']
+
+
+    # What everybody at a table has seen this round: the cards that were face up (the first pile card and every discard) and
+    # what each player did with the pile. The table processes every event once and each computer reads it through a KnowledgeView
+    def __init__(self, player_names: Iterable[str] = ()):
+        self.belief = None
+        self.reset(player_names)
+
+
+    def reset(self, player_names: Iterable[str]) -> None:
+        self.seen = 0
+        self.seen_total = 0
+        self.seen_value_counts = [0] * len(FULL_DECK_VALUE_COUNTS)
+        self.players = {name: OpponentMemory() for name in player_names}
+        if self.belief is not None:
+            self.belief.reset(self.players)
+
+
+    def reveal(self, cards: Iterable[Card]) -> None:
+        for card in cards:
+            if not self.seen >> card.id & 1:
+                self.seen |= 1 << card.id
+                self.seen_total += CARD_VALUES[card.id]
+                self.seen_value_counts[CARD_VALUES[card.id]] += 1
+
+
+    def observe_turn(self, player_name: str, discard: List[Card], pickup: Optional[Card], declined: Optional[List[Card]]) -> None:
+        # pickup is the card they picked up or None if they drew from the deck, declined are the pickup options they passed on
+        self.reveal(discard)
+        memory = self.players.get(player_name)
+        if memory is not None:
+            memory.observe(discard, pickup, declined)
+        if self.belief is not None:
+            self.belief.observe(player_name, discard, pickup, declined)
+
+
+    def copy(self) -> 'PublicKnowledge':
+        # An independent copy to play hypothetical turns on (see ponder.py)
+        public = PublicKnowledge()
+        public.seen = self.seen
+        public.seen_total = self.seen_total
+        public.seen_value_counts = list(self.seen_value_counts)
+        public.players = {name: memory.copy() for name, memory in self.players.items()}
+        public.belief = self.belief.copy() if self.belief is not None else None
+        return public
+
+
+    def fingerprint(self) -> tuple:
+        # Equal for two PublicKnowledges that computers can't tell apart
+        return self.seen, tuple((name, m.num_cards, m.held, m.discarded, m.declined) for name, m in self.players.items())
+
+
+    def track_beliefs(self) -> 'BeliefTracker':
+        # Start weighing the unseen cards by what each player did (see belief.py). Turns already played this round aren't included
+        if self.belief is None:
+            from belief import BeliefTracker
+            self.belief = BeliefTracker(self.players)
+        return self.belief
+
+
+    def restore(self, knowledge: BotKnowledge, hand_mask: int, seat_names: List[str]) -> None:
+        # Add what one computer knew (see state.BotKnowledge). Restoring every computer of a table after a reset() rebuilds it
+        self.reveal(mask_to_cards(FULL_MASK & ~knowledge.unseen & ~hand_mask))
+        for seat, name in enumerate(seat_names):
+            if knowledge.num_cards[seat] != NOT_TRACKED:
+                self.players[name] = OpponentMemory(knowledge.num_cards[seat], knowledge.known_hands[seat])
+
+
+class KnowledgeView:
+    public: PublicKnowledge
+    owner: Player
+
+
+    # One player's view of the public knowledge. The cards it hasn't seen are the ones that were never face up and aren't in its hand,
+    # so the view only adds the owner's hand on top of the shared state
+    def __init__(self, public: PublicKnowledge, owner: Player):
+        self.public = public
+        self.owner = owner
+        self.__counts_key = None
+        self.__counts = None
+
+
+    @property
+    def unseen(self) -> int:
+        return FULL_MASK & ~(self.public.seen | self.owner.hand_mask)
+
+
+    def unseen_total(self) -> int:
+        return FULL_DECK_TOTAL - self.public.seen_total - mask_value(self.owner.hand_mask & ~self.public.seen)
+
+
+    def unseen_value_counts(self) -> List[int]:
+        # unseen_value_counts()[v] = unseen cards worth v. The list is shared until the seen cards or the hand change, don't modify it
+        key = (self.public.seen, self.owner.hand_mask)
+        if key != self.__counts_key:
+            counts = [full - seen for full, seen in zip(FULL_DECK_VALUE_COUNTS, self.public.seen_value_counts)]
+            for i in mask_to_ids(self.owner.hand_mask & ~self.public.seen):
+                counts[CARD_VALUES[i]] -= 1
+            self.__counts_key, self.__counts = key, counts
+        return self.__counts
+
+
+    def opponent(self, name: str) -> Optional[OpponentMemory]:
+        return self.public.players.get(name) if name != self.owner.name else None
+
+
+    def opponents(self) -> Iterator[Tuple[str, OpponentMemory]]:
+        # In turn order
+        for name, memory in self.public.players.items():
+            if name != self.owner.name:
+                yield name, memory
@@ -0,0 +1,120 @@
+from functools import lru_cache
+from typing import List, Tuple, Union
+
+from card import ALL_CARDS, JOKER_1, JOKER_2, JOKER_MASK, RANK_LIST, Card
+
+# Apart from the two Jokers (ids 0 and 1), every rank takes 4 consecutive ids, one bit per suit in STANDARD_SUITS order.
+# Shifting a hand mask right by 2 therefore gives one 4 bit "nibble" per rank, which is how the tables below are indexed
+
+# Orders the cards of a rank group are discarded in. The first and last cards of a discard become the next pickup options,
+# so every pair of cards gets to be on the outside once
+RANK_GROUP_PATTERNS = {
+    2: ((0, 1),),
+    3: ((0, 1, 2), (1, 0, 2), (0, 2, 1)),
+    4: ((0, 1, 2, 3), (0, 1, 3, 2), (0, 2, 3, 1), (1, 0, 3, 2), (1, 0, 2, 3), (2, 0, 1, 3)),
+}
+
+# NIBBLE_SUITS[nibble] = indexes into STANDARD_SUITS of the suits held in a rank
+NIBBLE_SUITS = [tuple(s for s in range(4) if nibble >> s & 1) for nibble in range(16)]
+
+# RANK_SINGLES[rank index][nibble] = the cards held in that rank
+# RANK_GROUPS[rank index][nibble] = every order the cards of that rank can be discarded together in
+RANK_SINGLES = [[tuple(ALL_CARDS[2 + 4 * r + s] for s in NIBBLE_SUITS[nibble]) for nibble in range(16)] for r in range(len(RANK_LIST))]
+RANK_GROUPS = [[tuple(tuple(singles[i] for i in pattern) for pattern in RANK_GROUP_PATTERNS.get(len(singles), ()))
+                for singles in rank_singles] for rank_singles in RANK_SINGLES]
+
+# A sequence is a tuple of rank orders (A = 1, K = 13) where 0 is a slot filled by a Joker
+Sequence = Tuple[int, ...]
+
+
+@lru_cache(maxsize=None)
+def suit_sequences(rank_mask: int, jokers: int) -> Tuple[Sequence, ...]:
+    # All the sequences that can be discarded from the cards of one suit (bit r - 1 of rank_mask is set if rank r is held)
+    # Sequences start at a held card and take every following held card of the suit while the gaps can be filled with Jokers
+    # A 2 card sequence can also be discarded with a Joker in front of it (unless it starts with an Ace) or after it (unless it ends with a King)
+    ranks = [r for r in range(1, 14) if rank_mask >> (r - 1) & 1]
+    if len(ranks) < 3 and not (len(ranks) >= 2 and jokers > 0):
+        return ()
+
+    sequences = []
+    for i in range(len(ranks) - 1):
+        sequence = [ranks[i]]
+        free_jokers = jokers
+        for j in range(i, len(ranks) - 1):
+            rank_diff = ranks[j + 1] - ranks[j]
+            if rank_diff == 1:
+                sequence.append(ranks[j + 1])
+            elif rank_diff <= 1 + free_jokers:
+                free_jokers -= rank_diff - 1
+                sequence.extend([0] * (rank_diff - 1))
+                sequence.append(ranks[j + 1])
+            else:
+                break
+
+            if len(sequence) >= 3:
+                sequences.append(tuple(sequence))
+            elif len(sequence) == 2 and jokers > 0:
+                if sequence[0] != 1:
+                    sequences.append((0,) + tuple(sequence))
+                if sequence[-1] != 13:
+                    sequences.append(tuple(sequence) + (0,))
+    return tuple(sequences)
+
+
+@lru_cache(maxsize=None)
+def suit_sequence_cards(suit_index: int, rank_mask: int, joker_mask: int) -> Tuple[Tuple[Card, ...], ...]:
+    # The sequences of suit_sequences with the actual cards filled in
+    # A single Joker at either end always uses the first Joker held, gaps use the Jokers in order
+    jokers = [joker for joker in (JOKER_1, JOKER_2) if joker_mask >> joker.id & 1]
+    sequences = []
+    for sequence in suit_sequences(rank_mask, len(jokers)):
+        cards = []
+        joker_index = 0
+        for rank in sequence:
+            if rank:
+                cards.append(ALL_CARDS[2 + 4 * (rank - 1) + suit_index])
+            else:
+                cards.append(jokers[joker_index])
+                joker_index += 1
+        sequences.append(tuple(cards))
+    return tuple(sequences)
+
+
+def discard_options_for_mask(hand_mask: int) -> List[Union[Card, List[Card]]]:
+    # Every legal discard of a hand, in the order Player.get_discard_options has always listed them:
+    # single cards, then groups of the same rank, then sequences grouped by suit (in the order the suits first appear in the hand)
+    discard_options = []
+    rank_groups = []
+    suit_rank_masks = [0, 0, 0, 0]
+    suit_order = []
+
+    rank_mask = hand_mask >> 2
+    rank_index = 0
+    while rank_mask:
+        nibble = rank_mask & 15
+        if nibble:
+            discard_options.extend(RANK_SINGLES[rank_index][nibble])
+            if RANK_GROUPS[rank_index][nibble]:
+                rank_groups.append(RANK_GROUPS[rank_index][nibble])
+            for suit_index in NIBBLE_SUITS[nibble]:
+                if not suit_rank_masks[suit_index]:
+                    suit_order.append(suit_index)
+                suit_rank_masks[suit_index] |= 1 << rank_index
+        rank_mask >>= 4
+        rank_index += 1
+
+    for group in rank_groups:
+        discard_options.extend([list(cards) for cards in group])
+
+    joker_mask = hand_mask & JOKER_MASK
+    for suit_index in suit_order:
+        discard_options.extend([list(cards) for cards in suit_sequence_cards(suit_index, suit_rank_masks[suit_index], joker_mask)])
+
+    return discard_options
+
+
+def option_key(option: Union[Card, List[Card]]) -> Union[int, Tuple[int, ...]]:
+    # Hashable form of a discard option: the card id of a single card, or the ids of a discard in order
+    if isinstance(option, Card):
+        return option.id
+    return tuple(card.id for card in option)
@@ -1,123 +1,71 @@
+from bisect import bisect_left, insort
 from typing import List, Tuple, Union
 
 import utils
-from card import Card, Suit
+from card import CARD_VALUES, Card, mask_to_cards, mask_value
+from melds import discard_options_for_mask
 from utils import GameState
 
-SUIT_ORDER = {Suit.Hearts: 1, Suit.Diamonds: 2, Suit.Clubs: 3, Suit.Spades: 4, Suit.Joker: 5}
-RANK_ORDER = {'X1': 0, 'X2': 0, 'A': 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 7, 8: 8, 9: 9, 10: 10, 'J': 11, 'Q': 12, 'K': 13}
-
 
 class Player:
     name: str
     points: int
     cards: List[Card]
-    win_streak = 0
+    hand_mask: int
+    hand_value: int
+    verbose: bool
+    win_streak: int
 
 
-    def __init__(self, name: str):
+    # The hand is kept in order together with its bitmask and its value. The bitmask replaces separate per rank and per suit counts:
+    # it holds one 4 bit group per rank, so rank r's count is the bit count of (hand_mask >> (2 + 4 * r)) & 15 and a suit's count is
+    # the bit count of the same bit in every group (see melds.py, which reads the groups directly)
+    # Only pickup_card, discard_card, set_hand and reset change the hand, and they update all of these together
+    def __init__(self, name: str, verbose: bool = True):
         self.name = name
         self.points = 0
         self.cards = []
+        self.verbose = verbose
+        self.win_streak = 0
+        self.hand_mask = 0
+        self.hand_value = 0
 
 
     def reset(self) -> None:
         self.cards.clear()
+        self.hand_mask = 0
+        self.hand_value = 0
 
 
     def discard_card(self, discard: Card) -> None:
-        if not isinstance(discard, Card) or discard is None or discard not in self.cards:
+        if not isinstance(discard, Card) or not self.hand_mask >> discard.id & 1:
             return
-        self.cards.remove(discard)
+        del self.cards[bisect_left(self.cards, discard.id, key=lambda card: card.id)]
+        self.hand_mask ^= 1 << discard.id
+        self.hand_value -= CARD_VALUES[discard.id]
 
 
     def pickup_card(self, new_card: Card) -> None:
-        self.cards.append(new_card)
-        self.cards.sort(key=lambda card: (RANK_ORDER[card.rank], SUIT_ORDER[card.suit]))
+        # Card ids are ordered by rank, then suit
+        insort(self.cards, new_card, key=lambda card: card.id)
+        self.hand_mask |= 1 << new_card.id
+        self.hand_value += CARD_VALUES[new_card.id]
+
+
+    def set_hand(self, hand_mask: int) -> None:
+        # Replace the whole hand, e.g. when restoring a GameSnapshot
+        self.cards = mask_to_cards(hand_mask)
+        self.hand_mask = hand_mask
+        self.hand_value = mask_value(hand_mask)
 
 
     def calc_hand_value(self) -> int:
-        return sum([card.value() for card in self.cards])
+        return self.hand_value
 
 
     def get_discard_options(self) -> List[Union[Card, List[Card]]]:
-        discard_options = []
-
-        # Check for multiple cards of the same rank and suit
-        # Ignore Jokers when it comes to single/duplicate discards
-        rank_count = {}
-        suit_count = {}
-        for c in self.cards:
-            if c.suit != Suit.Joker:
-                discard_options.append(c)
-                rank_count[c.rank] = rank_count.get(c.rank, 0) + 1
-            suit_count[c.suit] = suit_count.get(c.suit, 0) + 1
-
-        # If there are multiple cards of the same rank, show them as a discard option
-        for rank in rank_count:
-            if rank_count[rank] == 1:
-                continue
-            rank_matches = [c for c in self.cards if c.rank == rank]
-            if rank_count[rank] == 2:
-                discard_options.append(rank_matches)
-            elif rank_count[rank] == 3:
-                discard_options.append([rank_matches[0], rank_matches[1], rank_matches[2]])
-                discard_options.append([rank_matches[1], rank_matches[0], rank_matches[2]])
-                discard_options.append([rank_matches[0], rank_matches[2], rank_matches[1]])
-            elif rank_count[rank] == 4:
-                discard_options.append([rank_matches[0], rank_matches[1], rank_matches[2], rank_matches[3]])
-                discard_options.append([rank_matches[0], rank_matches[1], rank_matches[3], rank_matches[2]])
-                discard_options.append([rank_matches[0], rank_matches[2], rank_matches[3], rank_matches[1]])
-                discard_options.append([rank_matches[1], rank_matches[0], rank_matches[3], rank_matches[2]])
-                discard_options.append([rank_matches[1], rank_matches[0], rank_matches[2], rank_matches[3]])
-                discard_options.append([rank_matches[2], rank_matches[0], rank_matches[1], rank_matches[3]])
-
-        # For each suit that appears at least 3 times on its own or twice with at least one Joker,
-        # see if a sequence can be made with those cards
-        for suit in suit_count:
-            if suit == Suit.Joker:
-                continue
-            if suit_count[suit] >= 3 or (suit_count[suit] >= 2 and suit.Joker in suit_count):
-                # Get all cards of the same suit. Cards are in order
-                matching_suit_cards = [c for c in self.cards if c.suit == suit]
-
-                # Try to start a sequence with each card
-                for i in range(len(matching_suit_cards) - 1):
-                    possible_sequence = [matching_suit_cards[i]]
-                    j = i
-                    joker_count = suit_count[suit.Joker] if suit.Joker in suit_count else 0
-
-                    while j < len(matching_suit_cards) - 1:
-                        # Check the difference between the current card and the next
-                        # If diff is 1, the cards are in sequential order
-                        # If the diff is > 1, check if there are jokers that can be used in between
-                        rank_diff = RANK_ORDER[matching_suit_cards[j + 1].rank] - RANK_ORDER[matching_suit_cards[j].rank]
-                        if rank_diff == 1:
-                            possible_sequence.append(matching_suit_cards[j + 1])
-                        elif rank_diff <= 1 + joker_count:
-                            joker_count -= rank_diff - 1
-                            for k in range(rank_diff - 1):
-                                possible_sequence.append(self.cards[k])
-                            possible_sequence.append(matching_suit_cards[j + 1])
-                        else:
-                            break
-
-                        # If the sequence has 3 or more cards, it's valid on its own and can be added as a possible discard option
-                        if len(possible_sequence) >= 3:
-                            discard_options.append(possible_sequence[:])
-
-                        # If the sequence has 2 cards, use the Joker at the beginning/end if it is a valid option
-                        # Ex: We cannot have [Joker, Ace, 2] as a possible discard since Ace is the lowest card, but we can have [Ace, 2, Joker]
-                        elif len(possible_sequence) == 2 and Suit.Joker in suit_count:
-                            if possible_sequence[0].rank != 'A':
-                                discard_options.append([self.cards[0]] + possible_sequence)
-                            if possible_sequence[-1].rank != 'K':
-                                discard_options.append(possible_sequence + [self.cards[0]])
-                            # break
-
-                        j += 1
-
-        return discard_options
+        # Singles, sets and sequences are looked up from the hand's bitmask (see melds.discard_options_for_mask)
+        return discard_options_for_mask(self.hand_mask)
 
 
     def choose_action(self, yaniv_total: float, pickup_options: List[Card]) -> GameState:
@@ -175,22 +123,25 @@ class Player:
         # If the score is 50 or 100, subtract 50 from the score
         self.win_streak = 0
         new_score = self.points + self.calc_hand_value() + penalty
-        print(f'{self.name}: {self.points} + {self.calc_hand_value()} {"" if penalty == 0 else f"+ {penalty} "}= {new_score}')
+        if self.verbose:
+            print(f'{self.name}: {self.points} + {self.calc_hand_value()} {"" if penalty == 0 else f"+ {penalty} "}= {new_score}')
         self.points = new_score
         if self.points % 50 == 0:
-            print(f'{self.name} has {self.points} points. -50 points')
+            if self.verbose:
+                print(f'{self.name} has {self.points} points. -50 points')
             self.points -= 50
 
 
     def apply_win_streak(self):
         self.win_streak += 1
-        if self.win_streak == 2:
+        if self.win_streak == 2 and self.verbose:
             print(f'{self.name} won 2 times in a row. One more and they get -5 points')
         if self.win_streak == 3:
             self.win_streak = 0
-            print(f'{self.name} won 3 times in a row. -5 points')
             self.points -= 5
-            print(f'{self.name}: {self.points - 5} - 5 = {self.points}')
+            if self.verbose:
+                print(f'{self.name} won 3 times in a row. -5 points')
+                print(f'{self.name}: {self.points + 5} - 5 = {self.points}')
 
 
     def __str__(self) -> str:
@@ -0,0 +1,135 @@
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple, Union
+
+from card import CARD_VALUES, Card
+from computer import DEFAULT_PARAMS, Computer
+from knowledge import PublicKnowledge
+from player import Player
+from utils import GameState
+
+# Computers thinking ahead while a human decides. For every move the human is likely to make, the computers that play before the
+# human's next turn are played out on clones (see Computer.clone), and every decision they make is handed to the real computer
+# (see Computer.remember_pondered). When the human made one of those moves the computers answer right away with the same decision
+# they would have worked out then, otherwise they decide as usual
+MAX_MOVES = 64
+
+Move = Tuple[Union[Card, List[Card]], int]
+
+
+def likely_moves(player: Player, pickup_options: List[Card]) -> List[Move]:
+    # Every discard and pickup of the player, the most likely first: discarding more points, then picking up a lower card (the deck
+    # counts as an average card, like level 2 sees it)
+    def discard_value(discard: Union[Card, List[Card]]) -> int:
+        return sum(CARD_VALUES[c.id] for c in (discard if isinstance(discard, list) else [discard]))
+
+    def pickup_value(pickup_choice: int) -> float:
+        if pickup_choice > len(pickup_options):
+            return DEFAULT_PARAMS.avg_random_card_value
+        return CARD_VALUES[pickup_options[pickup_choice - 1].id]
+
+    discards = sorted(player.get_discard_options(), key=discard_value, reverse=True)
+    pickups = sorted(range(1, len(pickup_options) + 2), key=pickup_value)
+    return [(discard, pickup_choice) for discard in discards for pickup_choice in pickups]
+
+
+def _play(public: PublicKnowledge, player_name: str, pickup_options: List[Card], discard_choice: Union[Card, List[Card]],
+          pickup_choice: int) -> List[Card]:
+    # What Yaniv.apply_turn tells the knowledge about a turn. Returns the next pickup options
+    discard = discard_choice if isinstance(discard_choice, list) else [discard_choice]
+    if pickup_choice > len(pickup_options):
+        pickup, declined = None, pickup_options
+    else:
+        pickup, declined = pickup_options[pickup_choice - 1], None
+    public.observe_turn(player_name, discard, pickup, declined)
+    return [discard[0], discard[-1]] if isinstance(discard_choice, list) else [discard_choice]
+
+
+class Ponderer:
+    executor: Executor
+    max_moves: int
+    moves: int
+
+    # Moves are worked out one at a time, each one submitting the next, so an executor shared with other tables (see server.py)
+    # never has more than one of them queued. Computers share the class level discard option caches, so no other computer may
+    # decide while a move is worked out: the executor has to be the one that runs the computer decisions, or the caller waits
+    # for cancel() before a computer decides (see Yaniv.play)
+    def __init__(self, executor: Optional[Executor] = None, max_moves: int = MAX_MOVES):
+        self.__own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(max_workers=1, thread_name_prefix='yaniv-ponder')
+        self.max_moves = max_moves
+        self.moves = 0
+        self.__job = None
+        self.__future = None
+
+
+    def start(self, game) -> None:
+        # Called when the current player of game, a human, is about to choose their action
+        self.cancel()
+        human = game.players_list[game.cur_turn]
+        computers = []
+        for p in game.players_list[game.cur_turn + 1:] + game.players_list[:game.cur_turn]:
+            if not isinstance(p, Computer):
+                break
+            computers.append(p)
+        # Once the round is too long every player draws from the deck and calls Yaniv as soon as they can, nothing to work out
+        turns_left = None if game.max_round_turns is None else game.max_round_turns - game.round_turns
+        if not computers or (turns_left is not None and turns_left <= 1):
+            return
+        for p in computers:
+            p.forget_pondered()
+
+        moves = likely_moves(human, game.pickup_options)[:self.max_moves]
+        moves.reverse()
+        self.__job = (computers, game.public_knowledge.copy(), human.name, list(game.pickup_options), game.yaniv_total, turns_left,
+                      moves)
+        self.__future = self.executor.submit(self.__next, self.__job)
+
+
+    def cancel(self, wait_running: bool = True) -> Optional[Future]:
+        # Stops working out moves. Returns the move still being worked out (after waiting for it, unless wait_running is False)
+        self.__job = None
+        future, self.__future = self.__future, None
+        if future is None or future.cancel():
+            return None
+        if wait_running:
+            wait([future])
+        return future
+
+
+    def __next(self, job: tuple) -> None:
+        computers, public, human_name, pickup_options, yaniv_total, turns_left, moves = job
+        if job is not self.__job or not moves:
+            return
+        discard_choice, pickup_choice = moves.pop()
+        self.__ponder(computers, public.copy(), human_name, pickup_options, yaniv_total, turns_left, discard_choice, pickup_choice)
+        self.moves += 1
+        if job is self.__job and moves:
+            self.__future = self.executor.submit(self.__next, job)
+
+
+    @staticmethod
+    def __ponder(computers: List[Computer], public: PublicKnowledge, human_name: str, pickup_options: List[Card], yaniv_total: float,
+                 turns_left: Optional[int], discard_choice: Union[Card, List[Card]], pickup_choice: int) -> None:
+        pickup_options = _play(public, human_name, pickup_options, discard_choice, pickup_choice)
+        for turn, computer in enumerate(computers):
+            # Yaniv.play takes over from the computers once the round is too long
+            if turns_left is not None and turn + 1 >= turns_left:
+                return
+            clone = computer.clone(public)
+
+            key, state = clone.decision_key('choose_action', pickup_options, yaniv_total), clone.decision_state()
+            action = clone.choose_action(yaniv_total, pickup_options)
+            computer.remember_pondered(key, state, action, clone.decision_state())
+            if action != GameState.DiscardPickup:
+                return
+
+            key, state = clone.decision_key('do_turn', pickup_options, yaniv_total), clone.decision_state()
+            decision = clone.do_turn(pickup_options, yaniv_total)
+            computer.remember_pondered(key, state, decision, clone.decision_state())
+            pickup_options = _play(public, computer.name, pickup_options, *decision)
+
+
+    def close(self) -> None:
+        self.cancel()
+        if self.__own_executor:
+            self.executor.shutdown()
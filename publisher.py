@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import queue
+import socket
+import threading
+from collections import deque
+from time import monotonic
+from typing import Deque, List, Optional, Set, Tuple, Union
+
+from card import Card, card_code, cards_code
+
+# Live events of computer games (see tournament.py --events). Games publish through an EventPublisher to an EventHub, and the
+# hub forwards them to every subscriber that asked for them. Addresses are host:port for TCP or unix:<path> for a Unix socket
+#
+# Like the server protocol, every message is one line of space separated words
+#
+# Client -> hub, as the first line
+#   PUBLISH                       Every following line is an event
+#   SUBSCRIBE <tables> <types>    Comma separated table ids and event types, * for all of them
+#
+# Hub -> client
+#   HELLO yaniv-events <protocol version>
+#   <table> <type> <words>        An event, see TableEvents for the words of every type
+#   DROPPED <count>               This many events were dropped because the subscriber read too slowly
+#   ERROR <message>
+PROTOCOL_VERSION = 1
+EVENT_TYPES = ('START', 'ROUND', 'TURN', 'YANIV', 'SCORES', 'ELIMINATED', 'GAMEOVER')
+ALL = '*'
+
+Address = Union[Tuple[str, int], str]
+
+
+def parse_address(address: str) -> Address:
+    if address.startswith('unix:'):
+        return address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class EventPublisher:
+    address: Address
+    queue_size: int
+    dropped: int
+    unsent: int
+
+
+    # Sends event lines to a hub from a background thread, so publishing never waits on the network. Events are dropped while the
+    # queue is full (counted in dropped) or the hub can't be reached (counted in unsent), the games go on either way
+    def __init__(self, address: str, queue_size: int = 10000, retry_delay: float = 1.0):
+        self.address = parse_address(address)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.unsent = 0
+        self.__retry_delay = retry_delay
+        self.__queue = queue.Queue(queue_size)
+        self.__closed = threading.Event()
+        self.__thread = threading.Thread(target=self.__send_loop, name='yaniv-events', daemon=True)
+        self.__thread.start()
+
+
+    def publish(self, table: int, event_type: str, *words) -> None:
+        try:
+            self.__queue.put_nowait(' '.join([str(table), event_type] + [str(w) for w in words]))
+        except queue.Full:
+            self.dropped += 1
+
+
+    def __connect(self) -> Optional[socket.socket]:
+        try:
+            if isinstance(self.address, str):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.address)
+            else:
+                sock = socket.create_connection(self.address)
+            sock.sendall(b'PUBLISH\n')
+            return sock
+        except OSError:
+            return None
+
+
+    def __send_loop(self) -> None:
+        sock = None
+        next_attempt = 0.0
+        while True:
+            lines = [self.__queue.get()]
+            if lines[0] is None:
+                self.__queue.task_done()
+                break
+            # Send everything that is waiting in one write
+            while len(lines) < 1000:
+                try:
+                    line = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if line is None:
+                    self.__queue.task_done()
+                    self.__closed.set()
+                    break
+                lines.append(line)
+
+            # While the hub can't be reached events are given up on right away, and connecting is retried every retry_delay seconds
+            if sock is None and monotonic() >= next_attempt:
+                sock = self.__connect()
+                next_attempt = monotonic() + self.__retry_delay
+            if sock is None:
+                self.unsent += len(lines)
+                self.__done(len(lines))
+                if self.__closed.is_set():
+                    break
+                continue
+            try:
+                sock.sendall(('\n'.join(lines) + '\n').encode())
+            except OSError:
+                self.unsent += len(lines)
+                sock.close()
+                sock = None
+            self.__done(len(lines))
+            if self.__closed.is_set():
+                break
+        if sock is not None:
+            sock.close()
+
+
+    def __done(self, count: int) -> None:
+        for _ in range(count):
+            self.__queue.task_done()
+
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        # Wait until every queued event was sent or given up on. Returns False if that took longer than timeout seconds
+        deadline = monotonic() + timeout
+        with self.__queue.all_tasks_done:
+            while self.__queue.unfinished_tasks:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                self.__queue.all_tasks_done.wait(remaining)
+        return True
+
+
+    def close(self, timeout: float = 5.0) -> None:
+        # Sends the events that are still queued (for at most timeout seconds) and stops the thread
+        try:
+            self.__queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.__closed.set()
+        self.__thread.join(timeout)
+
+
+class TableEvents:
+    publisher: EventPublisher
+    table: int
+
+
+    # The events of one game, published from the points where Yaniv prints when verbose
+    def __init__(self, publisher: EventPublisher, table: int):
+        self.publisher = publisher
+        self.table = table
+
+
+    def game_start(self, levels: List[int]) -> None:
+        # The level of every seat, 0 for a human
+        self.publisher.publish(self.table, 'START', *levels)
+
+
+    def round_start(self, starting_seat: int) -> None:
+        self.publisher.publish(self.table, 'ROUND', starting_seat)
+
+
+    def turn(self, seat: int, discard: Union[Card, List[Card]], pickup: Optional[Card]) -> None:
+        # pickup is None when the player drew from the deck
+        self.publisher.publish(self.table, 'TURN', seat, cards_code(discard), 'DECK' if pickup is None else card_code(pickup))
+
+
+    def yaniv(self, caller: int, winner: int, assaf: bool) -> None:
+        self.publisher.publish(self.table, 'YANIV', caller, winner, *(['ASSAF'] if assaf else []))
+
+
+    def scores(self, points: List[int]) -> None:
+        self.publisher.publish(self.table, 'SCORES', *points)
+
+
+    def eliminated(self, seat: int) -> None:
+        self.publisher.publish(self.table, 'ELIMINATED', seat)
+
+
+    def game_end(self, winner: int) -> None:
+        self.publisher.publish(self.table, 'GAMEOVER', winner)
+
+
+class Subscriber:
+    tables: Optional[Set[str]]
+    event_types: Optional[Set[str]]
+    events: Deque[bytes]
+    dropped: int
+    ready: asyncio.Event
+
+
+    # None means every table or every event type. When the queue is full the oldest event makes room for the new one, and the
+    # subscriber is told how many it missed before its next event
+    def __init__(self, tables: Optional[Set[str]], event_types: Optional[Set[str]], queue_size: int):
+        self.tables = tables
+        self.event_types = event_types
+        self.events = deque(maxlen=queue_size)
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+
+    def wants(self, table: str, event_type: str) -> bool:
+        return (self.tables is None or table in self.tables) and (self.event_types is None or event_type in self.event_types)
+
+
+    def push(self, event: bytes) -> None:
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+        self.ready.set()
+
+
+class EventHub:
+    address: Address
+    queue_size: int
+    subscribers: Set[Subscriber]
+    published: int
+
+
+    # Forwards the events of any number of publishers to any number of subscribers. Filtering happens here, so subscribers only
+    # receive (and only fill their queues with) the tables and event types they asked for
+    def __init__(self, address: str = '127.0.0.1:7778', queue_size: int = 1000):
+        self.address = parse_address(address)
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.published = 0
+        self.__server = None
+
+
+    async def start(self) -> None:
+        if isinstance(self.address, str):
+            self.__server = await asyncio.start_unix_server(self.handle_client, self.address)
+        else:
+            self.__server = await asyncio.start_server(self.handle_client, *self.address)
+            # Port 0 picks a free port
+            self.address = self.address[0], self.__server.sockets[0].getsockname()[1]
+
+
+    async def serve_forever(self) -> None:
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+
+    async def close(self) -> None:
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+
+    def publish(self, line: bytes) -> None:
+        words = line.split(b' ', 2)
+        if len(words) < 2:
+            return
+        table, event_type = words[0].decode(errors='replace'), words[1].decode(errors='replace')
+        self.published += 1
+        for subscriber in self.subscribers:
+            if subscriber.wants(table, event_type):
+                subscriber.push(line)
+
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(f'HELLO yaniv-events {PROTOCOL_VERSION}\n'.encode())
+        try:
+            words = (await reader.readline()).decode(errors='replace').split()
+            if words == ['PUBLISH']:
+                while line := await reader.readline():
+                    self.publish(line.rstrip(b'\n'))
+            elif len(words) == 3 and words[0].upper() == 'SUBSCRIBE':
+                tables = None if words[1] == ALL else set(words[1].split(','))
+                event_types = None if words[2] == ALL else set(words[2].upper().split(','))
+                await self.__serve_subscriber(Subscriber(tables, event_types, self.queue_size), reader, writer)
+            else:
+                writer.write(b'ERROR expected PUBLISH or SUBSCRIBE <tables> <types>\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+    async def __serve_subscriber(self, subscriber: Subscriber, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # Subscribers don't send anything after SUBSCRIBE, so the reader only tells when they leave
+        left = asyncio.ensure_future(reader.read())
+        self.subscribers.add(subscriber)
+        try:
+            while not left.done():
+                ready = asyncio.ensure_future(subscriber.ready.wait())
+                await asyncio.wait([ready, left], return_when=asyncio.FIRST_COMPLETED)
+                ready.cancel()
+                subscriber.ready.clear()
+                if subscriber.dropped:
+                    writer.write(f'DROPPED {subscriber.dropped}\n'.encode())
+                    subscriber.dropped = 0
+                events = subscriber.events
+                while events:
+                    writer.write(events.popleft() + b'\n')
+                await writer.drain()
+        finally:
+            self.subscribers.discard(subscriber)
+            left.cancel()
+
+
+async def watch(address: str, tables: str = ALL, event_types: str = ALL) -> None:
+    # Print the events of a hub until it closes
+    target = parse_address(address)
+    if isinstance(target, str):
+        reader, writer = await asyncio.open_unix_connection(target)
+    else:
+        reader, writer = await asyncio.open_connection(*target)
+    writer.write(f'SUBSCRIBE {tables} {event_types}\n'.encode())
+    while line := await reader.readline():
+        print(line.decode(errors='replace'), end='')
+    writer.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Forward live game events to subscribers, or watch them')
+    parser.add_argument('--address', default='127.0.0.1:7778', help='host:port or unix:<path>')
+    parser.add_argument('--queue-size', type=int, default=1000, help='Events kept for each subscriber')
+    parser.add_argument('--watch', action='store_true', help='Subscribe to a running hub and print its events')
+    parser.add_argument('--tables', default=ALL, help='Comma separated table ids to watch')
+    parser.add_argument('--types', default=ALL, help=f'Comma separated event types to watch ({",".join(EVENT_TYPES)})')
+    args = parser.parse_args()
+
+    try:
+        if args.watch:
+            asyncio.run(watch(args.address, args.tables, args.types))
+        else:
+            asyncio.run(EventHub(args.address, args.queue_size).serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,158 @@
+import mmap
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+from simulation import GameResult
+
+# Per game results of a tournament in a file of fixed size records, so any game can be read without parsing the ones before it
+# One process appends while any number of others read (see ResultsStore)
+#
+# File layout: header (magic, version, record size), then one record per game in the order the games finished
+#   game id (u64), seed (u64), number of seats (u8), winner seat (u8), rounds (u16), turns (u32)
+#   levels (6 x u8), points (6 x i16), yanivs called, assafs called and assafs against (6 x u16 each), unused seats are 0
+#   crc32 of the rest of the record (u32). A record whose checksum doesn't match was cut off by a crash
+MAGIC = b'YTR1'
+VERSION = 1
+MAX_SEATS = 6
+_HEADER = struct.Struct('<4sII4x')
+_BODY = struct.Struct(f'<QQBBHI{MAX_SEATS}B{MAX_SEATS}h{MAX_SEATS}H{MAX_SEATS}H{MAX_SEATS}H')
+_RECORD = struct.Struct(f'<{_BODY.size}sI')
+
+
+@dataclass(frozen=True)
+class GameRecord:
+    game_id: int
+    seed: int
+    levels: Tuple[int, ...]
+    winner: int
+    points: Tuple[int, ...]
+    rounds: int
+    turns: int
+    yanivs_called: Tuple[int, ...]
+    assafs_called: Tuple[int, ...]
+    assafs_against: Tuple[int, ...]
+
+
+    @classmethod
+    def from_result(cls, game_id: int, result: GameResult) -> 'GameRecord':
+        seats = len(result.levels)
+        yanivs_called, assafs_called, assafs_against = [0] * seats, [0] * seats, [0] * seats
+        for r in result.rounds:
+            yanivs_called[r.caller] += 1
+            if r.assaf:
+                assafs_called[r.winner] += 1
+                assafs_against[r.caller] += 1
+        return cls(game_id, result.seed, result.levels, result.winner, result.points, len(result.rounds), result.turns,
+                   tuple(yanivs_called), tuple(assafs_called), tuple(assafs_against))
+
+
+    def pack(self) -> bytes:
+        padding = (0,) * (MAX_SEATS - len(self.levels))
+        body = _BODY.pack(self.game_id, self.seed, len(self.levels), self.winner, self.rounds, self.turns, *self.levels, *padding,
+                          *self.points, *padding, *self.yanivs_called, *padding, *self.assafs_called, *padding, *self.assafs_against,
+                          *padding)
+        return _RECORD.pack(body, zlib.crc32(body))
+
+
+    @classmethod
+    def unpack(cls, record: bytes) -> 'GameRecord':
+        body, crc = _RECORD.unpack(record)
+        if zlib.crc32(body) != crc:
+            raise ValueError('Corrupt game record')
+        game_id, seed, seats, winner, rounds, turns, *seat_values = _BODY.unpack(body)
+        levels, points, yanivs_called, assafs_called, assafs_against = (tuple(seat_values[i:i + seats])
+                                                                        for i in range(0, 5 * MAX_SEATS, MAX_SEATS))
+        return cls(game_id, seed, levels, winner, points, rounds, turns, yanivs_called, assafs_called, assafs_against)
+
+
+class ResultsStore:
+    path: str
+    writable: bool
+
+
+    # A results file opened for reading, or for appending with writable=True (only one process may append at a time)
+    # Appends go to the end of the file with one write and readers map the file, so readers see every record that was completely
+    # written when they last checked the size. Opening for appending drops a record a crash cut off, the game is played again
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        if writable and not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size))
+        self.__file = open(path, 'r+b' if writable else 'rb')
+        magic, version, record_size = _HEADER.unpack(self.__file.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != _RECORD.size:
+            raise ValueError(f'{path} is not a version {VERSION} results file')
+        self.__map = None
+        self.__count = 0
+        if writable:
+            count = len(self)
+            while count and not self.__valid(count - 1):
+                count -= 1
+            self.__unmap()
+            self.__file.truncate(_HEADER.size + count * _RECORD.size)
+            self.__file.seek(0, os.SEEK_END)
+
+
+    def __unmap(self) -> None:
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        self.__count = 0
+
+
+    def __len__(self) -> int:
+        # Maps whatever was added since the last call
+        count = (os.fstat(self.__file.fileno()).st_size - _HEADER.size) // _RECORD.size
+        if count != self.__count:
+            self.__unmap()
+            if count > 0:
+                self.__map = mmap.mmap(self.__file.fileno(), _HEADER.size + count * _RECORD.size, access=mmap.ACCESS_READ)
+            self.__count = count
+        return count
+
+
+    def __valid(self, index: int) -> bool:
+        try:
+            self[index]
+            return True
+        except ValueError:
+            return False
+
+
+    def __getitem__(self, index: int) -> GameRecord:
+        if not 0 <= index < self.__count and not 0 <= index < len(self):
+            raise IndexError(index)
+        offset = _HEADER.size + index * _RECORD.size
+        return GameRecord.unpack(self.__map[offset:offset + _RECORD.size])
+
+
+    def records(self, start: int = 0) -> Iterator[GameRecord]:
+        # A reader can map a record the writer hasn't finished writing yet. A record that doesn't check out and is only followed
+        # by records that don't either is taken as not written yet, and iteration stops before it
+        count = len(self)
+        for index in range(start, count):
+            try:
+                record = self[index]
+            except ValueError:
+                if any(self.__valid(i) for i in range(index + 1, count)):
+                    raise
+                return
+            yield record
+
+
+    def append(self, records: List[GameRecord]) -> None:
+        # Returns once the records are on disk
+        if not self.writable:
+            raise ValueError(f'{self.path} was opened read only')
+        self.__file.write(b''.join(record.pack() for record in records))
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+
+    def close(self) -> None:
+        self.__unmap()
+        self.__file.close()
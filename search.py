@@ -0,0 +1,288 @@
+import math
+import random
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from card import CARD_VALUES, FULL_MASK, mask_to_ids, mask_value
+from state import ASSAF_PENALTY, GameSnapshot, apply_turn, option_ids, round_winner
+from utils import GameState
+
+# An action is either YANIV or (discarded card ids, pickup choice) with the same 1-based pickup choice as Yaniv.apply_turn
+YANIV = None
+Action = Optional[Tuple[bytes, int]]
+
+ROLLOUT_POLICIES = ('heuristic', 'random')
+# Rewards are in [0, 1]: winning the round is worth 1, losing it is worth less the more points it costs (MAX_LOSS or more = 0)
+MAX_LOSS = 50
+
+
+@dataclass(frozen=True)
+class Observation:
+    # Everything a computer knows when it's its turn. Players are numbered in turn order and me is the searching computer
+    # num_cards and known_hands (cards seen being picked up) are per player. unseen is the mask of cards it hasn't seen yet
+    me: int
+    hand: int
+    pickup_options: bytes
+    unseen: int
+    num_cards: Tuple[int, ...]
+    known_hands: Tuple[int, ...]
+    yaniv_total: int
+    can_call_yaniv: bool
+
+
+@dataclass
+class SearchStats:
+    iterations: int = 0
+    nodes: int = 0
+    rollouts: int = 0
+    rollout_turns: int = 0
+    elapsed: float = 0.0
+    workers: int = 1
+
+
+    def merge(self, other: 'SearchStats') -> None:
+        # Workers search at the same time, so the elapsed time is the longest of them
+        self.iterations += other.iterations
+        self.nodes += other.nodes
+        self.rollouts += other.rollouts
+        self.rollout_turns += other.rollout_turns
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+
+    def summary(self) -> dict:
+        elapsed = max(self.elapsed, 1e-9)
+        return {
+            'iterations': self.iterations,
+            'nodes': self.nodes,
+            'rollouts': self.rollouts,
+            'rollout_turns': self.rollout_turns,
+            'elapsed': self.elapsed,
+            'workers': self.workers,
+            'iterations_per_sec': self.iterations / elapsed,
+            'nodes_per_sec': self.nodes / elapsed,
+            'rollout_turns_per_sec': self.rollout_turns / elapsed,
+        }
+
+
+class Node:
+    # player made the move leading to this node, total is the sum of that player's rewards over every visit
+    # available counts how often the move was legal when its parent was visited (a determinization may not allow it)
+    __slots__ = ('player', 'visits', 'total', 'available', 'children')
+
+
+    def __init__(self, player: int):
+        self.player = player
+        self.visits = 0
+        self.total = 0.0
+        self.available = 0
+        self.children = {}
+
+
+def determinize(observation: Observation, rng: random.Random) -> GameSnapshot:
+    # Deal the unseen cards to the opponents' unknown cards and the deck at random. The known cards stay where they are seen
+    # and the cards that were seen but aren't in a hand make up the trash, with the pickup options on top
+    unseen = mask_to_ids(observation.unseen)
+    rng.shuffle(unseen)
+    hands = []
+    for player, num_cards in enumerate(observation.num_cards):
+        if player == observation.me:
+            hands.append(observation.hand)
+            continue
+        hand = observation.known_hands[player]
+        for _ in range(max(num_cards - hand.bit_count(), 0)):
+            if unseen:
+                hand |= 1 << unseen.pop()
+        hands.append(hand)
+
+    in_hands = 0
+    for hand in hands:
+        in_hands |= hand
+    pickup_mask = 0
+    for i in observation.pickup_options:
+        pickup_mask |= 1 << i
+    trash = bytes(mask_to_ids(FULL_MASK & ~observation.unseen & ~in_hands & ~pickup_mask)) + observation.pickup_options
+
+    num_players = len(hands)
+    return GameSnapshot(bytes(unseen), trash, observation.pickup_options, tuple(hands), (0,) * num_players, (0,) * num_players,
+                        tuple(range(num_players)), observation.me, 0, observation.yaniv_total, GameState.ChooseAction,
+                        (None,) * num_players)
+
+
+def legal_actions(snapshot: GameSnapshot, allow_yaniv: bool = True) -> List[Action]:
+    pickup_choices = range(1, len(snapshot.pickup_options) + 2)
+    actions = [(discard, pickup) for discard in option_ids(snapshot.hands[snapshot.seat]) for pickup in pickup_choices]
+    if allow_yaniv and snapshot.can_call_yaniv():
+        actions.append(YANIV)
+    return actions
+
+
+def round_rewards(hand_values: List[int], active: Tuple[int, ...], cur_turn: int, caller: Optional[int]) -> List[float]:
+    # caller is None if the rollout was cut off, then the lowest hand wins and nobody gets the Assaf penalty
+    if caller is None:
+        winner = min(active, key=lambda s: hand_values[s])
+    else:
+        winner = round_winner(hand_values, active, cur_turn)
+    rewards = [0.0] * len(hand_values)
+    for s in active:
+        if s == winner:
+            rewards[s] = 1.0
+        else:
+            loss = hand_values[s] + (ASSAF_PENALTY if s == caller else 0)
+            rewards[s] = 0.5 * (1 - min(loss, MAX_LOSS) / MAX_LOSS)
+    return rewards
+
+
+def rollout(snapshot: GameSnapshot, rng: random.Random, policy: str, max_turns: int) -> Tuple[List[float], int]:
+    # Play the round out on plain lists (much faster than stepping snapshots). Returns every seat's reward and the turns played
+    # heuristic: call Yaniv when possible, discard the most valuable option and only pick up cards worth 3 or less
+    # random: call Yaniv half of the time when possible, otherwise a random discard and pickup
+    hands = list(snapshot.hands)
+    values = [mask_value(hand) for hand in hands]
+    deck, trash, pickup = list(snapshot.deck), list(snapshot.trash), list(snapshot.pickup_options)
+    active, turn, yaniv_total = snapshot.active, snapshot.cur_turn, snapshot.yaniv_total
+    heuristic = policy == 'heuristic'
+
+    for turns in range(max_turns):
+        seat = active[turn]
+        if values[seat] <= yaniv_total and (heuristic or rng.random() < 0.5):
+            return round_rewards(values, active, turn, seat), turns
+
+        options = option_ids(hands[seat])
+        if heuristic:
+            discard = max(options, key=lambda option: sum(CARD_VALUES[i] for i in option))
+            lowest = min(pickup, key=CARD_VALUES.__getitem__)
+            choice = pickup.index(lowest) + 1 if CARD_VALUES[lowest] <= 3 else len(pickup) + 1
+        else:
+            discard = options[rng.randrange(len(options))]
+            choice = rng.randint(1, len(pickup) + 1)
+
+        if choice > len(pickup):
+            if not deck:
+                deck, trash = trash[:-1], trash[-1:]
+                rng.shuffle(deck)
+            card = deck.pop()
+        else:
+            card = pickup[choice - 1]
+            trash.remove(card)
+
+        hand = hands[seat] | 1 << card
+        values[seat] += CARD_VALUES[card]
+        for i in discard:
+            hand ^= 1 << i
+            values[seat] -= CARD_VALUES[i]
+        hands[seat] = hand
+        trash.extend(discard)
+        pickup = [discard[0], discard[-1]] if len(discard) > 1 else [discard[0]]
+        turn = (turn + 1) % len(active)
+    return round_rewards(values, active, turn, None), max_turns
+
+
+def run_search(observation: Observation, time_budget: float, max_iterations: Optional[int], exploration: float, rollout_policy: str,
+               max_rollout_turns: int, seed: Optional[int]) -> Tuple[Dict[Action, Tuple[int, float]], SearchStats]:
+    # Single observer information set MCTS: every iteration samples a determinization of the hidden cards and walks the tree
+    # with the moves that are legal in it, choosing children by UCB over how often they were available
+    # Returns the (visits, total reward) of every root move. Module level so a process pool can run it
+    start = perf_counter()
+    deadline = start + time_budget
+    rng = random.Random(seed)
+    root = Node(observation.me)
+    stats = SearchStats()
+
+    while (max_iterations is None or stats.iterations < max_iterations) and (stats.iterations == 0 or perf_counter() < deadline):
+        snapshot = determinize(observation, rng)
+        node, path, caller = root, [], None
+        while True:
+            actions = legal_actions(snapshot, node is not root or observation.can_call_yaniv)
+            untried = [a for a in actions if a not in node.children]
+            for a in actions:
+                if a in node.children:
+                    node.children[a].available += 1
+
+            if untried:
+                action = untried[rng.randrange(len(untried))]
+                child = node.children[action] = Node(snapshot.seat)
+                child.available = 1
+                stats.nodes += 1
+            else:
+                log_available = {a: math.log(node.children[a].available) for a in actions}
+                action = max(actions, key=lambda a: node.children[a].total / node.children[a].visits +
+                             exploration * math.sqrt(log_available[a] / node.children[a].visits))
+                child = node.children[action]
+            path.append(child)
+            node = child
+
+            if action is YANIV:
+                caller = snapshot.seat
+                break
+            snapshot = apply_turn(snapshot, action[0], action[1], rng)
+            if untried:
+                break
+
+        if caller is not None:
+            rewards = round_rewards([mask_value(hand) for hand in snapshot.hands], snapshot.active, snapshot.cur_turn, caller)
+        else:
+            rewards, turns = rollout(snapshot, rng, rollout_policy, max_rollout_turns)
+            stats.rollouts += 1
+            stats.rollout_turns += turns
+        for node in path:
+            node.visits += 1
+            node.total += rewards[node.player]
+        stats.iterations += 1
+
+    stats.elapsed = perf_counter() - start
+    return {action: (child.visits, child.total) for action, child in root.children.items()}, stats
+
+
+class ISMCTS:
+    time_budget: float
+    max_iterations: Optional[int]
+    exploration: float
+    rollout_policy: str
+    max_rollout_turns: int
+    executor: Optional[Executor]
+    workers: int
+    rng: random.Random
+    last_stats: Optional[SearchStats]
+
+
+    # Searches for time_budget seconds per move, or max_iterations iterations if that comes first (at least one iteration)
+    # With an executor (e.g. a ProcessPoolExecutor) and workers > 1, every worker searches its own tree with the full time budget
+    # and max_iterations / workers iterations, and the root statistics are added up (root parallelization)
+    def __init__(self, time_budget: float = 0.1, max_iterations: Optional[int] = None, exploration: float = 0.7,
+                 rollout_policy: str = 'heuristic', max_rollout_turns: int = 60, executor: Optional[Executor] = None, workers: int = 1,
+                 seed: Optional[int] = None):
+        if rollout_policy not in ROLLOUT_POLICIES:
+            raise ValueError(f'Unknown rollout policy {rollout_policy}. Expected one of {ROLLOUT_POLICIES}')
+        self.time_budget = time_budget
+        self.max_iterations = max_iterations
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy
+        self.max_rollout_turns = max_rollout_turns
+        self.executor = executor
+        self.workers = workers if executor is not None else 1
+        self.rng = random.Random(seed)
+        self.last_stats = None
+
+
+    def search(self, observation: Observation) -> Action:
+        # Returns the most visited root move. Throughput is kept in last_stats
+        args = (self.time_budget, self.max_iterations, self.exploration, self.rollout_policy, self.max_rollout_turns)
+        if self.workers == 1:
+            totals, stats = run_search(observation, *args, self.rng.getrandbits(64))
+        else:
+            max_iterations = None if self.max_iterations is None else max(self.max_iterations // self.workers, 1)
+            args = (self.time_budget, max_iterations) + args[2:]
+            futures = [self.executor.submit(run_search, observation, *args, self.rng.getrandbits(64)) for _ in range(self.workers)]
+            totals, stats = {}, SearchStats(workers=self.workers)
+            for future in futures:
+                worker_totals, worker_stats = future.result()
+                stats.merge(worker_stats)
+                for action, (visits, total) in worker_totals.items():
+                    old_visits, old_total = totals.get(action, (0, 0.0))
+                    totals[action] = (old_visits + visits, old_total + total)
+
+        self.last_stats = stats
+        # Ties are broken by the average reward, then by the action itself so the choice doesn't depend on dictionary order
+        return max(totals, key=lambda a: (totals[a][0], totals[a][1] / totals[a][0], a is YANIV, a or ()))
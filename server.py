@@ -0,0 +1,345 @@
+import argparse
+import asyncio
+import random
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple, Union
+
+from card import Card, card_code, cards_code, mask_to_cards
+from computer import Computer
+from player import Player
+from ponder import Ponderer
+from utils import GameState
+from yaniv import Yaniv
+
+# Line based protocol. Every message is one line of space separated words. Cards are written as rank + suit letter (10H, QS, AD)
+# and jokers as X1 and X2. Players are referred to by their seat number, the human is always seat 0
+#
+# Client -> server
+#   NEW <name> [level ...]        Start a table against one computer per level (default 3 3)
+#   <choice>                      Answer to the last PROMPT
+#   QUIT                          Leave the table. The connection stays open for another NEW
+#
+# Server -> client
+#   HELLO yaniv <protocol version>
+#   TABLE <table id> <number of seats>
+#   SEAT <seat> <name>
+#   ROUND <starting seat>
+#   HAND <cards> VALUE <value>
+#   PILE <cards>                  The cards that can be picked up
+#   TURN <seat> <number of cards>
+#   PLAYED <seat> <discarded cards> PICKUP <card | DECK>
+#   DREW <card>                   The card you drew from the deck
+#   YANIV <caller seat> <winner seat> [ASSAF]
+#   SCORES <points of every seat>
+#   ELIMINATED <seat>
+#   GAMEOVER <winner seat>
+#   PROMPT ACTION <choices>       D = discard, C = call Yaniv
+#   PROMPT DISCARD 1:<cards> 2:<cards> ...    Several cards are joined by commas
+#   PROMPT PICKUP 1:<card> ... n:DECK
+#   ERROR <message>
+#   BYE
+PROTOCOL_VERSION = 1
+DEFAULT_LEVELS = [3, 3]
+MAX_COMPUTERS = 5
+# Level 6 isn't offered: it is no stronger than level 5 at the budgets a table can afford (see Computer)
+MAX_LEVEL = 5
+
+
+class ClientLeft(Exception):
+    pass
+
+
+class Connection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+
+    def send(self, *words) -> None:
+        self.writer.write((' '.join(str(w) for w in words) + '\n').encode())
+
+
+    async def receive(self) -> str:
+        # Raises ClientLeft once the client disconnects
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ClientLeft()
+        return line.decode(errors='replace').strip()
+
+
+    async def get_menu_choice(self, kind: str, options: List[str], valid_choices: Set[str]) -> str:
+        # Same as utils.get_menu_choice, but the menu is sent as a PROMPT and invalid choices get an ERROR
+        self.send('PROMPT', kind, *options)
+        while True:
+            choice = (await self.receive()).upper()
+            if choice == 'QUIT':
+                raise ClientLeft()
+            if choice in valid_choices:
+                return choice
+            self.send('ERROR', 'invalid choice, expected one of', *sorted(valid_choices))
+
+
+class Table:
+    table_id: int
+    game: Yaniv
+    connection: Connection
+    executor: Executor
+    computer_delay: float
+    ponderer: Optional[Ponderer]
+
+
+    # One human (seat 0) against computers. The table is driven by the game's GameState like Yaniv.play, but the human's choices
+    # are read from the connection and computer decisions run in the executor, so the table waits for them without waiting in
+    # the event loop. They still hold the GIL while they run, so a slow decision slows down every other table too
+    # The executor must have a single worker (see YanivServer)
+    # With ponder the computers work out their next decisions in the executor while the human decides (see ponder.py)
+    def __init__(self, table_id: int, game: Yaniv, connection: Connection, executor: Executor, computer_delay: float = 0.0,
+                 ponder: bool = False):
+        self.table_id = table_id
+        self.game = game
+        self.connection = connection
+        self.executor = executor
+        self.computer_delay = computer_delay
+        self.ponderer = Ponderer(executor) if ponder else None
+
+
+    async def play(self) -> int:
+        try:
+            return await self.__play()
+        finally:
+            if self.ponderer is not None:
+                self.ponderer.cancel(wait_running=False)
+
+
+    async def __play(self) -> int:
+        game, connection = self.game, self.connection
+        loop = asyncio.get_running_loop()
+
+        connection.send('TABLE', self.table_id, len(game.seats))
+        for seat, p in enumerate(game.seats):
+            connection.send('SEAT', seat, p.name.replace(' ', '_'))
+        self.__send_round()
+
+        while game.state != GameState.GameOver:
+            player = game.players_list[game.cur_turn]
+            seat = game.seats.index(player)
+            if game.state == GameState.ChooseAction:
+                connection.send('TURN', seat, len(player.cards))
+                if self.ponderer is not None:
+                    await self.__ponder(player)
+                if game.round_too_long() and player.calc_hand_value() <= game.yaniv_total:
+                    game.state = GameState.CallYaniv
+                elif isinstance(player, Computer):
+                    if self.computer_delay:
+                        await asyncio.sleep(self.computer_delay)
+                    game.state = await loop.run_in_executor(self.executor, player.choose_action, game.yaniv_total, game.pickup_options)
+                else:
+                    game.state = await self.__choose_action(player)
+            elif game.state == GameState.DiscardPickup:
+                if isinstance(player, Computer):
+                    discard_choice, pickup_choice = await loop.run_in_executor(self.executor, player.do_turn, game.pickup_options,
+                                                                               game.yaniv_total)
+                else:
+                    discard_choice, pickup_choice = await self.__do_turn(player)
+                self.__apply_turn(player, seat, discard_choice, pickup_choice)
+            elif game.state == GameState.CallYaniv:
+                self.__call_yaniv()
+            await connection.writer.drain()
+
+        connection.send('GAMEOVER', game.seats.index(game.winner))
+        await connection.writer.drain()
+        return game.seats.index(game.winner)
+
+
+    async def __ponder(self, player: Player) -> None:
+        # Start pondering for a human, stop it before a computer decides. The executor has a single worker, so a move that is
+        # still being worked out finishes before the computer's decision starts
+        if isinstance(player, Computer):
+            self.ponderer.cancel(wait_running=False)
+        else:
+            self.ponderer.start(self.game)
+
+
+    async def __choose_action(self, player: Player) -> GameState:
+        can_call_yaniv = player.calc_hand_value() <= self.game.yaniv_total
+        choices = ['D', 'C'] if can_call_yaniv else ['D']
+        choice = await self.connection.get_menu_choice('ACTION', choices, set(choices))
+        return GameState.CallYaniv if choice == 'C' else GameState.DiscardPickup
+
+
+    async def __do_turn(self, player: Player) -> Tuple[Union[Card, List[Card]], int]:
+        pickup_options = self.game.pickup_options
+        discard_options = player.get_discard_options()
+        choice = await self.connection.get_menu_choice('DISCARD', [f'{i + 1}:{cards_code(d)}' for i, d in enumerate(discard_options)],
+                                                       {str(i + 1) for i in range(len(discard_options))})
+        discard_choice = discard_options[int(choice) - 1]
+
+        options = [f'{i + 1}:{card_code(c)}' for i, c in enumerate(pickup_options)] + [f'{len(pickup_options) + 1}:DECK']
+        choice = await self.connection.get_menu_choice('PICKUP', options, {str(i + 1) for i in range(len(pickup_options) + 1)})
+        return discard_choice, int(choice)
+
+
+    def __apply_turn(self, player: Player, seat: int, discard_choice: Union[Card, List[Card]], pickup_choice: int) -> None:
+        game = self.game
+        if game.round_too_long():
+            pickup_choice = len(game.pickup_options) + 1
+        from_deck = pickup_choice > len(game.pickup_options)
+        pickup = 'DECK' if from_deck else card_code(game.pickup_options[pickup_choice - 1])
+        hand_before = player.hand_mask
+
+        game.apply_turn(discard_choice, pickup_choice)
+
+        self.connection.send('PLAYED', seat, cards_code(discard_choice), 'PICKUP', pickup)
+        if seat == 0:
+            if from_deck:
+                self.connection.send('DREW', *[card_code(c) for c in mask_to_cards(player.hand_mask & ~hand_before)])
+            self.__send_hand()
+
+
+    def __call_yaniv(self) -> None:
+        game = self.game
+        players_before = game.players_list[:]
+        game.call_yaniv()
+
+        result = game.round_history[-1]
+        self.connection.send('YANIV', result.caller, result.winner, *(['ASSAF'] if result.assaf else []))
+        self.connection.send('SCORES', *result.points)
+        for p in players_before:
+            if p not in game.players_list:
+                self.connection.send('ELIMINATED', game.seats.index(p))
+        if game.state != GameState.GameOver:
+            self.__send_round()
+
+
+    def __send_round(self) -> None:
+        game = self.game
+        self.connection.send('ROUND', game.seats.index(game.players_list[game.cur_turn]))
+        self.__send_hand()
+
+
+    def __send_hand(self) -> None:
+        human = self.game.seats[0]
+        self.connection.send('HAND', *[card_code(c) for c in human.cards], 'VALUE', human.calc_hand_value())
+        self.connection.send('PILE', *[card_code(c) for c in self.game.pickup_options])
+
+
+class YanivServer:
+    host: str
+    port: int
+    executor: Executor
+    computer_delay: float
+    yaniv_total: int
+    max_round_turns: Optional[int]
+    ponder: bool
+    tables: int
+    active_tables: int
+    rng: random.Random
+
+
+    # Hosts any number of tables in one process. Computers share the class level discard option caches, which aren't thread safe,
+    # so all computer decisions (and pondering) run one at a time on a single worker thread
+    # The seed makes the table seeds (and so their games) reproducible
+    def __init__(self, host: str = '127.0.0.1', port: int = 7777, computer_delay: float = 0.0, yaniv_total: int = 7,
+                 max_round_turns: Optional[int] = None, seed: Optional[int] = None, ponder: bool = False):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='yaniv-computer')
+        self.computer_delay = computer_delay
+        self.yaniv_total = yaniv_total
+        self.max_round_turns = max_round_turns
+        self.ponder = ponder
+        self.tables = 0
+        self.active_tables = 0
+        self.rng = random.Random(seed)
+        self.__server = None
+
+
+    async def start(self) -> None:
+        self.__server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        # Port 0 picks a free port
+        self.port = self.__server.sockets[0].getsockname()[1]
+
+
+    async def serve_forever(self) -> None:
+        if self.__server is None:
+            await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+
+    async def close(self) -> None:
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+
+    def new_table(self, player_name: str, levels: List[int], connection: Connection) -> Table:
+        self.tables += 1
+        game = Yaniv(player_name, self.yaniv_total, levels, seed=self.rng.getrandbits(64), verbose=False,
+                     max_round_turns=self.max_round_turns)
+        return Table(self.tables, game, connection, self.executor, self.computer_delay, self.ponder)
+
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = Connection(reader, writer)
+        connection.send('HELLO', 'yaniv', PROTOCOL_VERSION)
+        try:
+            while True:
+                words = (await connection.receive()).split()
+                if not words:
+                    continue
+                command = words[0].upper()
+                if command == 'QUIT':
+                    break
+                if command != 'NEW' or len(words) < 2:
+                    connection.send('ERROR', 'expected NEW <name> [level ...]')
+                    continue
+                try:
+                    levels = [int(level) for level in words[2:]] or DEFAULT_LEVELS
+                except ValueError:
+                    levels = []
+                if not 1 <= len(levels) <= MAX_COMPUTERS or not all(1 <= level <= MAX_LEVEL for level in levels):
+                    connection.send('ERROR', f'expected 1 to {MAX_COMPUTERS} computer levels between 1 and {MAX_LEVEL}')
+                    continue
+
+                table = self.new_table(words[1], levels, connection)
+                self.active_tables += 1
+                try:
+                    await table.play()
+                except ClientLeft:
+                    if reader.at_eof():
+                        return
+                finally:
+                    self.active_tables -= 1
+        except (ClientLeft, ConnectionError):
+            return
+        finally:
+            if not writer.is_closing():
+                try:
+                    connection.send('BYE')
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+                writer.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host Yaniv tables for players connecting over TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--computer-delay', type=float, default=1.0, help='Seconds to wait before each computer turn')
+    parser.add_argument('--yaniv-total', type=int, default=7)
+    parser.add_argument('--ponder', action='store_true', help='Let computers work out their next decisions while the human decides')
+    args = parser.parse_args()
+
+    server = YanivServer(args.host, args.port, args.computer_delay, args.yaniv_total, ponder=args.ponder)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from computer import Computer, ComputerParams
+from eventlog import EventLogWriter
+from yaniv import RoundResult, Yaniv
+
+
+@dataclass
+class GameResult:
+    seed: int
+    levels: Tuple[int, ...]
+    winner: int
+    points: Tuple[int, ...]
+    rounds: List[RoundResult]
+
+    @property
+    def turns(self) -> int:
+        return sum(r.turns for r in self.rounds)
+
+
+MAX_ROUND_TURNS = 500
+
+
+def simulate_game(levels: List[int], seed: int, yaniv_total: int = 7, risk_mode: str = 'exact',
+                  event_log: Optional[EventLogWriter] = None, params: Optional[List[ComputerParams]] = None,
+                  recorder: Optional['DecisionRecorder'] = None, publisher: Optional['TableEvents'] = None,
+                  deal_seed: Optional[int] = None) -> GameResult:
+    # Play a complete computer-only game with no console output, no delays and no process exit
+    # The same levels and seed always produce the same game. params are per seat, by default every computer uses the default ones
+    # recorder gets every decision of the game as training data (see datasets.py), publisher sends it as live events (see publisher.py)
+    # deal_seed deals the cards independently of the seed (see Yaniv)
+    game = Yaniv(None, yaniv_total, list(levels), seed=seed, verbose=False, max_round_turns=MAX_ROUND_TURNS, event_log=event_log,
+                 publisher=publisher, deal_seed=deal_seed)
+    if risk_mode != 'exact':
+        for p in game.seats:
+            if isinstance(p, Computer):
+                p.configure_risk(risk_mode)
+    if params is not None:
+        for p, seat_params in zip(game.seats, params):
+            p.params = seat_params
+    if recorder is not None:
+        recorder.start_game(seed)
+        game.recorder = recorder
+    winner = game.play()
+    return GameResult(seed, tuple(levels), game.seats.index(winner), tuple(p.points for p in game.seats), game.round_history)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    num_games = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    start = time.perf_counter()
+    for game_seed in range(num_games):
+        simulate_game([2, 3, 5], game_seed)
+    elapsed = time.perf_counter() - start
+    print(f'{num_games} games in {elapsed:.2f}s ({num_games / elapsed:.1f} games/sec)')
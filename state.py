@@ -0,0 +1,210 @@
+import random
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+from card import CARD_VALUES, FULL_MASK, NUM_CARDS, mask_value
+from melds import discard_options_for_mask
+from utils import GameState
+
+NOT_TRACKED = -1
+# Scoring rules, shared with Yaniv.score_round so both engines play by the same ones
+ASSAF_PENALTY = 20
+ELIMINATION_POINTS = 100
+_FULL_VALUE_COUNTS = tuple(CARD_VALUES.count(value) for value in range(max(CARD_VALUES) + 1))
+
+
+@dataclass(frozen=True)
+class BotKnowledge:
+    # What a computer (level 3+) knows, per seat: how many cards each opponent holds and which of them it has seen picked up
+    # num_cards is NOT_TRACKED for the computer's own seat and for eliminated players
+    unseen: int
+    unseen_total: int
+    unseen_value_counts: Tuple[int, ...]
+    num_cards: Tuple[int, ...]
+    known_hands: Tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class GameSnapshot:
+    # Everything needed to continue a game. Cards are ids (see card.py), the deck and trash are bytes with their top card last
+    # and hands are bitmasks. Per seat tuples are indexed by seat, active lists the seats still playing in turn order
+    # Snapshots are immutable, so a copy is the snapshot itself and the step functions below only copy what they change
+    deck: bytes
+    trash: bytes
+    pickup_options: bytes
+    hands: Tuple[int, ...]
+    points: Tuple[int, ...]
+    win_streaks: Tuple[int, ...]
+    active: Tuple[int, ...]
+    cur_turn: int
+    round_turns: int
+    yaniv_total: int
+    state: GameState
+    # None for seats that don't remember anything (humans, levels 1 and 2) and for eliminated players
+    knowledge: Tuple[Optional[BotKnowledge], ...]
+
+
+    @property
+    def seat(self) -> int:
+        # The seat whose turn it is
+        return self.active[self.cur_turn]
+
+
+    def hand_value(self, seat: int) -> int:
+        return mask_value(self.hands[seat])
+
+
+    def can_call_yaniv(self) -> bool:
+        return self.hand_value(self.seat) <= self.yaniv_total
+
+
+def _set(values: tuple, index: int, value) -> tuple:
+    return values[:index] + (value,) + values[index + 1:]
+
+
+def _forget(knowledge: BotKnowledge, card_ids: Sequence[int]) -> BotKnowledge:
+    # The cards have been seen, so they can no longer be in the deck or an opponent's unknown cards
+    unseen, total, counts = knowledge.unseen, knowledge.unseen_total, None
+    for i in card_ids:
+        if unseen >> i & 1:
+            unseen ^= 1 << i
+            total -= CARD_VALUES[i]
+            counts = counts or list(knowledge.unseen_value_counts)
+            counts[CARD_VALUES[i]] -= 1
+    if counts is None:
+        return knowledge
+    return replace(knowledge, unseen=unseen, unseen_total=total, unseen_value_counts=tuple(counts))
+
+
+def _observe_turn(knowledge: BotKnowledge, seat: int, discard: bytes, pickup: Optional[int]) -> BotKnowledge:
+    # Same as Computer.observe for another player's turn. pickup is None if they drew from the deck
+    knowledge = _forget(knowledge, discard)
+    if knowledge.num_cards[seat] == NOT_TRACKED:
+        return knowledge
+    known = knowledge.known_hands[seat]
+    for i in discard:
+        known &= ~(1 << i)
+    if pickup is not None:
+        known |= 1 << pickup
+    return replace(knowledge, num_cards=_set(knowledge.num_cards, seat, knowledge.num_cards[seat] - len(discard) + 1),
+                   known_hands=_set(knowledge.known_hands, seat, known))
+
+
+@lru_cache(maxsize=1 << 16)
+def option_ids(hand_mask: int) -> Tuple[bytes, ...]:
+    # The discard options of a hand as card ids, in the same order as Player.get_discard_options
+    return tuple(bytes([option.id]) if not isinstance(option, list) else bytes(c.id for c in option)
+                 for option in discard_options_for_mask(hand_mask))
+
+
+def discard_options(snapshot: GameSnapshot) -> Tuple[bytes, ...]:
+    return option_ids(snapshot.hands[snapshot.seat])
+
+
+def round_winner(hand_values: Sequence[int], active: Sequence[int], cur_turn: int) -> int:
+    # The seat that wins the round when the player at active[cur_turn] calls Yaniv
+    # Going around the table from the caller, anyone whose hand is worth as little as the best so far takes over
+    winner = active[cur_turn]
+    for step in range(1, len(active)):
+        s = active[(cur_turn + step) % len(active)]
+        if hand_values[s] <= hand_values[winner]:
+            winner = s
+    return winner
+
+
+def apply_turn(snapshot: GameSnapshot, discard: bytes, pickup_choice: int, rng: Optional[random.Random] = None,
+               deck_order: Optional[bytes] = None) -> GameSnapshot:
+    # Same as Yaniv.apply_turn: discard the cards (ids in discard order) and pick up the 1-based pickup option, or draw from the deck
+    # if pickup_choice is bigger than the number of options. rng shuffles the trash into a new deck when the deck is empty, unless
+    # the new deck's order is given
+    seat = snapshot.seat
+    deck, trash, knowledge = snapshot.deck, snapshot.trash, list(snapshot.knowledge)
+    if pickup_choice > len(snapshot.pickup_options):
+        if not deck:
+            if deck_order is None:
+                order = list(trash[:-1])
+                (rng or random).shuffle(order)
+                deck_order = bytes(order)
+            deck, trash = deck_order, trash[-1:]
+        card, deck, pickup = deck[-1], deck[:-1], None
+    else:
+        card = pickup = snapshot.pickup_options[pickup_choice - 1]
+        index = trash.rindex(card)
+        trash = trash[:index] + trash[index + 1:]
+
+    discard_mask = 0
+    for i in discard:
+        discard_mask |= 1 << i
+    hands = _set(snapshot.hands, seat, (snapshot.hands[seat] | 1 << card) & ~discard_mask)
+
+    for s in snapshot.active:
+        if knowledge[s] is not None:
+            knowledge[s] = _forget(knowledge[s], (card,)) if s == seat else _observe_turn(knowledge[s], seat, discard, pickup)
+
+    pickup_options = bytes([discard[0], discard[-1]]) if len(discard) > 1 else discard
+    return replace(snapshot, deck=deck, trash=trash + discard, pickup_options=pickup_options, hands=hands, knowledge=tuple(knowledge),
+                   cur_turn=(snapshot.cur_turn + 1) % len(snapshot.active), round_turns=snapshot.round_turns + 1, state=GameState.ChooseAction)
+
+
+def score_round(snapshot: GameSnapshot) -> Tuple[GameSnapshot, int]:
+    # Same as Yaniv.score_round for the current player calling Yaniv. Returns the new snapshot and the round winner's seat
+    # The state is GameOver if only one player is left, otherwise it stays CallYaniv until new_round deals the next round
+    caller = snapshot.seat
+    active = snapshot.active
+    winner = round_winner([mask_value(hand) for hand in snapshot.hands], active, snapshot.cur_turn)
+
+    points, win_streaks = list(snapshot.points), list(snapshot.win_streaks)
+    for s in active:
+        if s == winner:
+            win_streaks[s] += 1
+            if win_streaks[s] == 3:
+                win_streaks[s] = 0
+                points[s] -= 5
+            continue
+        win_streaks[s] = 0
+        points[s] += snapshot.hand_value(s) + (ASSAF_PENALTY if s == caller else 0)
+        if points[s] % 50 == 0:
+            points[s] -= 50
+
+    active = tuple(s for s in active if points[s] <= ELIMINATION_POINTS)
+    knowledge = tuple(k if s in active else None for s, k in enumerate(snapshot.knowledge))
+    return replace(snapshot, points=tuple(points), win_streaks=tuple(win_streaks), active=active, cur_turn=active.index(winner),
+                   state=GameState.GameOver if len(active) == 1 else GameState.CallYaniv, knowledge=knowledge), winner
+
+
+def new_round(snapshot: GameSnapshot, rng: Optional[random.Random] = None, deck_order: Optional[bytes] = None) -> GameSnapshot:
+    # Same as Yaniv.new_round with the player whose turn it is going first. Shuffles with rng unless a deck order is given
+    if deck_order is None:
+        order = list(range(NUM_CARDS))
+        (rng or random).shuffle(order)
+        deck_order = bytes(order)
+    deck = deck_order
+    hands = list(snapshot.hands)
+    for s in snapshot.active:
+        hands[s] = 0
+    for _ in range(5):
+        for s in snapshot.active:
+            hands[s] |= 1 << deck[-1]
+            deck = deck[:-1]
+    top = deck[-1:]
+
+    knowledge = []
+    for s, k in enumerate(snapshot.knowledge):
+        if k is None or s not in snapshot.active:
+            knowledge.append(k)
+            continue
+        num_cards = tuple(5 if o in snapshot.active and o != s else NOT_TRACKED for o in range(len(hands)))
+        fresh = BotKnowledge(FULL_MASK, sum(CARD_VALUES), _FULL_VALUE_COUNTS, num_cards, (0,) * len(hands))
+        knowledge.append(_forget(_forget(fresh, [i for i in range(NUM_CARDS) if hands[s] >> i & 1]), top))
+
+    return replace(snapshot, deck=deck[:-1], trash=top, pickup_options=top, hands=tuple(hands), knowledge=tuple(knowledge),
+                   round_turns=0, state=GameState.ChooseAction)
+
+
+def call_yaniv(snapshot: GameSnapshot, rng: Optional[random.Random] = None) -> Tuple[GameSnapshot, int]:
+    # Same as Yaniv.call_yaniv: score the round and deal the next one (started by the round winner) unless the game is over
+    snapshot, winner = score_round(snapshot)
+    if snapshot.state != GameState.GameOver:
+        snapshot = new_round(snapshot, rng)
+    return snapshot, winner
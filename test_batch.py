@@ -0,0 +1,73 @@
+import random
+from collections import Counter
+from typing import List
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from batch import evaluate_hands, hand_masks
+from card import ALL_CARDS, CARD_VALUES, NUM_CARDS, STANDARD_SUITS, Card, Suit, cards_to_mask
+from player import Player
+
+# evaluate_hands against Player.get_discard_options and calc_hand_value, on seeded random hands
+NUM_HANDS = 5000
+MAX_HAND_SIZE = 8
+
+
+def random_hands(rng: random.Random, count: int) -> List[List[Card]]:
+    # 1 to 8 cards, half of the hands from one suit (and the Jokers) so they hold plenty of sequences
+    hands = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            suit = rng.choice(STANDARD_SUITS)
+            pool = [c for c in ALL_CARDS if c.suit in (suit, Suit.Joker)]
+        else:
+            pool = ALL_CARDS
+        hands.append(rng.sample(pool, rng.randint(1, MAX_HAND_SIZE)))
+    return hands
+
+
+def card_ids(hands: List[List[Card]]) -> np.ndarray:
+    # Padded with -1 up to the biggest hand
+    ids = np.full((len(hands), MAX_HAND_SIZE), -1, dtype=np.int16)
+    for row, cards in enumerate(hands):
+        ids[row, :len(cards)] = [card.id for card in cards]
+    return ids
+
+
+def test_same_results_as_player():
+    hands = random_hands(random.Random(19), NUM_HANDS)
+    evaluation = evaluate_hands(card_ids(hands))
+    player = Player('Player', verbose=False)
+    for row, cards in enumerate(hands):
+        player.set_hand(cards_to_mask(cards))
+        options = player.get_discard_options()
+        option_values = [sum(CARD_VALUES[c.id] for c in option) if isinstance(option, list) else CARD_VALUES[option.id]
+                         for option in options]
+        rank_counts = Counter(card.rank for card in cards if card.suit != Suit.Joker)
+        groups = [option for option in options if isinstance(option, list) and len({c.rank for c in option}) == 1]
+
+        assert evaluation.hand_values[row] == player.calc_hand_value(), cards
+        assert evaluation.can_call_yaniv[row] == (player.calc_hand_value() <= 7), cards
+        assert evaluation.discard_options[row] == len(options), cards
+        assert evaluation.best_discard_values[row] == max(option_values, default=0), cards
+        assert evaluation.sequences[row] == sum(isinstance(option, list) for option in options) - len(groups), cards
+        assert [evaluation.pairs[row], evaluation.triples[row], evaluation.quads[row]] == \
+               [sum(count == k for count in rank_counts.values()) for k in (2, 3, 4)], cards
+
+
+def test_boolean_and_id_hands_agree():
+    ids = card_ids(random_hands(random.Random(20), 200))
+    masks = hand_masks(ids)
+    assert masks.shape == (200, NUM_CARDS)
+    assert (masks.sum(axis=1) == (ids >= 0).sum(axis=1)).all()
+    by_ids, by_masks = evaluate_hands(ids), evaluate_hands(masks)
+    assert all((getattr(by_ids, name) == getattr(by_masks, name)).all() for name in vars(by_ids))
+
+
+def test_hands_of_only_jokers_have_no_discards():
+    evaluation = evaluate_hands(np.array([[0, 1], [0, -1]]))
+    assert evaluation.hand_values.tolist() == [0, 0]
+    assert evaluation.discard_options.tolist() == [0, 0]
+    assert evaluation.best_discard_values.tolist() == [0, 0]
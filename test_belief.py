@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from belief import BeliefTracker
+from card import ALL_CARDS, FULL_MASK, Card, Suit, cards_to_mask
+
+PLAYERS = ['Viewer', 'North', 'East']
+
+
+def card(rank, suit: Suit) -> Card:
+    return next(c for c in ALL_CARDS if c.rank == rank and c.suit == suit)
+
+
+def scripted_tracker(normalize: bool = False) -> BeliefTracker:
+    # North picks up a 7 and discards a single King, East declines a 9 and a Queen and discards a pair of 3s
+    # With normalize every player's row is scaled to add up to one after each turn
+    tracker = BeliefTracker(PLAYERS)
+    for turn in [('North', [card('K', Suit.Spades)], card(7, Suit.Hearts), None),
+                 ('East', [card(3, Suit.Clubs), card(3, Suit.Diamonds)], None, [card(9, Suit.Spades), card('Q', Suit.Hearts)]),
+                 ('North', [card(2, Suit.Diamonds)], card(8, Suit.Hearts), None),
+                 ('East', [card('A', Suit.Clubs)], None, [card(4, Suit.Hearts)])]:
+        tracker.observe(*turn)
+        if normalize:
+            tracker.weights /= tracker.weights.sum(axis=1, keepdims=True)
+    return tracker
+
+
+def viewer_unseen() -> int:
+    # The viewer holds three cards and has seen every discard and pickup above
+    seen = [card('K', Suit.Spades), card(7, Suit.Hearts), card(3, Suit.Clubs), card(3, Suit.Diamonds), card(9, Suit.Spades),
+            card('Q', Suit.Hearts), card(2, Suit.Diamonds), card(8, Suit.Hearts), card('A', Suit.Clubs), card(4, Suit.Hearts)]
+    hand = [card(5, Suit.Spades), card(10, Suit.Clubs), card('J', Suit.Diamonds)]
+    return FULL_MASK & ~cards_to_mask(seen + hand)
+
+
+def test_rows_add_up_to_hand_sizes_and_columns_to_unseen_cards():
+    unseen = viewer_unseen()
+    unknown_cards = [3, 4]
+    probabilities = scripted_tracker().card_probabilities(unseen, PLAYERS[1:], unknown_cards)
+    unseen_ids = [i for i in range(len(ALL_CARDS)) if unseen >> i & 1]
+
+    assert probabilities.sum(axis=1) == pytest.approx(unknown_cards, abs=1e-5)
+    columns = probabilities.sum(axis=0)
+    assert (columns[unseen_ids] > 0).all() and (columns[unseen_ids] <= 1 + 1e-9).all()
+    assert columns.sum() - columns[unseen_ids].sum() == 0
+    # What the opponents don't hold is in the deck
+    assert (1 - columns[unseen_ids]).sum() == pytest.approx(len(unseen_ids) - sum(unknown_cards), abs=1e-5)
+    # The evidence moved probability: North probably holds another 7 or 8, East probably doesn't hold another 9
+    assert probabilities[0, card(7, Suit.Spades).id] > probabilities[1, card(7, Suit.Spades).id]
+    assert probabilities[1, card(9, Suit.Clubs).id] < probabilities[0, card(9, Suit.Clubs).id]
+
+
+def test_normalizing_after_every_turn_gives_the_same_probabilities():
+    unseen = viewer_unseen()
+    eager = scripted_tracker(normalize=True).card_probabilities(unseen, PLAYERS[1:], [3, 4])
+    assert eager == pytest.approx(scripted_tracker().card_probabilities(unseen, PLAYERS[1:], [3, 4]), abs=1e-9)
@@ -0,0 +1,57 @@
+from typing import List
+
+from card import ALL_CARDS, Suit, cards_to_mask
+from computer import Computer
+from search import ISMCTS
+from utils import GameState
+from yaniv import Yaniv
+
+MAX_ROUND_TURNS = 200
+
+
+def test_cached_discard_options_cannot_be_changed_by_callers():
+    # Three 7s, a pair of 9s and a 2, 3, 4 sequence of Hearts
+    cards = [c for c in ALL_CARDS if c.rank in (7, 9) and c.suit != Suit.Joker][:5]
+    cards += [c for c in ALL_CARDS if c.suit == Suit.Hearts and c.rank in (2, 3, 4)]
+    hand_mask = cards_to_mask(cards)
+    Computer.discard_option_cache.clear()
+
+    first, second = Computer('First', 2, verbose=False), Computer('Second', 2, verbose=False)
+    first.set_hand(hand_mask)
+    second.set_hand(hand_mask)
+    expected = repr(first.get_discard_options())
+    for option in first.get_discard_options():
+        if isinstance(option, list):
+            option.reverse()
+            option.pop()
+    assert Computer.discard_option_cache.hits > 0
+    assert repr(second.get_discard_options()) == expected
+
+
+def test_seeded_level_6_game_finishes():
+    # A small iteration budget (and no time limit) keeps the searcher fast and the game reproducible
+    def play(seed: int) -> List[int]:
+        game = Yaniv(None, 7, [6, 2], seed=seed, verbose=False, max_round_turns=MAX_ROUND_TURNS)
+        for seat, player in enumerate(game.seats):
+            if isinstance(player, Computer) and player.level == 6:
+                player.searcher = ISMCTS(time_budget=1e9, max_iterations=20, seed=seed + seat)
+        assert game.play() is not None
+        assert game.state == GameState.GameOver
+        return [player.points for player in game.seats]
+
+    assert play(5) == play(5)
+
+
+def test_pickup_choice_when_every_card_has_been_seen():
+    # With no unseen cards left there is no average unseen card, so level 3 falls back to params.avg_random_card_value
+    hand = [c for c in ALL_CARDS if c.rank == 'K' and c.suit != Suit.Joker][:2]
+    computer = Computer('Computer', 3, verbose=False)
+    computer.initialize_memory(['Opponent'])
+    computer.set_hand(cards_to_mask(hand))
+    computer.observe([c for c in ALL_CARDS if c not in hand])
+    assert computer.knowledge(['Computer', 'Opponent']).unseen == 0
+
+    ace = next(c for c in ALL_CARDS if c.rank == 'A')
+    # Choices are 1 based, the last one is the deck
+    discard, pickup_choice = computer.do_turn([ace], 7)
+    assert pickup_choice == 1
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from datasets import DecisionRecorder, export_games, read_chunks, row_options
+from yaniv import Yaniv
+
+NUM_GAMES = 10
+
+
+def test_discard_option_is_the_recorded_discard(tmp_path):
+    # Three and four card rank groups come in several orders, so the index has to match the order too
+    export_games(str(tmp_path), [2, 3, 5], range(NUM_GAMES))
+    checked = 0
+    for chunk in read_chunks(str(tmp_path)):
+        for row in range(len(chunk['seed'])):
+            assert chunk['discard_option'][row] >= 0
+            assert np.array_equal(row_options(chunk, row)[chunk['discard_option'][row]], chunk['discard'][row])
+            checked += 1
+    assert checked > 0
+
+
+def test_pickup_choice_is_the_one_played(tmp_path):
+    # Once a round is too long every player draws from the deck, whatever the computer chose
+    max_round_turns = 3
+    with DecisionRecorder(str(tmp_path)) as recorder:
+        for seed in range(NUM_GAMES):
+            game = Yaniv(None, 7, [2, 2], seed=seed, verbose=False, max_round_turns=max_round_turns)
+            recorder.start_game(seed)
+            game.recorder = recorder
+            game.play()
+
+    too_long = 0
+    for chunk in read_chunks(str(tmp_path)):
+        for row in range(len(chunk['seed'])):
+            if chunk['turn'][row] >= max_round_turns:
+                assert chunk['pickup_choice'][row] > np.count_nonzero(chunk['pickup_options'][row] >= 0)
+                too_long += 1
+    assert too_long > 0
@@ -0,0 +1,34 @@
+from math import comb
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from computer import count_hand_sums
+from estimator import MonteCarloEstimator
+from knowledge import FULL_DECK_VALUE_COUNTS
+
+# value_counts[v] = unseen cards worth v: a full deck, and one where both Jokers, three Aces and most of the 10s have been seen
+DECKS = [FULL_DECK_VALUE_COUNTS, [0, 1, 4, 4, 4, 4, 4, 4, 4, 4, 3]]
+
+
+def exact_probability_lte(value_counts, known_total, unknown_card_count, lte_val) -> float:
+    ways = count_hand_sums(value_counts, unknown_card_count, lte_val - known_total)
+    return sum(ways) / comb(sum(value_counts), unknown_card_count)
+
+
+@pytest.mark.parametrize('value_counts', DECKS)
+@pytest.mark.parametrize('known_total, unknown_card_count, lte_val', [(0, 1, 4), (0, 2, 7), (3, 3, 15), (0, 5, 20), (9, 4, 30)])
+def test_estimate_converges_to_the_exact_probability(value_counts, known_total, unknown_card_count, lte_val):
+    estimator = MonteCarloEstimator(time_budget=60, ci_width=0.01, max_samples=400000, seed=7)
+    estimate = estimator.probability_lte(value_counts, known_total, unknown_card_count, lte_val)
+    exact = exact_probability_lte(value_counts, known_total, unknown_card_count, lte_val)
+    assert 2 * estimate.error <= 0.01
+    assert abs(estimate.probability - exact) <= estimate.error
+
+
+def test_certain_hands_are_not_sampled():
+    estimator = MonteCarloEstimator(seed=7)
+    assert estimator.probability_lte(FULL_DECK_VALUE_COUNTS, 5, 0, 5).probability == 1.0
+    assert estimator.probability_lte(FULL_DECK_VALUE_COUNTS, 6, 0, 5).probability == 0.0
+    assert estimator.probability_lte([0, 1, 1], 0, 3, 5).samples == 0
@@ -0,0 +1,31 @@
+import io
+
+import pytest
+
+from eventlog import RESHUFFLE, EventLogWriter, replay_game, split_games
+from simulation import simulate_game
+from yaniv import Yaniv
+
+# Level 1 computers draw from the deck so often that most of their games reshuffle it
+NUM_GAMES = 30
+
+
+def test_replay_matches_logged_games():
+    log = io.BytesIO()
+    writer = EventLogWriter(log)
+    results = [simulate_game([1, 1], seed, event_log=writer) for seed in range(NUM_GAMES)]
+    writer.flush()
+
+    games = split_games(log.getvalue())
+    assert len(games) == NUM_GAMES
+    assert any(kind == RESHUFFLE for events in games for kind, _ in events)
+    for events, result in zip(games, results):
+        game = replay_game(events)
+        assert [p.points for p in game.seats] == list(result.points)
+        assert game.seats.index(game.winner) == result.winner
+
+
+@pytest.mark.parametrize('seed', [-1, 1 << 64])
+def test_seed_out_of_range_is_rejected_before_the_game(seed):
+    with pytest.raises(ValueError):
+        Yaniv(None, 7, [1, 1], seed=seed, verbose=False, event_log=EventLogWriter(io.BytesIO()))
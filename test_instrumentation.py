@@ -0,0 +1,27 @@
+import pytest
+
+from instrumentation import HistogramSink, Instrumentation, Sink
+
+
+def test_sink_without_emit_cannot_be_constructed():
+    class NoEmit(Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        NoEmit()
+    with pytest.raises(TypeError):
+        Sink()
+
+
+def test_records_reach_every_sink():
+    sinks = [HistogramSink(), HistogramSink()]
+    instrumentation = Instrumentation(sinks)
+    instrumentation.begin('Computer', 'do_turn')
+    instrumentation.add_time('option_generation', 0.001)
+    instrumentation.count('options_generated', 3)
+    instrumentation.end()
+    for sink in sinks:
+        summary = sink.summary()
+        assert summary['records'] == 1
+        assert summary['counters'] == {'options_generated': 3}
+        assert set(summary['stages']) == {'do_turn.total', 'option_generation'}
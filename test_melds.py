@@ -0,0 +1,115 @@
+import random
+from typing import List, Union
+
+from card import ALL_CARDS, JOKER_1, JOKER_2, RANK_ORDER, STANDARD_SUITS, Card, Suit, cards_to_mask
+from melds import discard_options_for_mask
+
+# discard_options_for_mask against the Player.get_discard_options it replaced, on seeded random hands
+NUM_HANDS = 20000
+
+
+def reference_discard_options(cards: List[Card]) -> List[Union[Card, List[Card]]]:
+    # The previous Player.get_discard_options, unchanged apart from reading cards instead of self.cards
+    # cards are in the order Player keeps them: by rank (Jokers first), then suit
+    discard_options = []
+
+    rank_count = {}
+    suit_count = {}
+    for c in cards:
+        if c.suit != Suit.Joker:
+            discard_options.append(c)
+            rank_count[c.rank] = rank_count.get(c.rank, 0) + 1
+        suit_count[c.suit] = suit_count.get(c.suit, 0) + 1
+
+    for rank in rank_count:
+        if rank_count[rank] == 1:
+            continue
+        rank_matches = [c for c in cards if c.rank == rank]
+        if rank_count[rank] == 2:
+            discard_options.append(rank_matches)
+        elif rank_count[rank] == 3:
+            discard_options.append([rank_matches[0], rank_matches[1], rank_matches[2]])
+            discard_options.append([rank_matches[1], rank_matches[0], rank_matches[2]])
+            discard_options.append([rank_matches[0], rank_matches[2], rank_matches[1]])
+        elif rank_count[rank] == 4:
+            discard_options.append([rank_matches[0], rank_matches[1], rank_matches[2], rank_matches[3]])
+            discard_options.append([rank_matches[0], rank_matches[1], rank_matches[3], rank_matches[2]])
+            discard_options.append([rank_matches[0], rank_matches[2], rank_matches[3], rank_matches[1]])
+            discard_options.append([rank_matches[1], rank_matches[0], rank_matches[3], rank_matches[2]])
+            discard_options.append([rank_matches[1], rank_matches[0], rank_matches[2], rank_matches[3]])
+            discard_options.append([rank_matches[2], rank_matches[0], rank_matches[1], rank_matches[3]])
+
+    for suit in suit_count:
+        if suit == Suit.Joker:
+            continue
+        if suit_count[suit] >= 3 or (suit_count[suit] >= 2 and suit.Joker in suit_count):
+            matching_suit_cards = [c for c in cards if c.suit == suit]
+
+            for i in range(len(matching_suit_cards) - 1):
+                possible_sequence = [matching_suit_cards[i]]
+                j = i
+                joker_count = suit_count[suit.Joker] if suit.Joker in suit_count else 0
+
+                while j < len(matching_suit_cards) - 1:
+                    rank_diff = RANK_ORDER[matching_suit_cards[j + 1].rank] - RANK_ORDER[matching_suit_cards[j].rank]
+                    if rank_diff == 1:
+                        possible_sequence.append(matching_suit_cards[j + 1])
+                    elif rank_diff <= 1 + joker_count:
+                        joker_count -= rank_diff - 1
+                        for k in range(rank_diff - 1):
+                            possible_sequence.append(cards[k])
+                        possible_sequence.append(matching_suit_cards[j + 1])
+                    else:
+                        break
+
+                    if len(possible_sequence) >= 3:
+                        discard_options.append(possible_sequence[:])
+                    elif len(possible_sequence) == 2 and Suit.Joker in suit_count:
+                        if possible_sequence[0].rank != 'A':
+                            discard_options.append([cards[0]] + possible_sequence)
+                        if possible_sequence[-1].rank != 'K':
+                            discard_options.append(possible_sequence + [cards[0]])
+
+                    j += 1
+
+    return discard_options
+
+
+def normalize(options: List[Union[Card, List[Card]]]) -> List[Union[str, tuple]]:
+    # The previous version filled two gaps of a sequence with the same Joker, so Jokers are compared as one card
+    def key(card: Card) -> str:
+        return 'X' if card in (JOKER_1, JOKER_2) else f'{card.rank}{card.suit.name}'
+
+    return [tuple(key(c) for c in option) if isinstance(option, list) else key(option) for option in options]
+
+
+def random_hands(rng: random.Random, count: int) -> List[List[Card]]:
+    # 1 to 8 cards, half of the hands from one suit (and the Jokers) so they hold plenty of sequences
+    hands = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            suit = rng.choice(STANDARD_SUITS)
+            pool = [c for c in ALL_CARDS if c.suit in (suit, Suit.Joker)]
+        else:
+            pool = ALL_CARDS
+        hands.append(sorted(rng.sample(pool, rng.randint(1, 8)), key=lambda card: card.id))
+    return hands
+
+
+def test_same_options_as_previous_implementation():
+    for cards in random_hands(random.Random(5), NUM_HANDS):
+        options = discard_options_for_mask(cards_to_mask(cards))
+        assert normalize(options) == normalize(reference_discard_options(cards)), cards
+
+
+def test_no_duplicate_options():
+    for cards in random_hands(random.Random(6), NUM_HANDS):
+        options = normalize(discard_options_for_mask(cards_to_mask(cards)))
+        assert len(options) == len(set(options)), cards
+
+
+def test_sequences_use_both_jokers():
+    # 3, Joker, 5, Joker, 7 of Hearts: the two gaps take one Joker each
+    cards = [JOKER_1, JOKER_2] + [c for c in ALL_CARDS if c.suit == Suit.Hearts and c.rank in (3, 5, 7)]
+    sequences = [option for option in discard_options_for_mask(cards_to_mask(cards)) if isinstance(option, list) and len(option) == 5]
+    assert sequences and all(option.count(JOKER_1) == 1 and option.count(JOKER_2) == 1 for option in sequences)
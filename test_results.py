@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from results import GameRecord, ResultsStore
+
+
+def record(game_id: int) -> GameRecord:
+    return GameRecord(game_id, 1000 + game_id, (2, 3), 1, (40, 101), 7, 80, (3, 4), (0, 1), (1, 0))
+
+
+def write_raw(path: str, data: bytes, offset: int) -> None:
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def test_reader_stops_before_a_record_still_being_written(tmp_path):
+    path = str(tmp_path / 'results.bin')
+    writer = ResultsStore(path, writable=True)
+    writer.append([record(0), record(1)])
+    reader = ResultsStore(path)
+    assert [r.game_id for r in reader.records()] == [0, 1]
+
+    # The next record's size is there but only half of its bytes have been written
+    size = os.path.getsize(path)
+    packed = record(2).pack()
+    write_raw(path, packed[:len(packed) // 2] + bytes(len(packed) - len(packed) // 2), size)
+    assert [r.game_id for r in reader.records()] == [0, 1]
+
+    write_raw(path, packed, size)
+    assert [r.game_id for r in reader.records(2)] == [2]
+    reader.close()
+    writer.close()
+
+
+def test_corrupt_record_before_good_ones_still_raises(tmp_path):
+    path = str(tmp_path / 'results.bin')
+    writer = ResultsStore(path, writable=True)
+    writer.append([record(0), record(1)])
+    writer.close()
+    write_raw(path, b'\xff', os.path.getsize(path) - 2 * len(record(0).pack()) + 8)
+
+    reader = ResultsStore(path)
+    with pytest.raises(ValueError):
+        list(reader.records())
+    reader.close()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from typing import List
+
+from computer import Computer
+from server import YanivServer
+
+LEVELS = '2 3'
+TIMEOUT = 60
+
+
+async def play_table(port: int, name: str) -> List[str]:
+    # Answers every prompt with its first choice and returns every line the server sent, up to GAMEOVER
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'NEW {name} {LEVELS}\n'.encode())
+    lines = []
+    while line := (await reader.readline()).decode().strip():
+        lines.append(line)
+        words = line.split()
+        if words[0] == 'PROMPT':
+            writer.write(f'{words[2].split(":")[0]}\n'.encode())
+        elif words[0] == 'GAMEOVER':
+            break
+    writer.write(b'QUIT\n')
+    await writer.drain()
+    writer.close()
+    return lines
+
+
+async def serve(seed: int, num_tables: int) -> List[List[str]]:
+    server = YanivServer(port=0, seed=seed)
+    await server.start()
+    try:
+        return await asyncio.wait_for(asyncio.gather(*[play_table(server.port, f'P{i}') for i in range(num_tables)]), TIMEOUT)
+    finally:
+        await server.close()
+
+
+def test_seeded_table_plays_to_gameover():
+    first, = asyncio.run(serve(3, 1))
+    again, = asyncio.run(serve(3, 1))
+    assert first[0] == 'HELLO yaniv 1'
+    assert first[-1].startswith('GAMEOVER')
+    assert first == again
+
+
+def test_tables_share_one_computer_thread(monkeypatch):
+    threads = set()
+    do_turn = Computer.do_turn
+
+    def recording_do_turn(self, *args, **kwargs):
+        threads.add(threading.get_ident())
+        return do_turn(self, *args, **kwargs)
+
+    monkeypatch.setattr(Computer, 'do_turn', recording_do_turn)
+    tables = asyncio.run(serve(4, 2))
+    assert all(lines[-1].startswith('GAMEOVER') for lines in tables)
+    assert len(threads) == 1 and threading.get_ident() not in threads
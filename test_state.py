@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from eventlog import RESHUFFLE, ROUND_START, TURN, YANIV, EventLogWriter, split_games
+from state import apply_turn, new_round, score_round
+from utils import GameState
+from yaniv import Yaniv
+
+MAX_ROUND_TURNS = 200
+
+
+def ids(cards) -> bytes:
+    return bytes(card.id for card in cards)
+
+
+@pytest.mark.parametrize('levels, seed', [([3, 2, 1], 11), ([1, 1], 12), ([5, 3, 4, 2], 13)])
+def test_step_functions_end_in_the_same_state_as_yaniv(levels, seed):
+    # Plays a seeded game with Yaniv, then plays its logged turns from the first deal with the pure step functions. The event log
+    # gives them the deck orders Yaniv shuffled
+    log = io.BytesIO()
+    writer = EventLogWriter(log)
+    game = Yaniv(None, 7, levels, seed=seed, verbose=False, max_round_turns=MAX_ROUND_TURNS, event_log=writer)
+    snapshot = game.snapshot()
+    game.play()
+    writer.flush()
+
+    events = split_games(log.getvalue())[0][2:]
+    for index, (kind, fields) in enumerate(events):
+        if kind == TURN:
+            seat, discard, pickup_choice = fields
+            assert seat == snapshot.seat
+            # The reshuffle a draw from the deck needs is logged right after the turn
+            deck_order = ids(events[index + 1][1][0]) if index + 1 < len(events) and events[index + 1][0] == RESHUFFLE else None
+            snapshot = apply_turn(snapshot, ids(discard), pickup_choice or len(snapshot.pickup_options) + 1, deck_order=deck_order)
+        elif kind == YANIV:
+            caller = snapshot.seat
+            snapshot, winner = score_round(snapshot)
+            assert (caller, winner) == (fields[0], fields[1])
+        elif kind == ROUND_START:
+            snapshot = new_round(snapshot, deck_order=ids(fields[1]))
+
+    assert snapshot.state == GameState.GameOver
+    assert snapshot == game.snapshot()
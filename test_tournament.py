@@ -0,0 +1,12 @@
+import os
+
+import pytest
+
+from results import MAX_SEATS
+from tournament import run_tournament
+
+
+def test_too_many_seats_are_rejected_before_any_game(tmp_path):
+    with pytest.raises(ValueError):
+        run_tournament([1] * (MAX_SEATS + 1), 4, workers=1, checkpoint_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == []
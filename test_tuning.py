@@ -0,0 +1,38 @@
+import pytest
+
+from tuning import SPRT, wilson_interval
+
+
+def test_sprt_decides_at_the_log_likelihood_bounds():
+    # With p0 0.5 and p1 0.55 a win adds log(1.1) and a loss log(0.9). Both bounds are log(19) away from 0
+    sprt = SPRT(0.5, 0.55, 0.05, 0.05)
+    sprt.add(30, 30)
+    assert sprt.decision() is None
+    sprt.add(1, 1)
+    assert sprt.decision() is True
+
+    sprt = SPRT(0.5, 0.55, 0.05, 0.05)
+    sprt.add(0, 27)
+    assert sprt.decision() is None
+    sprt.add(0, 1)
+    assert sprt.decision() is False
+
+    sprt = SPRT(0.5, 0.55, 0.05, 0.05)
+    sprt.add(50, 100)
+    assert sprt.llr == pytest.approx(-0.5025, abs=1e-4)
+    assert sprt.decision() is None
+
+
+def test_sprt_fixed_games():
+    # (1.645 * 0.5 + 1.645 * 0.4975) ** 2 / 0.05 ** 2
+    assert SPRT(0.5, 0.55, 0.05, 0.05).fixed_games() == 1077
+
+
+@pytest.mark.parametrize('wins, games, expected', [
+    (50, 100, (0.4038, 0.5962)),
+    (10, 10, (0.7225, 1.0)),
+    (0, 10, (0.0, 0.2775)),
+    (0, 0, (0.0, 1.0)),
+])
+def test_wilson_interval(wins, games, expected):
+    assert wilson_interval(wins, games) == pytest.approx(expected, abs=1e-4)
@@ -0,0 +1,526 @@
+import argparse
+import hashlib
+import json
+import os
+from itertools import combinations
+from math import sqrt
+from multiprocessing import Pool
+from time import monotonic
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from publisher import EventPublisher, TableEvents
+from results import MAX_SEATS, GameRecord, ResultsStore
+from simulation import simulate_game
+
+CHECKPOINT_FILE = 'checkpoint.json'
+RESULTS_FILE = 'results.bin'
+
+
+class SeatStats:
+    games: int
+    wins: int
+    points: int
+    assafs_called: int
+    assafs_against: int
+    yanivs_called: int
+
+
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.points = 0
+        self.assafs_called = 0
+        self.assafs_against = 0
+        self.yanivs_called = 0
+
+
+    def merge(self, other: 'SeatStats') -> None:
+        self.games += other.games
+        self.wins += other.wins
+        self.points += other.points
+        self.assafs_called += other.assafs_called
+        self.assafs_against += other.assafs_against
+        self.yanivs_called += other.yanivs_called
+
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+    @classmethod
+    def from_dict(cls, counters: dict) -> 'SeatStats':
+        stats = cls()
+        vars(stats).update(counters)
+        return stats
+
+
+    def summary(self) -> dict:
+        games = max(self.games, 1)
+        return {
+            'games': self.games,
+            'win_rate': self.wins / games,
+            'avg_points': self.points / games,
+            'assafs_called_per_game': self.assafs_called / games,
+            'assafs_against_per_game': self.assafs_against / games,
+            'yanivs_called_per_game': self.yanivs_called / games,
+        }
+
+
+class PairStats:
+    deals: int
+    deal_wins: int
+    deal_wins_sq: int
+    deal_points: int
+    deal_points_sq: int
+    game_wins_sq: int
+    game_points_sq: int
+
+
+    # Integer sums of the differences between one pair of entries (the first one minus the second), per complete deal and per game
+    # of those deals. wins is the difference in games won, points the difference in points
+    def __init__(self):
+        self.deals = 0
+        self.deal_wins = 0
+        self.deal_wins_sq = 0
+        self.deal_points = 0
+        self.deal_points_sq = 0
+        self.game_wins_sq = 0
+        self.game_points_sq = 0
+
+
+    def merge(self, other: 'PairStats') -> None:
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+    @classmethod
+    def from_dict(cls, counters: dict) -> 'PairStats':
+        stats = cls()
+        vars(stats).update(counters)
+        return stats
+
+
+    def summary(self, seats: int) -> dict:
+        # Differences per game, with the standard error of the duplicate estimate and the one the same number of independent
+        # games would have. variance_reduction is how many times more independent games it takes to get the same standard error
+        summary = {'deals': self.deals}
+        games = self.deals * seats
+        for name, total, deal_sq, game_sq in (('win_rate', self.deal_wins, self.deal_wins_sq, self.game_wins_sq),
+                                              ('points', self.deal_points, self.deal_points_sq, self.game_points_sq)):
+            mean = total / max(games, 1)
+            # Sample variances of the per game difference averaged over a deal, and of the difference in a single game
+            deal_variance = (deal_sq - total * total / max(self.deals, 1)) / max(self.deals - 1, 1) / seats ** 2
+            game_variance = (game_sq - total * total / max(games, 1)) / max(games - 1, 1)
+            summary[f'{name}_diff'] = mean
+            summary[f'{name}_diff_stderr'] = sqrt(max(deal_variance, 0) / max(self.deals, 1))
+            summary[f'{name}_diff_independent_stderr'] = sqrt(max(game_variance, 0) / max(games, 1))
+            summary[f'{name}_variance_reduction'] = game_variance / (seats * deal_variance) if deal_variance > 0 else None
+        return summary
+
+
+class DuplicateStats:
+    levels: List[int]
+    pairs: Dict[Tuple[int, int], PairStats]
+    pending: Dict[int, Dict[int, Tuple[int, Tuple[int, ...]]]]
+
+
+    # Scores a duplicate tournament (see run_tournament): entries are the positions in levels, and every deal is played once per
+    # rotation of the lineup, so each entry gets every seat's cards once. Entries are compared pairwise on the same deals
+    # Games wait in pending (deal -> rotation -> winner and points by entry) until every rotation of their deal is in
+    def __init__(self, levels: List[int]):
+        self.levels = list(levels)
+        self.pairs = {pair: PairStats() for pair in combinations(range(len(levels)), 2)}
+        self.pending = {}
+
+
+    def add_game(self, record: GameRecord) -> None:
+        seats = len(self.levels)
+        deal, rotation = divmod(record.game_id, seats)
+        # Lineups are rotated like game_lineup, so entry k sits at seat (k - rotation) % seats
+        by_entry = [(k - rotation) % seats for k in range(seats)]
+        self.__add(deal, {rotation: (by_entry.index(record.winner), tuple(record.points[seat] for seat in by_entry))})
+
+
+    def __add(self, deal: int, games: Dict[int, Tuple[int, Tuple[int, ...]]]) -> None:
+        games = {**self.pending.pop(deal, {}), **games}
+        if len(games) < len(self.levels):
+            self.pending[deal] = games
+            return
+        for (j, k), stats in self.pairs.items():
+            wins = points = 0
+            for winner, entry_points in games.values():
+                game_wins = (winner == j) - (winner == k)
+                game_points = entry_points[j] - entry_points[k]
+                wins += game_wins
+                points += game_points
+                stats.game_wins_sq += game_wins * game_wins
+                stats.game_points_sq += game_points * game_points
+            stats.deals += 1
+            stats.deal_wins += wins
+            stats.deal_wins_sq += wins * wins
+            stats.deal_points += points
+            stats.deal_points_sq += points * points
+
+
+    def merge(self, other: 'DuplicateStats') -> None:
+        for pair, stats in other.pairs.items():
+            self.pairs[pair].merge(stats)
+        for deal, games in other.pending.items():
+            self.__add(deal, games)
+
+
+    def to_dict(self) -> dict:
+        return {
+            'pairs': [[list(pair), stats.to_dict()] for pair, stats in self.pairs.items()],
+            'pending': [[deal, [[rotation, winner, list(points)] for rotation, (winner, points) in games.items()]]
+                        for deal, games in self.pending.items()],
+        }
+
+
+    @classmethod
+    def from_dict(cls, levels: List[int], counters: dict) -> 'DuplicateStats':
+        stats = cls(levels)
+        stats.pairs = {tuple(pair): PairStats.from_dict(pair_stats) for pair, pair_stats in counters['pairs']}
+        stats.pending = {deal: {rotation: (winner, tuple(points)) for rotation, winner, points in games}
+                         for deal, games in counters['pending']}
+        return stats
+
+
+    def summary(self) -> dict:
+        # Pairs are named by entry and level, e.g. '0:L2 vs 1:L5'. variance_reduction is the one of the win rate over all pairs
+        seats = len(self.levels)
+        pairs = {f'{j}:L{self.levels[j]} vs {k}:L{self.levels[k]}': stats.summary(seats) for (j, k), stats in self.pairs.items()}
+        independent = sum(pair['win_rate_diff_independent_stderr'] ** 2 for pair in pairs.values())
+        duplicate = sum(pair['win_rate_diff_stderr'] ** 2 for pair in pairs.values())
+        return {
+            'deals': min((stats.deals for stats in self.pairs.values()), default=0),
+            'incomplete_deals': len(self.pending),
+            'variance_reduction': independent / duplicate if duplicate > 0 else None,
+            'pairs': pairs,
+        }
+
+
+class TournamentStats:
+    games: int
+    rounds: int
+    round_turns: int
+    by_level: Dict[int, SeatStats]
+    by_seat: Dict[int, SeatStats]
+    duplicate: Optional[DuplicateStats]
+
+
+    # Every counter is an integer sum, so merging the stats of the worker chunks gives the same totals in any order
+    # duplicate scores the games of a duplicate tournament as well
+    def __init__(self, duplicate: Optional[DuplicateStats] = None):
+        self.games = 0
+        self.rounds = 0
+        self.round_turns = 0
+        self.by_level = {}
+        self.by_seat = {}
+        self.duplicate = duplicate
+
+
+    def add_game(self, record: GameRecord) -> None:
+        self.games += 1
+        self.rounds += record.rounds
+        self.round_turns += record.turns
+
+        for seat, level in enumerate(record.levels):
+            stats = SeatStats()
+            stats.games = 1
+            stats.wins = int(seat == record.winner)
+            stats.points = record.points[seat]
+            stats.yanivs_called = record.yanivs_called[seat]
+            stats.assafs_called = record.assafs_called[seat]
+            stats.assafs_against = record.assafs_against[seat]
+            self.by_level.setdefault(level, SeatStats()).merge(stats)
+            self.by_seat.setdefault(seat, SeatStats()).merge(stats)
+        if self.duplicate is not None:
+            self.duplicate.add_game(record)
+
+
+    def merge(self, other: 'TournamentStats') -> None:
+        self.games += other.games
+        self.rounds += other.rounds
+        self.round_turns += other.round_turns
+        for level, stats in other.by_level.items():
+            self.by_level.setdefault(level, SeatStats()).merge(stats)
+        for seat, stats in other.by_seat.items():
+            self.by_seat.setdefault(seat, SeatStats()).merge(stats)
+        if other.duplicate is not None:
+            if self.duplicate is None:
+                self.duplicate = DuplicateStats(other.duplicate.levels)
+            self.duplicate.merge(other.duplicate)
+
+
+    def to_dict(self) -> dict:
+        # Every counter, for checkpoints. JSON keys are strings, so levels and seats are stored as [key, counters] pairs
+        counters = {
+            'games': self.games,
+            'rounds': self.rounds,
+            'round_turns': self.round_turns,
+            'by_level': [[level, stats.to_dict()] for level, stats in self.by_level.items()],
+            'by_seat': [[seat, stats.to_dict()] for seat, stats in self.by_seat.items()],
+        }
+        if self.duplicate is not None:
+            counters['duplicate'] = self.duplicate.to_dict()
+        return counters
+
+
+    @classmethod
+    def from_dict(cls, counters: dict, levels: Optional[List[int]] = None) -> 'TournamentStats':
+        # levels are the tournament's levels, needed for the counters of a duplicate tournament
+        stats = cls()
+        if 'duplicate' in counters:
+            stats.duplicate = DuplicateStats.from_dict(levels, counters['duplicate'])
+        stats.games = counters['games']
+        stats.rounds = counters['rounds']
+        stats.round_turns = counters['round_turns']
+        stats.by_level = {level: SeatStats.from_dict(seat_stats) for level, seat_stats in counters['by_level']}
+        stats.by_seat = {seat: SeatStats.from_dict(seat_stats) for seat, seat_stats in counters['by_seat']}
+        return stats
+
+
+    def summary(self) -> dict:
+        summary = {
+            'games': self.games,
+            'rounds': self.rounds,
+            'avg_rounds_per_game': self.rounds / max(self.games, 1),
+            'avg_turns_per_round': self.round_turns / max(self.rounds, 1),
+            'by_level': {level: self.by_level[level].summary() for level in sorted(self.by_level)},
+            'by_seat': {seat: self.by_seat[seat].summary() for seat in sorted(self.by_seat)},
+        }
+        if self.duplicate is not None:
+            summary['duplicate'] = self.duplicate.summary()
+        return summary
+
+
+def derive_seed(master_seed: int, game_id: int) -> int:
+    # Each game's seed only depends on the master seed and the game id, never on which worker plays it
+    digest = hashlib.blake2b(f'{master_seed}:{game_id}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def game_seeds(master_seed: int, game_id: int, seats: int, duplicate: bool) -> Tuple[int, Optional[int]]:
+    # The game's seed and deal seed. In a duplicate tournament every rotation of a deal (see DuplicateStats) gets the same ones
+    if not duplicate:
+        return derive_seed(master_seed, game_id), None
+    seed = derive_seed(master_seed, game_id // seats)
+    return seed, seed
+
+
+def game_lineup(levels: List[int], game_id: int, rotate_seats: bool) -> List[int]:
+    # Rotate the lineup every game so each level plays from every seat equally often
+    if not rotate_seats:
+        return list(levels)
+    shift = game_id % len(levels)
+    return list(levels[shift:]) + list(levels[:shift])
+
+
+# The live event publisher of this process, if the tournament publishes events (see start_worker)
+_publisher: Optional[EventPublisher] = None
+
+
+def start_worker(events: Optional[str]) -> None:
+    global _publisher
+    if events is not None:
+        _publisher = EventPublisher(events)
+
+
+def stop_worker() -> None:
+    global _publisher
+    if _publisher is not None:
+        _publisher.close()
+        _publisher = None
+
+
+def play_games(levels: List[int], master_seed: int, game_ids: Sequence[int], rotate_seats: bool = True,
+               yaniv_total: int = 7, duplicate: bool = False) -> List[GameRecord]:
+    # Games are published as table game_id
+    records = []
+    for game_id in game_ids:
+        publisher = TableEvents(_publisher, game_id) if _publisher is not None else None
+        seed, deal_seed = game_seeds(master_seed, game_id, len(levels), duplicate)
+        result = simulate_game(game_lineup(levels, game_id, rotate_seats), seed, yaniv_total, publisher=publisher,
+                               deal_seed=deal_seed)
+        records.append(GameRecord.from_result(game_id, result))
+    return records
+
+
+def _play_chunk(args: Tuple[List[int], int, Sequence[int], bool, int, bool]) -> List[GameRecord]:
+    records = play_games(*args)
+    # Pool workers are stopped without notice, so send the chunk's events before reporting it
+    if _publisher is not None:
+        _publisher.flush()
+    return records
+
+
+def _id_ranges(game_ids: Set[int]) -> List[List[int]]:
+    # [start, stop) ranges covering the ids, so finished tournaments store a single range
+    ranges = []
+    for game_id in sorted(game_ids):
+        if ranges and ranges[-1][1] == game_id:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([game_id, game_id + 1])
+    return ranges
+
+
+class Checkpoint:
+    directory: str
+    settings: dict
+    interval: float
+    store: ResultsStore
+    completed: Set[int]
+
+
+    # A tournament's progress in a directory: every finished game in the results file (see results.py) and checkpoint.json with
+    # the finished game ids, the stats and how many results they include, written every interval seconds
+    # Game seeds only depend on the master seed and the game id (see derive_seed), so the finished ids are all it takes to continue
+    # the seeds where they stopped. Results are on disk before a checkpoint counts them, and games finished after the last
+    # checkpoint are read back from the results file, so no game is played or counted twice
+    def __init__(self, directory: str, settings: dict, interval: float = 60.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.settings = settings
+        self.interval = interval
+        self.store = ResultsStore(os.path.join(directory, RESULTS_FILE), writable=True)
+        self.completed = set()
+        self.__saved = monotonic()
+
+
+    def load(self, stats: TournamentStats) -> TournamentStats:
+        # The stats of every game already played, starting from the tournament's empty stats, and their ids in completed
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        counted = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                checkpoint = json.load(f)
+            if checkpoint['settings'] != self.settings:
+                raise ValueError(f'{path} is the checkpoint of a different tournament')
+            if checkpoint['results'] > len(self.store):
+                raise ValueError(f'{self.store.path} has fewer results than {path} counted')
+            stats = TournamentStats.from_dict(checkpoint['stats'], self.settings['levels'])
+            counted = checkpoint['results']
+            for start, stop in checkpoint['completed']:
+                self.completed.update(range(start, stop))
+        for record in self.store.records(counted):
+            stats.add_game(record)
+            self.completed.add(record.game_id)
+        return stats
+
+
+    def add(self, records: List[GameRecord], stats: TournamentStats) -> None:
+        # Called with the records already added to stats
+        self.store.append(records)
+        self.completed.update(record.game_id for record in records)
+        if monotonic() - self.__saved >= self.interval:
+            self.save(stats)
+
+
+    def save(self, stats: TournamentStats) -> None:
+        checkpoint = {
+            'settings': self.settings,
+            'results': len(self.store),
+            'completed': _id_ranges(self.completed),
+            'stats': stats.to_dict(),
+        }
+        # Write to a temporary file first so a crash never leaves a half written checkpoint
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self.__saved = monotonic()
+
+
+    def close(self) -> None:
+        self.store.close()
+
+
+def run_tournament(levels: List[int], num_games: int, master_seed: int = 0, workers: Optional[int] = None, rotate_seats: bool = True,
+                   yaniv_total: int = 7, chunk_size: int = 50, events: Optional[str] = None, checkpoint_dir: Optional[str] = None,
+                   checkpoint_interval: float = 60.0, duplicate: bool = False) -> TournamentStats:
+    # events is the address of an event hub to publish every game to (see publisher.py)
+    # With checkpoint_dir every game's result is kept there, and running the same tournament again continues where it stopped
+    # duplicate plays every deal once per rotation of the lineup and compares the levels on the same deals (see DuplicateStats)
+    # The luck of the deal mostly cancels out, so the differences need fewer games. num_games is rounded up to whole deals
+    if duplicate and not rotate_seats:
+        raise ValueError('A duplicate tournament rotates the seats')
+    # Results are stored with room for MAX_SEATS seats (see results.py), so check before any game is played
+    if len(levels) > MAX_SEATS:
+        raise ValueError(f'A tournament has at most {MAX_SEATS} seats, got {len(levels)} levels')
+    workers = workers or os.cpu_count() or 1
+    if duplicate:
+        num_games = -(-num_games // len(levels)) * len(levels)
+    stats = TournamentStats(DuplicateStats(levels) if duplicate else None)
+    checkpoint = None
+    game_ids = range(num_games)
+    if checkpoint_dir is not None:
+        settings = {'levels': list(levels), 'num_games': num_games, 'master_seed': master_seed, 'rotate_seats': rotate_seats,
+                    'yaniv_total': yaniv_total}
+        # Only in the settings of duplicate tournaments, so checkpoints of the others stay valid
+        if duplicate:
+            settings['duplicate'] = True
+        checkpoint = Checkpoint(checkpoint_dir, settings, checkpoint_interval)
+        stats = checkpoint.load(stats)
+        if checkpoint.completed:
+            game_ids = [game_id for game_id in game_ids if game_id not in checkpoint.completed]
+    chunks = [(list(levels), master_seed, game_ids[start:start + chunk_size], rotate_seats, yaniv_total, duplicate)
+              for start in range(0, len(game_ids), chunk_size)]
+
+    def add_records(records: List[GameRecord]) -> None:
+        for record in records:
+            stats.add_game(record)
+        if checkpoint is not None:
+            checkpoint.add(records, stats)
+
+    try:
+        if workers == 1:
+            start_worker(events)
+            try:
+                for chunk in chunks:
+                    add_records(_play_chunk(chunk))
+            finally:
+                stop_worker()
+        else:
+            with Pool(workers, start_worker, (events,)) as pool:
+                for records in pool.imap_unordered(_play_chunk, chunks):
+                    add_records(records)
+        if checkpoint is not None:
+            checkpoint.save(stats)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a computer-only Yaniv tournament')
+    parser.add_argument('--levels', type=int, nargs='+', default=[2, 3, 4, 5], help='Computer level of each seat')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help='Master seed that every game seed is derived from')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: all cores)')
+    parser.add_argument('--fixed-seats', action='store_true', help='Do not rotate the lineup between games')
+    parser.add_argument('--yaniv-total', type=int, default=7)
+    parser.add_argument('--events', default=None, help='Publish every game to the event hub at this address (see publisher.py)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Keep results and checkpoints here and resume from them')
+    parser.add_argument('--checkpoint-interval', type=float, default=60.0, help='Seconds between checkpoints')
+    parser.add_argument('--duplicate', action='store_true',
+                        help='Play every deal once per rotation of the lineup and compare the levels on the same deals')
+    args = parser.parse_args()
+    if args.duplicate and args.fixed_seats:
+        parser.error('--duplicate always rotates the seats, drop --fixed-seats')
+    if len(args.levels) > MAX_SEATS:
+        parser.error(f'--levels takes at most {MAX_SEATS} levels')
+
+    result = run_tournament(args.levels, args.games, args.seed, args.workers, not args.fixed_seats, args.yaniv_total,
+                            events=args.events, checkpoint_dir=args.checkpoint_dir,
+                            checkpoint_interval=args.checkpoint_interval, duplicate=args.duplicate)
+    print(json.dumps(result.summary(), indent=2))
@@ -0,0 +1,233 @@
+import argparse
+import json
+import math
+import os
+from collections import deque
+from dataclasses import asdict, replace
+from multiprocessing import Pool
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+from computer import DEFAULT_PARAMS, ComputerParams
+from simulation import simulate_game
+from tournament import derive_seed
+
+# Values tried for every parameter, and the level the games comparing them are played at (each parameter only changes some levels)
+# The level 3-5 memory chances aren't tuned: the computers never applied them and they have been removed (see Computer)
+SEARCH_SPACE = {
+    'assaf_risk': [0.1, 0.3, 0.05, 0.4],
+    'draw_nudge': [0.1, 0.02, 0.2],
+    'avg_random_card_value': [5.5, 7.0, 5.0, 7.5],
+}
+TUNING_LEVELS = {'assaf_risk': 3, 'draw_nudge': 3, 'avg_random_card_value': 2}
+
+
+class SPRT:
+    p0: float
+    p1: float
+    alpha: float
+    beta: float
+    wins: int
+    games: int
+
+
+    # Sequential probability ratio test of H0: the candidate wins p0 of its games, against H1: it wins p1 of them
+    # Games are added as they finish and the test stops as soon as the log likelihood ratio leaves (lower, upper). alpha and beta are
+    # the chances of accepting H1 when H0 is true and the other way around
+    def __init__(self, p0: float = 0.5, p1: float = 0.55, alpha: float = 0.05, beta: float = 0.05):
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+        self.wins = 0
+        self.games = 0
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+
+    def add(self, wins: int, games: int) -> None:
+        self.wins += wins
+        self.games += games
+
+
+    @property
+    def llr(self) -> float:
+        return self.wins * math.log(self.p1 / self.p0) + (self.games - self.wins) * math.log((1 - self.p1) / (1 - self.p0))
+
+
+    def decision(self) -> Optional[bool]:
+        # True if H1 is accepted (the candidate is better), False if H0 is, None if more games are needed
+        llr = self.llr
+        if llr >= self.upper:
+            return True
+        if llr <= self.lower:
+            return False
+        return None
+
+
+    def fixed_games(self) -> int:
+        # Games a fixed size test with the same error rates would need
+        z_alpha, z_beta = NormalDist().inv_cdf(1 - self.alpha), NormalDist().inv_cdf(1 - self.beta)
+        spread = z_alpha * math.sqrt(self.p0 * (1 - self.p0)) + z_beta * math.sqrt(self.p1 * (1 - self.p1))
+        return math.ceil((spread / (self.p1 - self.p0)) ** 2)
+
+
+def wilson_interval(wins: int, games: int, confidence: float = 0.95) -> Tuple[float, float]:
+    if games == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rate = wins / games
+    center = (rate + z * z / (2 * games)) / (1 + z * z / games)
+    margin = z * math.sqrt(rate * (1 - rate) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+class Comparison:
+    parameter: str
+    value: float
+    level: int
+    sprt: SPRT
+    accepted: Optional[bool]
+
+
+    def __init__(self, parameter: str, value: float, level: int, sprt: SPRT):
+        self.parameter = parameter
+        self.value = value
+        self.level = level
+        self.sprt = sprt
+        self.accepted = None
+
+
+    def summary(self) -> dict:
+        low, high = wilson_interval(self.sprt.wins, self.sprt.games)
+        return {
+            'parameter': self.parameter,
+            'value': self.value,
+            'level': self.level,
+            'result': {True: 'better', False: 'not better', None: 'inconclusive'}[self.accepted],
+            'games': self.sprt.games,
+            'wins': self.sprt.wins,
+            'win_rate': self.sprt.wins / self.sprt.games if self.sprt.games else 0.0,
+            'win_rate_95': [low, high],
+            'llr': self.sprt.llr,
+        }
+
+
+def play_pairs(candidate: ComputerParams, baseline: ComputerParams, level: int, master_seed: int, pair_ids: range,
+               yaniv_total: int = 7) -> int:
+    # Head to head games at the same level. Both games of a pair use the same deal with the seats swapped, so neither side gets
+    # the better cards. Returns the candidate's wins
+    wins = 0
+    for pair_id in pair_ids:
+        seed = derive_seed(master_seed, pair_id)
+        wins += simulate_game([level, level], seed, yaniv_total, params=[candidate, baseline]).winner == 0
+        wins += simulate_game([level, level], seed, yaniv_total, params=[baseline, candidate]).winner == 1
+    return wins
+
+
+def _play_chunk(args: Tuple[ComputerParams, ComputerParams, int, int, range, int]) -> int:
+    return play_pairs(*args)
+
+
+def compare(candidate: ComputerParams, baseline: ComputerParams, level: int, sprt: SPRT, master_seed: int, pool: Optional[Pool],
+            workers: int, max_games: int, chunk_pairs: int = 10, yaniv_total: int = 7) -> Optional[bool]:
+    # Play chunks of pairs until the test decides or max_games are played. Results are added in chunk order, so the outcome only
+    # depends on the seeds and not on which worker finishes first. Chunks still running when the test stops are thrown away
+    pending = deque()
+    next_chunk = 0
+    while True:
+        while pool is not None and len(pending) < 2 * workers and (next_chunk + len(pending)) * chunk_pairs * 2 < max_games:
+            start = (next_chunk + len(pending)) * chunk_pairs
+            args = (candidate, baseline, level, master_seed, range(start, start + chunk_pairs), yaniv_total)
+            pending.append(pool.apply_async(_play_chunk, (args,)))
+
+        if pool is None:
+            start = next_chunk * chunk_pairs
+            wins = _play_chunk((candidate, baseline, level, master_seed, range(start, start + chunk_pairs), yaniv_total))
+        else:
+            wins = pending.popleft().get()
+        next_chunk += 1
+        sprt.add(wins, chunk_pairs * 2)
+
+        decision = sprt.decision()
+        if decision is not None or sprt.games >= max_games:
+            return decision
+
+
+class TuningResult:
+    params: ComputerParams
+    comparisons: List[Comparison]
+    fixed_games: int
+
+
+    def __init__(self, params: ComputerParams, comparisons: List[Comparison], fixed_games: int):
+        self.params = params
+        self.comparisons = comparisons
+        self.fixed_games = fixed_games
+
+
+    def summary(self) -> dict:
+        games = sum(c.sprt.games for c in self.comparisons)
+        # Confidence bounds of every change that was kept: how often the tuned value beat the value it replaced
+        bounds = {c.parameter: {'value': c.value, 'win_rate_95': c.summary()['win_rate_95']} for c in self.comparisons if c.accepted}
+        # Most candidates win close to half their games, and the test needs long to tell those apart from p1. The sequential test
+        # then saves far less than the order of magnitude it was meant to (about 16% with the defaults), so report how much it saved
+        fixed_size_games = self.fixed_games * len(self.comparisons)
+        return {
+            'params': asdict(self.params),
+            'default_params': asdict(DEFAULT_PARAMS),
+            'changes': bounds,
+            'games': games,
+            'fixed_size_games': fixed_size_games,
+            'games_saved': 1 - games / fixed_size_games if fixed_size_games else 0.0,
+            'comparisons': [c.summary() for c in self.comparisons],
+        }
+
+
+def tune(search_space: Dict[str, List[float]] = SEARCH_SPACE, start: ComputerParams = DEFAULT_PARAMS, master_seed: int = 0,
+         workers: Optional[int] = None, p1: float = 0.55, alpha: float = 0.05, beta: float = 0.05, max_games: Optional[int] = None,
+         passes: int = 1, yaniv_total: int = 7) -> TuningResult:
+    # Coordinate search: every candidate value of a parameter plays the best parameters so far and replaces them if the test
+    # says it's better. max_games caps a comparison (default: 3 times the games of a fixed size test)
+    workers = workers or os.cpu_count() or 1
+    best = start
+    comparisons = []
+    fixed_games = SPRT(0.5, p1, alpha, beta).fixed_games()
+    max_games = max_games or 3 * fixed_games
+
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for _ in range(passes):
+            for parameter, values in search_space.items():
+                level = TUNING_LEVELS.get(parameter, 3)
+                for value in values:
+                    if value == getattr(best, parameter):
+                        continue
+                    comparison = Comparison(parameter, value, level, SPRT(0.5, p1, alpha, beta))
+                    candidate = replace(best, **{parameter: value})
+                    comparison.accepted = compare(candidate, best, level, comparison.sprt, derive_seed(master_seed, len(comparisons)), pool,
+                                                  workers, max_games, yaniv_total=yaniv_total)
+                    comparisons.append(comparison)
+                    if comparison.accepted:
+                        best = candidate
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return TuningResult(best, comparisons, fixed_games)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tune the computer parameters with self-play')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: all cores)')
+    parser.add_argument('--p1', type=float, default=0.55, help='Win rate a better candidate should have (H1)')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--max-games', type=int, default=None, help='Most games per comparison')
+    parser.add_argument('--passes', type=int, default=1)
+    parser.add_argument('--parameters', nargs='+', default=list(SEARCH_SPACE), choices=list(SEARCH_SPACE))
+    args = parser.parse_args()
+
+    result = tune({p: SEARCH_SPACE[p] for p in args.parameters}, master_seed=args.seed, workers=args.workers, p1=args.p1,
+                  alpha=args.alpha, beta=args.beta, max_games=args.max_games, passes=args.passes)
+    print(json.dumps(result.summary(), indent=2))
@@ -1,5 +1,6 @@
+from collections import OrderedDict
 from enum import auto, Enum
-from typing import Set
+from typing import Any, Hashable, Optional, Set
 
 
 class GameState(Enum):
@@ -7,6 +8,7 @@ class GameState(Enum):
     DiscardPickup = auto()
     CallYaniv = auto()
     ComputerTurn = auto()
+    GameOver = auto()
 
 
 def get_menu_choice(valid_choices: Set) -> str:
@@ -16,3 +18,59 @@ def get_menu_choice(valid_choices: Set) -> str:
             print('')
             return choice.upper().strip()
         print('Invalid choice. Please enter one of', valid_choices)
+
+
+class LRUCache:
+    maxsize: int
+    hits: int
+    misses: int
+
+
+    # Keeps the maxsize most recently used entries and counts hits and misses so the size can be tuned
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        try:
+            value = self.__entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        if len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+
+
+    def resize(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        while len(self.__entries) > max(maxsize, 0):
+            self.__entries.popitem(last=False)
+
+
+    def clear(self) -> None:
+        self.__entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'size': len(self.__entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+    def __len__(self) -> int:
+        return len(self.__entries)
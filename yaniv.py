@@ -1,42 +1,118 @@
 import random
 import time
-from typing import List
+from collections import deque
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Deque, Iterable, List, Optional, Tuple, Union
 
-from card import Card, Suit
+from card import ALL_CARDS, Card
 from computer import Computer
+from eventlog import EventLogWriter
+from instrumentation import Instrumentation
+from knowledge import PublicKnowledge
 from player import Player
+from state import ASSAF_PENALTY, ELIMINATION_POINTS, GameSnapshot
 from utils import GameState
 
 
+@dataclass
+class RoundResult:
+    caller: int
+    winner: int
+    assaf: bool
+    turns: int
+    points: Tuple[int, ...]
+
+
 class Yaniv:
-    deck: List[Card] = list()
-    trash: List[Card] = list()
+    deck: List[Card]
+    trash: List[Card]
     pickup_options: List[Card]
     num_comp_players: int = 3
-    players_list: List[Player] = list()
-    eliminated_players: List[Player] = list()
+    players_list: List[Player]
+    eliminated_players: List[Player]
+    seats: List[Player]
+    round_history: List[RoundResult]
+    round_turns: int
+    winner: Optional[Player]
     yaniv_total: int
     cur_turn: int
     state: GameState
-    ASSAF_PENALTY = 20
-
-
-    def __init__(self, player_name: str, yaniv_total=7, computer_difficulty: List[int] = None):
+    rng: random.Random
+    verbose: bool
+    max_round_turns: Optional[int]
+    instrumentation: Optional[Instrumentation]
+    recorder: Optional['DecisionRecorder']
+    publisher: Optional['TableEvents']
+    event_log: Optional[EventLogWriter]
+    computer_delay: float
+    ponderer: Optional['Ponderer']
+    deck_orders: Deque[List[Card]]
+    deal_seed: Optional[int]
+    public_knowledge: PublicKnowledge
+
+
+    # If player_name is None, no human player is added and the game is played entirely by computers
+    # The seed makes the shuffles and every computer's random choices reproducible
+    # verbose=False disables all console output and the delay of computer_delay seconds after computer turns
+    # Once a round goes on for more than max_round_turns turns, every player draws from the deck and the first eligible player calls Yaniv
+    # Otherwise computers can keep trading the same cards forever (or never call Yaniv because of the Assaf risk)
+    # event_log records every deal, turn and score of the game (see eventlog.py)
+    # deck_orders are used, in order, instead of shuffling the deck at the start of a round or when it runs out (used to replay games)
+    # deal_seed shuffles every round's deck with a random stream of its own (see new_round), so games with the same deal_seed deal
+    # the same cards to the same seats whoever sits there and whatever they do (see tournament.py --duplicate)
+    # publisher sends what happens in the game as live events (see publisher.py)
+    # ponderer lets the computers work out their next decisions while a human decides (see ponder.py)
+    def __init__(self, player_name: Optional[str], yaniv_total=7, computer_difficulty: List[int] = None, seed: Optional[int] = None,
+                 verbose: bool = True, max_round_turns: Optional[int] = None, event_log: Optional[EventLogWriter] = None,
+                 deck_orders: Optional[Iterable[List[Card]]] = None, publisher: Optional['TableEvents'] = None,
+                 computer_delay: float = 2.0, ponderer: Optional['Ponderer'] = None, deal_seed: Optional[int] = None):
         self.yaniv_total = yaniv_total
-        user = Player(player_name)
-        self.players_list.append(user)
+        self.verbose = verbose
+        self.max_round_turns = max_round_turns
+        self.instrumentation = None
+        # Gets every computer decision and every round result when set (see datasets.DecisionRecorder)
+        self.recorder = None
+        self.event_log = event_log
+        self.publisher = publisher
+        self.computer_delay = computer_delay
+        self.ponderer = ponderer
+        self.deck_orders = deque(deck_orders or [])
+        self.deal_seed = deal_seed
+        self.__deal_rng = None
+        self.rng = random.Random(seed)
+        self.deck = []
+        self.trash = []
+        self.players_list = []
+        self.eliminated_players = []
+        self.round_history = []
+        self.round_turns = 0
+        self.winner = None
+
+        if player_name is not None:
+            self.players_list.append(Player(player_name, verbose))
 
         if computer_difficulty is not None and isinstance(computer_difficulty, list) and len(computer_difficulty) > 0:
             for i in range(len(computer_difficulty)):
-                self.players_list.append(Computer(f'Computer {i + 1}', computer_difficulty[i]))
+                self.players_list.append(Computer(f'Computer {i + 1}', computer_difficulty[i], verbose, random.Random(self.rng.getrandbits(64))))
         else:
             for i in range(len(computer_difficulty)):
-                self.players_list.append(Computer(f'Computer {i + 1}', 3))
+                self.players_list.append(Computer(f'Computer {i + 1}', 3, verbose, random.Random(self.rng.getrandbits(64))))
+        self.seats = self.players_list[:]
+
+        if self.event_log is not None:
+            self.event_log.game_start(seed, yaniv_total, max_round_turns, player_name,
+                                      [p.level for p in self.seats if isinstance(p, Computer)])
+        if self.publisher is not None:
+            self.publisher.game_start([p.level if isinstance(p, Computer) else 0 for p in self.seats])
+
+        # What every player has seen this round, shared by the computers
+        self.public_knowledge = PublicKnowledge()
 
         # random.shuffle(self.players_list)
         for p in self.players_list:
             if isinstance(p, Computer):
-                p.initialize_memory([player.name for player in self.players_list])
+                p.initialize_memory([player.name for player in self.players_list], self.public_knowledge)
 
         self.new_round()
         self.state = GameState.ChooseAction
@@ -45,19 +121,21 @@ class Yaniv:
     def new_round(self, starting_turn: int = 0):
         self.deck.clear()
         self.trash.clear()
-        rank_list = ['A', 2, 3, 4, 5, 6, 7, 8, 9, 10, 'J', 'Q', 'K']
-        for rank in rank_list:
-            for suit in [Suit.Diamonds, Suit.Hearts, Suit.Clubs, Suit.Spades]:
-                self.deck.append(Card(suit, rank))
-
-        self.deck.append(Card(Suit.Joker, 'X1'))
-        self.deck.append(Card(Suit.Joker, 'X2'))
-        random.shuffle(self.deck)
-
+        self.deck.extend(ALL_CARDS)
+        # The stream only depends on the deal seed and the round number, so the deck is shuffled the same way at the start of the
+        # round and reshuffled the same way every time it runs out, no matter how the rounds before went
+        if self.deal_seed is not None:
+            self.__deal_rng = random.Random(f'{self.deal_seed}:{len(self.round_history)}')
+        self.__shuffle_deck()
+        if self.event_log is not None:
+            self.event_log.round_start(starting_turn, self.deck)
+
+        names = [player.name for player in self.players_list]
+        self.public_knowledge.reset(names)
         for p in self.players_list:
             p.reset()
             if isinstance(p, Computer):
-                p.initialize_memory([player.name for player in self.players_list])
+                p.initialize_memory(names, self.public_knowledge)
 
         for i in range(5):
             for p in self.players_list:
@@ -65,13 +143,25 @@ class Yaniv:
 
         self.trash.append(self.deck.pop())
         self.pickup_options = [self.trash[-1]]
+        self.public_knowledge.reveal(self.pickup_options)
 
-        for p in self.players_list:
-            if isinstance(p, Computer):
-                p.observe(self.pickup_options[0], None, None)
-
-        print(f'New round! {self.players_list[starting_turn].name} goes first')
+        if self.publisher is not None:
+            self.publisher.round_start(self.seats.index(self.players_list[starting_turn]))
+        if self.verbose:
+            print(f'New round! {self.players_list[starting_turn].name} goes first')
         self.cur_turn = starting_turn
+        self.round_turns = 0
+
+
+    def __shuffle_deck(self) -> None:
+        if self.deck_orders:
+            self.deck = list(self.deck_orders.popleft())
+        elif self.__deal_rng is not None:
+            # In card order first, so the same cards always come out in the same order
+            self.deck.sort(key=lambda c: c.id)
+            self.__deal_rng.shuffle(self.deck)
+        else:
+            self.rng.shuffle(self.deck)
 
 
     def next_player_turn(self):
@@ -80,13 +170,54 @@ class Yaniv:
             self.cur_turn = 0
 
         self.state = GameState.ChooseAction
-        print(f'\nCurrent turn: {self.players_list[self.cur_turn].name} has {len(self.players_list[self.cur_turn].cards)} cards')
+        if self.verbose:
+            print(f'\nCurrent turn: {self.players_list[self.cur_turn].name} has {len(self.players_list[self.cur_turn].cards)} cards')
+
+
+    def round_too_long(self) -> bool:
+        return self.max_round_turns is not None and self.round_turns >= self.max_round_turns
+
+
+    def instrument(self, instrumentation: Optional[Instrumentation]) -> None:
+        # Record per stage timings of this game and all its computers (None turns it off again)
+        self.instrumentation = instrumentation
+        for p in self.seats:
+            if isinstance(p, Computer):
+                p.instrumentation = instrumentation
 
 
     def player_discard_pickup(self):
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return self.__player_discard_pickup(None)
+        instrumentation.begin(self.players_list[self.cur_turn].name, 'player_discard_pickup')
+        try:
+            return self.__player_discard_pickup(instrumentation)
+        finally:
+            instrumentation.end()
+
+
+    def __player_discard_pickup(self, instrumentation: Optional[Instrumentation]):
         player = self.players_list[self.cur_turn]
 
+        if instrumentation is not None:
+            stage_start = perf_counter()
         discard_choice, pickup_choice = player.do_turn(self.pickup_options, self.yaniv_total)
+        if instrumentation is not None:
+            instrumentation.add_time('decision', perf_counter() - stage_start)
+        if self.round_too_long():
+            pickup_choice = len(self.pickup_options) + 1
+        if self.recorder is not None and isinstance(player, Computer):
+            self.recorder.record(self, player, discard_choice, pickup_choice)
+        self.apply_turn(discard_choice, pickup_choice)
+
+
+    def apply_turn(self, discard_choice: Union[Card, List[Card]], pickup_choice: int):
+        # Play the current player's discard and pickup (a 1-based pickup option, anything bigger draws from the deck)
+        player = self.players_list[self.cur_turn]
+        if self.event_log is not None:
+            self.event_log.turn(self.seats.index(player), discard_choice if isinstance(discard_choice, list) else [discard_choice],
+                                pickup_choice if pickup_choice <= len(self.pickup_options) else 0)
 
         if pickup_choice > len(self.pickup_options):
             # If the pickup choice is draw from the deck, remove the top card from the deck and add it to your hand
@@ -94,19 +225,23 @@ class Yaniv:
             if len(self.deck) == 0:
                 self.deck = self.trash[:-1]
                 self.trash = [self.trash[-1]]
-                random.shuffle(self.deck)
+                self.__shuffle_deck()
+                if self.event_log is not None:
+                    self.event_log.reshuffle(self.deck)
 
             deck_card = self.deck.pop()
 
-            if isinstance(player, Computer):
-                print(f'{player.name} drew from the deck')
-            else:
-                print(f'{player.name} drew a {deck_card} from the deck')
+            if self.verbose:
+                if isinstance(player, Computer):
+                    print(f'{player.name} drew from the deck')
+                else:
+                    print(f'{player.name} drew a {deck_card} from the deck')
 
             player.pickup_card(deck_card)
         else:
             # If the pickup choice is drawing from the trash, remove that card from the pile and add it to your hand
-            print(f'{player.name} picked up', self.pickup_options[pickup_choice - 1])
+            if self.verbose:
+                print(f'{player.name} picked up', self.pickup_options[pickup_choice - 1])
             player.pickup_card(self.pickup_options[pickup_choice - 1])
 
             if self.trash[-1] == self.pickup_options[pickup_choice - 1]:
@@ -114,13 +249,15 @@ class Yaniv:
             else:
                 self.trash.remove(self.pickup_options[pickup_choice - 1])
 
-        for p in self.players_list:
-            if p != player and isinstance(p, Computer):
-                if pickup_choice > len(self.pickup_options):
-                    pickup_str = 'Deck vs ' + str(self.pickup_options).replace('\033[91m', '').replace('\033[0m', '')
-                    p.observe(discard_choice, pickup_str, player.name)
-                else:
-                    p.observe(discard_choice, self.pickup_options[pickup_choice - 1], player.name)
+        # Drawing from the deck means passing on the pickup options
+        if pickup_choice > len(self.pickup_options):
+            pickup, declined = None, self.pickup_options
+        else:
+            pickup, declined = self.pickup_options[pickup_choice - 1], None
+        self.public_knowledge.observe_turn(player.name, discard_choice if isinstance(discard_choice, list) else [discard_choice], pickup,
+                                           declined)
+        if self.publisher is not None:
+            self.publisher.turn(self.seats.index(player), discard_choice, pickup)
 
         # Remove the discarded cards from the player's hand and add them to the trash
         if isinstance(discard_choice, list):
@@ -136,17 +273,30 @@ class Yaniv:
 
         if not isinstance(player, Computer):
             # Display the user's new hand and end the turn
-            print(player)
-        else:
-            time.sleep(2)
+            if self.verbose:
+                print(player)
+        elif self.verbose and self.computer_delay:
+            time.sleep(self.computer_delay)
+        self.round_turns += 1
         self.pickup_options = discard_choice
         self.next_player_turn()
 
 
     def call_yaniv(self):
+        winner = self.score_round()
+        if self.state != GameState.GameOver:
+            self.new_round(self.players_list.index(winner))
+            self.state = GameState.ChooseAction
+            if self.verbose:
+                print('')
+
+
+    def score_round(self) -> Player:
         # If a player calls Yaniv, check if any other players have a smaller hand than them
-        winner = self.players_list[self.cur_turn]
-        print(f'{winner.name} called Yaniv with {winner.cards} Hand total is ', winner.calc_hand_value())
+        caller = self.players_list[self.cur_turn]
+        winner = caller
+        if self.verbose:
+            print(f'{winner.name} called Yaniv with {winner.cards} Hand total is ', winner.calc_hand_value())
 
         # Go through each player and check if any have a smaller hand
         # If they do, the player that called Yaniv gets a penalty instead of 0 points
@@ -154,7 +304,8 @@ class Yaniv:
         i = 0 if self.cur_turn + 1 == len(self.players_list) else self.cur_turn + 1
         while i != self.cur_turn:
             hand_value = self.players_list[i].calc_hand_value()
-            print(f'{self.players_list[i].name} {self.players_list[i].cards} = {hand_value}')
+            if self.verbose:
+                print(f'{self.players_list[i].name} {self.players_list[i].cards} = {hand_value}')
             if hand_value <= winner.calc_hand_value():
                 winner = self.players_list[i]
                 winning_player_index = i
@@ -162,55 +313,132 @@ class Yaniv:
             if i == len(self.players_list):
                 i = 0
 
-        print('')
-        if winning_player_index is not None:
-            print(f'{winner.name} called Assaf! {self.players_list[self.cur_turn].name} is penalized an additional {self.ASSAF_PENALTY} points')
+        if self.verbose:
+            print('')
+            if winning_player_index is not None:
+                print(f'{winner.name} called Assaf! {caller.name} is penalized an additional {ASSAF_PENALTY} points')
 
         for p in self.players_list:
             if p == winner:
                 p.apply_win_streak()
                 continue
-            if p == self.players_list[self.cur_turn]:
-                p.add_points(self.ASSAF_PENALTY)
+            if p == caller:
+                p.add_points(ASSAF_PENALTY)
             else:
                 p.add_points()
 
-        print('\n     SCOREBOARD     ')
-        print('====================')
-        for p in self.players_list:
-            print(p.name, p.points)
-        for p in self.eliminated_players:
-            print(p.name, p.points)
-        print('====================\n')
-
-        # If a player goes over 100 points, they lose and are eliminated from the game
-        for p in self.players_list:
-            if p.points > 100:
-                print(f'{p.name} is eliminated')
+        self.round_history.append(RoundResult(self.seats.index(caller), self.seats.index(winner), winning_player_index is not None,
+                                              self.round_turns, tuple(p.points for p in self.seats)))
+        if self.recorder is not None:
+            self.recorder.end_round(self, self.round_history[-1])
+        if self.event_log is not None:
+            self.event_log.yaniv(self.seats.index(caller), self.seats.index(winner), winning_player_index is not None)
+            self.event_log.scores([p.points for p in self.seats])
+        if self.publisher is not None:
+            self.publisher.yaniv(self.seats.index(caller), self.seats.index(winner), winning_player_index is not None)
+            self.publisher.scores([p.points for p in self.seats])
+
+        if self.verbose:
+            print('\n     SCOREBOARD     ')
+            print('====================')
+            for p in self.players_list:
+                print(p.name, p.points)
+            for p in self.eliminated_players:
+                print(p.name, p.points)
+            print('====================\n')
+
+        # If a player goes over ELIMINATION_POINTS points, they lose and are eliminated from the game
+        for p in self.players_list[:]:
+            if p.points > ELIMINATION_POINTS:
+                if self.publisher is not None:
+                    self.publisher.eliminated(self.seats.index(p))
+                if self.verbose:
+                    print(f'{p.name} is eliminated')
                 self.eliminated_players.append(p)
                 self.players_list.remove(p)
 
         # If all players have been eliminated, declare a winner
         if len(self.players_list) == 1:
-            print(f'{self.players_list[0].name.upper()} WINS!')
-            exit(0)
-        else:
-            winning_player_index = self.players_list.index(winner)
-            self.new_round(winning_player_index)
-            self.state = GameState.ChooseAction
-        print('')
+            self.winner = self.players_list[0]
+            # The caller may have been eliminated, so the turn goes to the winner (like state.score_round)
+            self.cur_turn = 0
+            self.state = GameState.GameOver
+            if self.event_log is not None:
+                self.event_log.game_end(self.seats.index(self.winner))
+            if self.publisher is not None:
+                self.publisher.game_end(self.seats.index(self.winner))
+            if self.verbose:
+                print(f'{self.winner.name.upper()} WINS!')
+        return winner
+
+
+    def snapshot(self) -> GameSnapshot:
+        # An immutable copy of the game that state.py can play on, or restore() can load back into a game with the same seats
+        seat_of = {p: seat for seat, p in enumerate(self.seats)}
+        names = [p.name for p in self.seats]
+        return GameSnapshot(bytes(c.id for c in self.deck), bytes(c.id for c in self.trash), bytes(c.id for c in self.pickup_options),
+                            tuple(p.hand_mask for p in self.seats), tuple(p.points for p in self.seats), tuple(p.win_streak for p in self.seats),
+                            tuple(seat_of[p] for p in self.players_list), self.cur_turn, self.round_turns, self.yaniv_total, self.state,
+                            tuple(p.knowledge(names) if isinstance(p, Computer) and p in self.players_list else None
+                                  for p in self.seats))
+
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        names = [p.name for p in self.seats]
+        self.deck = [ALL_CARDS[i] for i in snapshot.deck]
+        self.trash = [ALL_CARDS[i] for i in snapshot.trash]
+        self.pickup_options = [ALL_CARDS[i] for i in snapshot.pickup_options]
+        self.players_list = [self.seats[seat] for seat in snapshot.active]
+        self.eliminated_players = [p for p in self.seats if p not in self.players_list]
+        self.public_knowledge.reset([p.name for p in self.players_list])
+        for seat, p in enumerate(self.seats):
+            p.set_hand(snapshot.hands[seat])
+            p.points = snapshot.points[seat]
+            p.win_streak = snapshot.win_streaks[seat]
+            if isinstance(p, Computer):
+                p.restore_knowledge(snapshot.knowledge[seat], names)
+        self.cur_turn = snapshot.cur_turn
+        self.round_turns = snapshot.round_turns
+        self.yaniv_total = snapshot.yaniv_total
+        self.state = snapshot.state
+        self.winner = self.players_list[0] if snapshot.state == GameState.GameOver else None
 
 
-    def play(self):
-        while True:
+    def play(self) -> Optional[Player]:
+        while self.state != GameState.GameOver:
             if self.state == GameState.ChooseAction:
-                self.state = self.players_list[self.cur_turn].choose_action(self.yaniv_total, self.pickup_options)
+                player = self.players_list[self.cur_turn]
+                # Computers only decide once the ponderer stopped, they share the discard option caches with its clones
+                if self.ponderer is not None:
+                    if isinstance(player, Computer):
+                        self.ponderer.cancel()
+                    else:
+                        self.ponderer.start(self)
+                if self.round_too_long() and player.calc_hand_value() <= self.yaniv_total:
+                    self.state = GameState.CallYaniv
+                else:
+                    self.state = player.choose_action(self.yaniv_total, self.pickup_options)
             elif self.state == GameState.DiscardPickup:
                 self.player_discard_pickup()
             elif self.state == GameState.CallYaniv:
                 self.call_yaniv()
+        if self.ponderer is not None:
+            self.ponderer.cancel()
+        return self.winner
 
 
 if __name__ == '__main__':
-    yaniv = Yaniv('Player', computer_difficulty=[2, 3])
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Play Yaniv against the computer')
+    parser.add_argument('--ponder', action='store_true', help='Let computers work out their next decisions while the human decides')
+    args = parser.parse_args()
+
+    ponderer = None
+    if args.ponder:
+        from ponder import Ponderer
+        ponderer = Ponderer()
+    yaniv = Yaniv('Player', computer_difficulty=[2, 3], ponderer=ponderer)
     yaniv.play()
+    if ponderer is not None:
+        ponderer.close()